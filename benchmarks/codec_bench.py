@@ -0,0 +1,57 @@
+"""Microbenchmark of the PTP container encoding and decoding
+
+Compares the dict-based path of USBconn (_PTPMsg followed by _encode_msg,
+and _decode_msg) with the compiled PTPCodec used by the transactions.
+
+Run from the root of the repository:
+
+    python -m benchmarks.codec_bench [iterations]
+"""
+
+import sys
+import timeit
+
+import sour_core.ptp_codec as ptp_codec
+import sour_core.simulator as simulator
+import sour_core.usb_connection as USBconn
+import sour_core.codes.usb as USBcodes
+
+ITERATIONS = 100000
+
+
+def main(iterations=ITERATIONS):
+    conn = USBconn.USBconn(transport=simulator.SimulatedTransport())
+    codec = ptp_codec.PTPCodec(conn._endian)
+
+    command = USBcodes.USB_OPERATIONS["Command"]
+    response = USBcodes.USB_OPERATIONS["Response"]
+
+    params = {"Msg": {"Value": 0x0000D21E, "DataType": "L"}}
+
+    resp_msg = codec.encode(response, 0x2001, 7, ["L"], [1])
+
+    cases = {
+        "encode shim (_PTPMsg + _encode_msg)": lambda: conn._encode_msg(
+            conn._PTPMsg(command, 0x9205, 7, params)
+        ),
+        "encode _build_msg": lambda: conn._build_msg(
+            command, 0x9205, 7, params
+        ),
+        "encode PTPCodec.encode": lambda: codec.encode(
+            command, 0x9205, 7, ("L",), (0x0000D21E,)
+        ),
+        "decode _decode_msg": lambda: conn._decode_msg(resp_msg),
+        "decode PTPCodec.decode_header": lambda: codec.decode_header(
+            resp_msg
+        ),
+    }
+
+    for name, func in cases.items():
+        best = min(timeit.repeat(func, number=iterations, repeat=5))
+        print(f"{name:40s} {best / iterations * 1e6:6.2f} us per message")
+
+    conn._release_usb()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS)
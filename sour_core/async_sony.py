@@ -0,0 +1,138 @@
+import asyncio
+import concurrent.futures
+import functools
+
+import sour_core.sony as sony
+
+
+class AsyncSONYconn:
+    def __init__(self, name, **kwargs):
+        """asyncio API to control a Sony Camera
+
+        All the USB I/O of the camera runs in a dedicated single thread
+        executor, so the event loop is never blocked and the commands to
+        a camera are kept in order. Different cameras have different
+        executors and can be driven concurrently from the same loop.
+
+        Args:
+        - name (str): the name of the camera
+        - kwargs: the same keyword arguments accepted by SONYconn
+        """
+
+        self.name = name
+        self._kwargs = kwargs
+
+        self.camera = None
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"SONYconn-{name}"
+        )
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking function in the executor of the camera"""
+
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def connect(self):
+        """Find the camera and open the USB connection"""
+
+        if self.camera is None:
+            self.camera = await self._run(
+                sony.SONYconn, self.name, **self._kwargs
+            )
+
+        return self.camera
+
+    async def close(self):
+        """Release the USB connection and the executor"""
+
+        if self.camera is not None:
+            await self._run(self.camera.close_usb_connection)
+            self.camera = None
+
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _next_step(sequence):
+        try:
+            return False, next(sequence)
+        except StopIteration as stop:
+            return True, stop.value
+
+    async def _run_sequence(self, sequence):
+        """Drive a command sequence of SONYconn
+
+        The commands run in the executor, while the waits between them
+        are awaited on the event loop.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            done, step = await self._run(self._next_step, sequence)
+
+            if done:
+                return step
+
+            waiter, delay = step
+
+            if waiter is None:
+                await asyncio.sleep(delay)
+            else:
+                await loop.run_in_executor(None, waiter.wait, delay)
+
+    async def initialize_camera(self, ControlMode="RemoteControl"):
+        return await self._run(
+            self.camera.initialize_camera, ControlMode=ControlMode
+        )
+
+    async def get_camera_properties(self):
+        return await self._run(self.camera.get_camera_properties)
+
+    async def apply_settings(self, settings, **kwargs):
+        return await self._run(self.camera.apply_settings, settings, **kwargs)
+
+    async def messageHandler(self, msg):
+        cmd, value = self.camera._parse_message(msg)
+
+        if cmd == "capture":
+            out = await self._capture_photo()
+        elif cmd == "videocontrol":
+            out = await self._video_control()
+        else:
+            out = await self._run(self.camera._dispatch_message, cmd, value)
+
+        await asyncio.sleep(self.camera.delays["Message"])
+
+        return out
+
+    async def _get_live_view(self):
+        return await self._run(self.camera._get_live_view)
+
+    async def _capture_photo(self):
+        return await self._run_sequence(self.camera._capture_sequence())
+
+    async def _video_control(self):
+        return await self._run_sequence(self.camera._video_sequence())
+
+    async def _transfer_large_files(
+        self, file_name, file_code, file_download_code, **kwargs
+    ):
+        return await self._run(
+            self.camera._transfer_large_files,
+            file_name,
+            file_code,
+            file_download_code,
+            **kwargs,
+        )
@@ -0,0 +1,385 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import sour_core.events as events
+
+logger = logging.getLogger()
+
+# Waits between the steps of the camera commands, tuned on one body. They
+# are the starting point of the calibration and the delays used for the
+# models never calibrated
+DEFAULT_DELAYS = {
+    # After the autofocus button is pressed, before the shutter
+    "AutoFocusDown": 0.3,
+    # Time the shutter button is held down
+    "CaptureHold": 0.035,
+    # After the photo, before the autofocus button is released
+    "AutoFocusHold": 0.5,
+    # After the movie button, before the autofocus button is released
+    "VideoAutoFocusHold": 0.3,
+    # After a setting is sent, if no change event arrives
+    "Setting": 0.05,
+    # Between two steps of the manual focus
+    "FocusStep": 0.2,
+    # After every command of messageHandler
+    "Message": 0.1,
+    # After the date and time are set
+    "DateTime": 0.5,
+}
+
+# Steps measured by default. CaptureHold takes photos and AutoFocusDown
+# depends on the scene, so they are measured only on request
+CALIBRATION_STEPS = ("Setting", "FocusStep")
+
+# Steps without a probe: no response of the camera tells when they are
+# safe, so they keep the values of DEFAULT_DELAYS unless set by hand
+UNCALIBRATED_STEPS = (
+    "AutoFocusHold",
+    "VideoAutoFocusHold",
+    "Message",
+    "DateTime",
+)
+
+LATENCY_FILE = os.path.join(
+    os.path.expanduser("~"), ".cache", "sour_core", "latency.json"
+)
+
+CALIBRATION_RESOLUTION = 0.005  # s
+CALIBRATION_REPEATS = 3
+CALIBRATION_MARGIN = 1.25
+
+# FocusFound value of a locked autofocus
+FOCUS_LOCKED = 2
+
+CAPTURE_TIMEOUT = 2.0  # s
+
+
+class LatencyProfile:
+    def __init__(self, model=None, delays=None):
+        """The delays between the command steps of a camera model
+
+        Args:
+        - model (str): the camera model, from GetDeviceInfo
+        - delays (dict): step name to delay in sec. The steps missing
+                         take the value of DEFAULT_DELAYS
+        """
+
+        self.model = model
+        self.delays = dict(DEFAULT_DELAYS)
+
+        if delays:
+            self.delays.update(delays)
+
+    def __getitem__(self, step):
+        return self.delays[step]
+
+    def __setitem__(self, step, delay):
+        if step not in DEFAULT_DELAYS:
+            raise KeyError(f"Unknown latency step: {step}")
+
+        self.delays[step] = delay
+
+    def update(self, delays):
+        for step, delay in delays.items():
+            self[step] = delay
+
+    def to_dict(self):
+        return dict(self.delays)
+
+    def __repr__(self):
+        return f"LatencyProfile({self.model}, {self.delays})"
+
+
+class LatencyStore:
+    def __init__(self, file_name=LATENCY_FILE):
+        """Latency profiles of the camera models saved in a JSON file
+
+        Args:
+        - file_name (str): path of the JSON file. It is created when the
+                           first profile is saved
+        """
+
+        self.file_name = file_name
+
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.file_name):
+            return {}
+
+        with open(self.file_name, "r") as jfile:
+            return json.load(jfile)
+
+    def _write(self, profiles):
+        directory = os.path.dirname(self.file_name)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp = self.file_name + ".tmp"
+
+        with open(tmp, "w") as jfile:
+            json.dump(profiles, jfile, indent=4)
+
+        os.replace(tmp, self.file_name)
+
+    def models(self):
+        """The models with a saved profile"""
+
+        with self._lock:
+            return list(self._read())
+
+    def save(self, profile):
+        """Save the profile of a model, replacing the previous one"""
+
+        with self._lock:
+            profiles = self._read()
+            profiles[profile.model] = profile.to_dict()
+            self._write(profiles)
+
+    def load(self, model):
+        """Load the profile of a model
+
+        Returns:
+        - profile (LatencyProfile): the profile or None if not saved
+        """
+
+        with self._lock:
+            profiles = self._read()
+
+        if model not in profiles:
+            return None
+
+        delays = {
+            step: delay
+            for step, delay in profiles[model].items()
+            if step in DEFAULT_DELAYS
+        }
+
+        return LatencyProfile(model, delays)
+
+    def delete(self, model):
+        """Remove the profile of a model, if saved"""
+
+        with self._lock:
+            profiles = self._read()
+
+            if profiles.pop(model, None) is not None:
+                self._write(profiles)
+
+
+class Calibrator:
+    def __init__(
+        self,
+        camera,
+        resolution=CALIBRATION_RESOLUTION,
+        repeats=CALIBRATION_REPEATS,
+        margin=CALIBRATION_MARGIN,
+    ):
+        """Measure the minimum safe delays of the attached camera
+
+        Every step is probed with a bisection between 0 and the current
+        delay: a delay is safe if the camera accepts all the commands of
+        the probe, and the command took effect, in repeats runs in a row.
+        The delay found is multiplied by margin. A step whose current
+        delay already fails is left unchanged. The UNCALIBRATED_STEPS
+        have no probe and are never changed.
+
+        Args:
+        - camera (SONYconn): an initialized camera
+        - resolution (float): the bisection stops when the interval is
+                              smaller than resolution sec
+        - repeats (int): runs of the probe needed to accept a delay
+        - margin (float): factor applied to the delay found
+        """
+
+        self.camera = camera
+        self.resolution = resolution
+        self.repeats = repeats
+        self.margin = margin
+
+        self._probes = {
+            "Setting": self._probe_setting,
+            "FocusStep": self._probe_focus_step,
+            "CaptureHold": self._probe_capture_hold,
+            "AutoFocusDown": self._probe_autofocus,
+        }
+
+        # The ISO probed by the settings and restored at the end
+        self._iso = None
+
+    def _accepted(self, probe, delay, rest):
+        for _ in range(self.repeats):
+            # Let the camera complete the previous probe
+            time.sleep(rest)
+
+            if not probe(delay):
+                return False
+
+        return True
+
+    def measure(self, step):
+        """Find the minimum safe delay of a step
+
+        Returns:
+        - delay (float): the delay in sec, None if the current delay is
+                         not safe either
+        """
+
+        probe = self._probes[step]
+
+        safe = high = self.camera.delays[step]
+        low = 0.0
+
+        if not self._accepted(probe, safe, safe):
+            logger.info(f"Calibration of {step}: {safe} s is not safe")
+            return None
+
+        while high - low > self.resolution:
+            mid = (low + high) / 2
+
+            if self._accepted(probe, mid, safe):
+                high = mid
+            else:
+                low = mid
+
+        return high * self.margin
+
+    def calibrate(self, steps=CALIBRATION_STEPS):
+        """Measure the delays of some steps
+
+        Args:
+        - steps (list): the steps to be measured
+
+        Returns:
+        - delays (dict): step name to the delay measured
+
+        Raises:
+        - KeyError: if a step has no probe
+        - RuntimeError: if the ISO needed by Setting cannot be read
+        """
+
+        unknown = [step for step in steps if step not in self._probes]
+
+        if unknown:
+            raise KeyError(f"Steps that cannot be calibrated: {unknown}")
+
+        if "Setting" in steps:
+            self._iso = self._current_raw("ISO")
+
+            if self._iso is None:
+                raise RuntimeError(
+                    "Cannot calibrate Setting: the ISO cannot be read"
+                )
+
+        delays = {}
+
+        for step in steps:
+            t = time.monotonic()
+
+            delay = self.measure(step)
+
+            if delay is None:
+                continue
+
+            delays[step] = delay
+
+            logger.info(
+                f"Calibrated {step}: {delay * 1000:.1f} ms "
+                f"in {time.monotonic() - t:.2f} s"
+            )
+
+        if "Setting" in steps:
+            self._restore_iso()
+
+        return delays
+
+    def _ok(self, resp):
+        return resp["MsgType"] == "Response" and resp["RespCode"] == "OK"
+
+    def _current_raw(self, prop):
+        """Read the raw current value of a property from the camera
+
+        Returns:
+        - value (int): the value or None if it cannot be read alone
+        """
+
+        try:
+            vals = self.camera._get_property_desc(prop)
+        except KeyError:
+            return None
+
+        if vals is None or prop not in vals:
+            return None
+
+        return vals[prop].current_raw
+
+    def _restore_iso(self):
+        cam = self.camera
+
+        time.sleep(cam.delays["Setting"])
+
+        cam._send_setting("ISO", cam._setting_msg(self._iso, "L"))
+        cam.property_cache.invalidate("ISO")
+
+    def _probe_setting(self, delay):
+        # Two settings delay sec apart, both accepted and the second one
+        # applied
+        cam = self.camera
+
+        table = cam._value_table("ISO")
+        current = self._iso
+
+        other = next((k for k in table.keys if k != current), None)
+
+        if other is None:
+            return False
+
+        first = cam._send_setting("ISO", cam._setting_msg(other, "L"))
+        time.sleep(delay)
+        second = cam._send_setting("ISO", cam._setting_msg(current, "L"))
+
+        if not (self._ok(first) and self._ok(second)):
+            return False
+
+        value = self._current_raw("ISO")
+
+        return value is None or value == current
+
+    def _probe_focus_step(self, delay):
+        # A step further and one closer, delay sec apart
+        first = self.camera._send_control("FocusDistance", 1, "h")
+        time.sleep(delay)
+        second = self.camera._send_control("FocusDistance", -1, "h")
+
+        return self._ok(first) and self._ok(second)
+
+    def _probe_capture_hold(self, delay):
+        # The shutter held down for delay sec takes a photo
+        listener = self.camera.connection.events
+
+        if listener is None or not listener.running:
+            raise RuntimeError("CaptureHold needs the event listener")
+
+        waiter = listener.expect(events.OBJECT_ADDED_EVENTS)
+
+        down = self.camera._send_control("Capture", "Down")
+        time.sleep(delay)
+        up = self.camera._send_control("Capture", "Up")
+
+        if not (self._ok(down) and self._ok(up)):
+            return False
+
+        return waiter.wait(CAPTURE_TIMEOUT) is not None
+
+    def _probe_autofocus(self, delay):
+        # The autofocus is locked delay sec after the button is pressed
+        down = self.camera._send_control("AutoFocus", "Down")
+        time.sleep(delay)
+        locked = self._current_raw("FocusFound") == FOCUS_LOCKED
+        up = self.camera._send_control("AutoFocus", "Up")
+
+        return self._ok(down) and self._ok(up) and locked
@@ -0,0 +1,208 @@
+import os
+import re
+import struct
+import threading
+
+import sour_core.ptp_codec as ptp_codec
+
+CAPABILITY_MAGIC = b"SOURCDB"
+CAPABILITY_VERSION = 1
+
+CAPABILITY_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "sour_core", "capabilities"
+)
+
+# Magic, version and number of property descriptors
+CAPABILITY_HEADER = struct.Struct("<7sBH")
+
+# Property code, datatype code, GetSet and length of the static part
+DESCRIPTOR_HEADER = struct.Struct("<HHBL")
+
+
+def _ptp_string(view, offset, endian):
+    """Decode a PTP string: the number of UTF-16 characters, including
+    the terminator, followed by the characters"""
+
+    count = view[offset]
+    offset += 1
+
+    if count == 0:
+        return "", offset
+
+    codec = "utf-16-le" if endian == "<" else "utf-16-be"
+
+    text = bytes(view[offset : offset + 2 * count]).decode(codec)
+
+    return text.rstrip("\x00"), offset + 2 * count
+
+
+def _ptp_array(view, offset, endian, datatype="H"):
+    count = ptp_codec.get_struct(endian, "L").unpack_from(view, offset)[0]
+    offset += 4
+
+    values = ptp_codec.get_struct(endian, str(count) + datatype).unpack_from(
+        view, offset
+    )
+
+    return list(values), offset + count * struct.calcsize(datatype)
+
+
+def parse_device_info(payload, endian="<"):
+    """Decode the DeviceInfo dataset returned by GetDeviceInfo
+
+    Args:
+    - payload (bytes-like): the data phase of GetDeviceInfo
+    - endian (str): struct endianess character of the camera
+
+    Returns:
+    - info (dict): the fields of the dataset, with the names of the PTP
+                   specification
+    """
+
+    view = memoryview(payload)
+    u16 = ptp_codec.get_struct(endian, "H")
+    u32 = ptp_codec.get_struct(endian, "L")
+
+    info = {}
+
+    offset = 0
+
+    info["StandardVersion"] = u16.unpack_from(view, offset)[0]
+    info["VendorExtensionID"] = u32.unpack_from(view, offset + 2)[0]
+    info["VendorExtensionVersion"] = u16.unpack_from(view, offset + 6)[0]
+    offset += 8
+
+    info["VendorExtensionDesc"], offset = _ptp_string(view, offset, endian)
+
+    info["FunctionalMode"] = u16.unpack_from(view, offset)[0]
+    offset += 2
+
+    for field in (
+        "OperationsSupported",
+        "EventsSupported",
+        "DevicePropertiesSupported",
+        "CaptureFormats",
+        "ImageFormats",
+    ):
+        info[field], offset = _ptp_array(view, offset, endian)
+
+    for field in ("Manufacturer", "Model", "DeviceVersion", "SerialNumber"):
+        info[field], offset = _ptp_string(view, offset, endian)
+
+    return info
+
+
+class CapabilityDatabase:
+    def __init__(self, directory=CAPABILITY_DIRECTORY):
+        """Static property descriptors of the camera models seen
+
+        For every camera model and firmware the static part of the
+        property descriptors, i.e. the datatype, GetSet and the available
+        values, is saved in a binary file. A file has a header followed by
+        one record per property: a fixed size header and the raw bytes of
+        the descriptor after the current value, as sent by the camera.
+        Loading a file needs no parsing of the camera dump, and the raw
+        bytes let the property parser check that a descriptor did not
+        change before using it.
+
+        Args:
+        - directory (str): directory of the database files
+        """
+
+        self.directory = directory
+
+        self._lock = threading.Lock()
+
+    def path(self, model, firmware):
+        """Path of the file of a model and firmware"""
+
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", f"{model}_{firmware}")
+
+        return os.path.join(self.directory, name + ".cdb")
+
+    def load(self, model, firmware):
+        """Load the descriptors of a model and firmware
+
+        Returns:
+        - descriptors (dict): property code to (datatype code, GetSet, raw
+                              static bytes), or None if not available
+        """
+
+        file_name = self.path(model, firmware)
+
+        try:
+            with open(file_name, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if len(data) < CAPABILITY_HEADER.size:
+            return None
+
+        magic, version, count = CAPABILITY_HEADER.unpack_from(data)
+
+        if magic != CAPABILITY_MAGIC or version != CAPABILITY_VERSION:
+            return None
+
+        descriptors = {}
+        offset = CAPABILITY_HEADER.size
+
+        for _ in range(count):
+            if offset + DESCRIPTOR_HEADER.size > len(data):
+                return None
+
+            code, dt_code, getset, length = DESCRIPTOR_HEADER.unpack_from(
+                data, offset
+            )
+            offset += DESCRIPTOR_HEADER.size
+
+            if offset + length > len(data):
+                return None
+
+            static = data[offset : offset + length]
+            descriptors[code] = (dt_code, getset, static)
+            offset += length
+
+        return descriptors
+
+    def save(self, model, firmware, descriptors):
+        """Save the descriptors of a model and firmware
+
+        Args:
+        - model (str): the camera model, from GetDeviceInfo
+        - firmware (str): the DeviceVersion, from GetDeviceInfo
+        - descriptors (dict): property code to (datatype code, GetSet, raw
+                              static bytes)
+        """
+
+        chunks = [
+            CAPABILITY_HEADER.pack(
+                CAPABILITY_MAGIC, CAPABILITY_VERSION, len(descriptors)
+            )
+        ]
+
+        for code, (dt_code, getset, static) in descriptors.items():
+            chunks.append(
+                DESCRIPTOR_HEADER.pack(code, dt_code, getset, len(static))
+            )
+            chunks.append(bytes(static))
+
+        file_name = self.path(model, firmware)
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+
+            tmp = file_name + ".tmp"
+
+            with open(tmp, "wb") as f:
+                f.write(b"".join(chunks))
+
+            os.replace(tmp, file_name)
+
+    def delete(self, model, firmware):
+        """Remove the descriptors of a model and firmware, if saved"""
+
+        try:
+            os.remove(self.path(model, firmware))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,225 @@
+import logging
+import struct
+import threading
+import time
+
+import sour_core.transport as transport
+import sour_core.ptp_codec as ptp_codec
+
+logger = logging.getLogger()
+
+CAPTURE_MAGIC = b"SOURCAP"
+CAPTURE_VERSION = 1
+
+# Magic, version, endianess of the containers and wall clock start time
+CAPTURE_HEADER = struct.Struct("<7sBcd")
+
+# Direction, time in sec from the start and length of the container
+RECORD_HEADER = struct.Struct("<BdL")
+
+CAPTURE_OUT = 0
+CAPTURE_IN = 1
+CAPTURE_EVENT = 2
+
+
+class CaptureWriter:
+    def __init__(self, file_name, endian="<"):
+        """Record the PTP containers of a session in a capture file
+
+        The file starts with a header followed by one record for each
+        container. A record is a fixed size header with the direction,
+        the time in sec from the start of the capture and the length,
+        followed by the container as it was on the wire.
+
+        Args:
+        - file_name (str): path of the capture file
+        - endian (str): struct endianess character of the containers
+        """
+
+        self.file_name = file_name
+
+        self._lock = threading.Lock()
+        self._file = open(file_name, "wb")
+        self._start = time.monotonic()
+
+        self._file.write(
+            CAPTURE_HEADER.pack(
+                CAPTURE_MAGIC, CAPTURE_VERSION, endian.encode(), time.time()
+            )
+        )
+
+        self.count = 0
+
+    def record(self, direction, msg):
+        """Append a container to the capture
+
+        Args:
+        - direction (int): CAPTURE_OUT, CAPTURE_IN or CAPTURE_EVENT
+        - msg (bytes-like): the container
+        """
+
+        timestamp = time.monotonic() - self._start
+
+        with self._lock:
+            if self._file is None:
+                return
+
+            self._file.write(RECORD_HEADER.pack(direction, timestamp, len(msg)))
+            self._file.write(msg)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+        logger.info(f"Recorded {self.count} containers in {self.file_name}")
+
+
+def read_capture(file_name):
+    """Read a capture file
+
+    Args:
+    - file_name (str): path of the capture file
+
+    Returns:
+    - info (dict): the Endian and the StartTime of the capture
+    - records (list): (direction, timestamp, msg) tuples in the order
+                      they were recorded
+    """
+
+    with open(file_name, "rb") as f:
+        data = f.read()
+
+    magic, version, endian, start = CAPTURE_HEADER.unpack_from(data)
+
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"{file_name} is not a capture file")
+
+    if version != CAPTURE_VERSION:
+        raise ValueError(f"Capture version {version} not supported")
+
+    records = []
+
+    offset = CAPTURE_HEADER.size
+
+    while offset + RECORD_HEADER.size <= len(data):
+        direction, timestamp, length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+
+        records.append((direction, timestamp, data[offset : offset + length]))
+        offset += length
+
+    info = {"Endian": endian.decode(), "StartTime": start}
+
+    return info, records
+
+
+class ReplayTransport(transport.QueuedTransport):
+    def __init__(self, file_name, speed=1.0):
+        """Transport replaying a recorded session
+
+        Every container written by the host consumes the next outgoing
+        record of the capture. The incoming containers and the events
+        recorded after it are then served with the recorded delays. The
+        transaction IDs of the replayed containers are remapped to the
+        ones used by the host, so the replay does not depend on the
+        transaction counter of the recorded session.
+
+        Args:
+        - file_name (str): path of the capture file
+        - speed (float): replay speed relative to the recording. If 0
+                         or None, the containers are served immediately
+        """
+
+        super().__init__()
+
+        self.info, self._records = read_capture(file_name)
+        self.speed = speed
+
+        self._codec = ptp_codec.PTPCodec(self.info["Endian"])
+        self._cursor = 0
+        self._out = bytearray()
+        self._tids = {}
+
+        self.mismatches = 0
+
+    @property
+    def finished(self):
+        """True when all the records have been replayed"""
+
+        return self._cursor >= len(self._records)
+
+    def _remap(self, msg):
+        _, msg_type, opcode, tid = self._codec.decode_header(msg)
+
+        if tid not in self._tids:
+            return msg
+
+        msg = bytearray(msg)
+        self._codec.header.pack_into(
+            msg, 0, len(msg), msg_type, opcode, self._tids[tid]
+        )
+
+        return bytes(msg)
+
+    def _replay(self, msg):
+        header = self._codec.decode_header(msg)
+
+        while (
+            self._cursor < len(self._records)
+            and self._records[self._cursor][0] != CAPTURE_OUT
+        ):
+            # Incoming records left over are dropped, the camera state
+            # of the capture has moved on
+            self._cursor += 1
+
+        if self._cursor >= len(self._records):
+            logger.info("Replay reached the end of the capture")
+            return
+
+        _, start, recorded = self._records[self._cursor]
+        self._cursor += 1
+
+        recorded_header = self._codec.decode_header(recorded)
+
+        if recorded_header[1:3] != header[1:3]:
+            self.mismatches += 1
+            logger.info(
+                f"Replay mismatch: sent {header[1:3]}, "
+                f"recorded {recorded_header[1:3]}"
+            )
+
+        self._tids[recorded_header[3]] = header[3]
+
+        while (
+            self._cursor < len(self._records)
+            and self._records[self._cursor][0] != CAPTURE_OUT
+        ):
+            direction, timestamp, recorded = self._records[self._cursor]
+            self._cursor += 1
+
+            delay = (timestamp - start) / self.speed if self.speed else 0
+
+            if direction == CAPTURE_EVENT:
+                self.push(self.events, recorded, delay)
+            else:
+                self.push(self.incoming, self._remap(recorded), delay)
+
+    def write(self, data, timeout=None):
+        with self._cond:
+            self._out += data
+
+            while len(self._out) >= ptp_codec.BASE_PTP_MSG_LENGTH:
+                length = self._codec.decode_u32(self._out)
+
+                if len(self._out) < length:
+                    break
+
+                msg = bytes(self._out[:length])
+                del self._out[:length]
+
+                self._replay(msg)
+
+        return len(data)
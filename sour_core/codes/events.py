@@ -0,0 +1,31 @@
+PTP_EVENTCODE = {
+    'DataType' : 'H',
+    'Values': {
+        'Undefined'                 : 0x4000,
+        'CancelTransaction'         : 0x4001,
+        'ObjectAdded'               : 0x4002,
+        'ObjectRemoved'             : 0x4003,
+        'StoreAdded'                : 0x4004,
+        'StoreRemoved'              : 0x4005,
+        'DevicePropChanged'         : 0x4006,
+        'ObjectInfoChanged'         : 0x4007,
+        'DeviceInfoChanged'         : 0x4008,
+        'RequestObjectTransfer'     : 0x4009,
+        'StoreFull'                 : 0x400A,
+        'DeviceReset'               : 0x400B,
+        'StorageInfoChanged'        : 0x400C,
+        'CaptureComplete'           : 0x400D,
+        'UnreportedStatus'          : 0x400E
+        }
+    }
+
+SONY_EVENTCODE = {
+    'DataType' : 'H',
+    'Values' : {
+        'SonyObjectAdded'           : 0xC201,
+        'SonyObjectRemoved'         : 0xC202,
+        'SonyDevicePropChanged'     : 0xC203
+    }
+}
+
+EVENTCODES = [PTP_EVENTCODE, SONY_EVENTCODE]
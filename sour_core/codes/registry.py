@@ -0,0 +1,75 @@
+import sour_core.codes.utils as code_utils
+import sour_core.codes.usb as USBcodes
+import sour_core.codes.operational as OPcodes
+import sour_core.codes.properties as PROPcodes
+import sour_core.codes.datatype as DTcodes
+import sour_core.codes.response as RESPcodes
+import sour_core.codes.events as EVcodes
+
+# The tables are built once at import. The combined dictionaries keep the
+# structure of the ones returned by utils.combine_dict, while the reverse
+# maps give the name of a code with a single hash lookup
+OPCODES = code_utils.combine_dict(OPcodes.OPCODES)
+PROPCODES = code_utils.combine_dict(PROPcodes.PROPCODES)
+EVENTCODES = code_utils.combine_dict(EVcodes.EVENTCODES)
+RESPCODES = RESPcodes.RESPCODES
+DATATYPES = DTcodes.PTP_DATATYPE
+USB_OPERATIONS = USBcodes.USB_OPERATIONS
+PROPVALUES = PROPcodes.SONY_PROPVALUES
+
+OPCODE_NAMES = code_utils.reverse_map(OPCODES["Values"])
+PROPCODE_NAMES = code_utils.reverse_map(PROPCODES["Values"])
+EVENTCODE_NAMES = code_utils.reverse_map(EVENTCODES["Values"])
+RESPCODE_NAMES = code_utils.reverse_map(RESPCODES["Values"])
+DATATYPE_NAMES = code_utils.reverse_datatype_map(DATATYPES["Values"])
+USB_OPERATION_NAMES = code_utils.reverse_map(USB_OPERATIONS)
+
+PROPVALUE_NAMES = {
+    prop: code_utils.reverse_map(table["Values"])
+    for prop, table in PROPVALUES.items()
+}
+
+
+def _name(names, code):
+    try:
+        return names[code]
+    except KeyError:
+        return "Unknown : " + str(hex(code))
+
+
+def opcode_name(code):
+    return _name(OPCODE_NAMES, code)
+
+
+def propcode_name(code):
+    return _name(PROPCODE_NAMES, code)
+
+
+def eventcode_name(code):
+    return _name(EVENTCODE_NAMES, code)
+
+
+def respcode_name(code):
+    return _name(RESPCODE_NAMES, code)
+
+
+def datatype_name(code):
+    return _name(DATATYPE_NAMES, code)
+
+
+def usb_operation_name(code):
+    return _name(USB_OPERATION_NAMES, code)
+
+
+def propvalue_name(prop, code):
+    """Name of a value of a property with enumerated values
+
+    Returns the code itself if the property has no named values.
+    """
+
+    names = PROPVALUE_NAMES.get(prop)
+
+    if names is None:
+        return code
+
+    return _name(names, code)
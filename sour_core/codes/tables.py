@@ -0,0 +1,106 @@
+import array
+import bisect
+from fractions import Fraction
+
+import sour_core.codes.utils as code_utils
+
+
+def shutter_key(value):
+    """Numeric value in sec of a shutter speed label, e.g. "1/250" """
+
+    if isinstance(value, (int, float)):
+        return value
+
+    return float(Fraction(value))
+
+
+def iso_key(value, endian="<"):
+    """Encoded value of an ISO label, e.g. "AUTO" or "400" """
+
+    return code_utils.property("ISO", value, endian).encoder()
+
+
+def expcomp_key(value):
+    """Numeric value of an exposure compensation label"""
+
+    return float(value)
+
+
+class ValueTable:
+    def __init__(self, labels, key, typecode="d"):
+        """Sorted numeric table of the values available for a property
+
+        The labels given by the camera are converted once to numbers, so
+        that a value can be checked in O(1) and snapped to the closest
+        available one with a bisection. The closest value is the same
+        chosen by a linear search on the labels in the camera order: on
+        a tie the value coming first in the camera list wins.
+
+        Args:
+        - labels (list): the labels of the available values, in the order
+                         given by the camera
+        - key (callable): function converting a label to its number
+        - typecode (str): array typecode of the numbers
+        """
+
+        self.labels = list(labels)
+
+        # Number to the index of its first label
+        self._first = {}
+
+        for idx, label in enumerate(self.labels):
+            self._first.setdefault(key(label), idx)
+
+        ordered = sorted(self._first)
+
+        self.keys = array.array(typecode, ordered)
+        self._order = array.array("l", [self._first[k] for k in ordered])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, value):
+        return value in self._first
+
+    def label(self, value):
+        """The label of an available value, None if not available"""
+
+        idx = self._first.get(value)
+
+        return None if idx is None else self.labels[idx]
+
+    def nearest(self, value):
+        """The available value closest to value
+
+        Returns:
+        - value (number): the closest value or None if the table is empty
+        """
+
+        if value in self._first:
+            return value
+
+        if not self.keys:
+            return None
+
+        pos = bisect.bisect_left(self.keys, value)
+
+        candidates = [i for i in (pos - 1, pos) if 0 <= i < len(self.keys)]
+
+        best = min(
+            candidates,
+            key=lambda i: (abs(self.keys[i] - value), self._order[i]),
+        )
+
+        return self.keys[best]
+
+
+def shutter_table(labels):
+    return ValueTable(labels, shutter_key, "d")
+
+
+def iso_table(labels, endian="<"):
+    return ValueTable(labels, lambda label: iso_key(label, endian), "q")
+
+
+def expcomp_table(labels):
+    return ValueTable(labels, expcomp_key, "d")
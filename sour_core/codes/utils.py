@@ -4,6 +4,72 @@ import decimal
 
 import sour_core.codes.properties as PROPcodes
 
+# Layout of the ISO values: extension, mode and value fields from the
+# most significant bits
+ISO_VALUE_BITS = 24
+ISO_MODE_BITS = 4
+ISO_VALUE_MASK = (1 << ISO_VALUE_BITS) - 1
+ISO_MODE_MASK = (1 << ISO_MODE_BITS) - 1
+
+# Reverse lookup maps keyed by id of the codes dictionary. The dictionary
+# is kept in the entry so that its id cannot be reused, and the length is
+# used to detect the dictionaries extended after the map was built
+_REVERSE_MAPS = {}
+_DATATYPE_MAPS = {}
+_COMBINED = {}
+
+# Endianess character to True if the camera values are big-endian
+_BIG_ENDIAN = {}
+
+
+def _cached_map(cache, codes_dict, build):
+    entry = cache.get(id(codes_dict))
+
+    if entry is None or entry[0] is not codes_dict or entry[1] != len(
+        codes_dict
+    ):
+        entry = (codes_dict, len(codes_dict), build(codes_dict))
+        cache[id(codes_dict)] = entry
+
+    return entry[2]
+
+
+def big_endian(endian):
+    """True if a struct endianess character packs big-endian values"""
+
+    try:
+        return _BIG_ENDIAN[endian]
+    except KeyError:
+        big = struct.pack(endian + "H", 1) == b"\x00\x01"
+        _BIG_ENDIAN[endian] = big
+        return big
+
+
+def reverse_map(codes_dict):
+    """Build the code to name map of a codes dictionary
+
+    If more names share the same code the first one is used, as in a
+    linear search of the dictionary.
+    """
+
+    reverse = {}
+
+    for name, code in codes_dict.items():
+        reverse.setdefault(code, name)
+
+    return reverse
+
+
+def reverse_datatype_map(codes_dict):
+    """Build the code to name map of a datatype-like dictionary"""
+
+    reverse = {}
+
+    for name, item in codes_dict.items():
+        reverse.setdefault(item["Code"], name)
+
+    return reverse
+
 
 def decode_code(codes_dict, code):
     """Find the string corrispond to a specific code
@@ -17,12 +83,9 @@ def decode_code(codes_dict, code):
     """
 
     try:
-        code_name = list(codes_dict.keys())[
-            list(codes_dict.values()).index(code)
-        ]
-    except ValueError:
-        code_name = "Unknown : " + str(hex(code))
-    return code_name
+        return _cached_map(_REVERSE_MAPS, codes_dict, reverse_map)[code]
+    except (KeyError, TypeError):
+        return "Unknown : " + str(hex(code))
 
 
 def decode_datatype(codes_dict, code):
@@ -38,16 +101,19 @@ def decode_datatype(codes_dict, code):
     """
 
     try:
-        idx = list(map(lambda x: x["Code"], codes_dict.values())).index(code)
-        code_name = list(codes_dict.keys())[idx]
-    except ValueError:
-        code_name = "Unknown : " + str(hex(code))
-    return code_name
+        return _cached_map(_DATATYPE_MAPS, codes_dict, reverse_datatype_map)[
+            code
+        ]
+    except (KeyError, TypeError):
+        return "Unknown : " + str(hex(code))
 
 
 def combine_dict(dict_list):
     """Combine Codes dictionaries together
 
+    The result is computed once for each list of dictionaries and shared
+    by the following calls, so it must not be modified.
+
     Args:
     - dict_list (dict): a list with the dictionaries to be comined
 
@@ -56,17 +122,26 @@ def combine_dict(dict_list):
                          all the input dictionaries
     """
 
+    key = tuple(id(d) for d in dict_list)
+
+    entry = _COMBINED.get(key)
+
+    if entry is not None and all(a is b for a, b in zip(entry[0], dict_list)):
+        return entry[1]
+
     final_dict = copy.copy(dict_list[0])
 
     for i in range(len(dict_list) - 1):
-        for key, value in dict_list[i + 1].items():
-            if key in final_dict:
-                if isinstance(final_dict[key], str):
+        for key_, value in dict_list[i + 1].items():
+            if key_ in final_dict:
+                if isinstance(final_dict[key_], str):
                     pass
                 else:
-                    final_dict[key].update(value)
+                    final_dict[key_].update(value)
             else:
-                final_dict[key] = value
+                final_dict[key_] = value
+
+    _COMBINED[key] = (tuple(dict_list), final_dict)
 
     return final_dict
 
@@ -90,7 +165,7 @@ class property:
         elif self.prop == "ExposureBiasCompensation":
             return self.bytes2expcomp(self.val)
         else:
-            if self.prop in list(PROPcodes.SONY_PROPVALUES.keys()):
+            if self.prop in PROPcodes.SONY_PROPVALUES:
                 return decode_code(
                     PROPcodes.SONY_PROPVALUES[self.prop]["Values"], self.val
                 )
@@ -106,10 +181,10 @@ class property:
         elif self.prop == "ExposureBiasCompensation":
             return self.expcomp2bytes(self.val)
         else:
-            if self.prop in list(PROPcodes.SONY_PROPVALUES.keys()):
-                return PROPcodes.SONY_PROPVALUES[self.prop]["Values"].index(
+            if self.prop in PROPcodes.SONY_PROPVALUES:
+                return PROPcodes.SONY_PROPVALUES[self.prop]["Values"][
                     self.val
-                )
+                ]
             return self.val
 
     def bin2ISO(self, val):
@@ -122,13 +197,9 @@ class property:
         - ISO (str): a string with the ISO value
         """
 
-        tmp = bin(val)[2:]
-
-        if len(tmp) < 32:
-            tmp = "0" * (32 - len(tmp)) + tmp
-
-        ISOmode = int(tmp[-28:-24], 2)
-        ISOval = int(tmp[-24:], 2)
+        # Bits 24-27 are the mode and bits 0-23 the value
+        ISOmode = (val >> ISO_VALUE_BITS) & ISO_MODE_MASK
+        ISOval = val & ISO_VALUE_MASK
 
         ISO = ""
 
@@ -171,27 +242,15 @@ class property:
             else:
                 val = int(val)
 
-        ISOval = str(bin(val)[2:])
-
-        if len(ISOval) < 24:
-            ISOval = "0" * (24 - len(ISOval)) + ISOval
-
         if isinstance(mode, str):
-            ISOmode = str(bin(PROPcodes.SONY_ISO_MODE["Values"][mode])[2:])
-        elif isinstance(mode, int):
-            ISOmode = str(bin(mode)[2:])
+            mode = PROPcodes.SONY_ISO_MODE["Values"][mode]
 
-        if len(ISOmode) < 4:
-            ISOmode = "0" * (4 - len(ISOmode)) + ISOmode
+        # The fields are concatenated: a field wider than its slot shifts
+        # the ones above it
+        val_bits = max(ISO_VALUE_BITS, val.bit_length())
+        mode_bits = max(ISO_MODE_BITS, mode.bit_length())
 
-        ISOext = str(bin(ext)[2:])
-
-        if len(ISOext) < 4:
-            ISOext = "0" * (4 - len(ISOext)) + ISOext
-
-        ISOfinal = ISOext + ISOmode + ISOval
-
-        return int(ISOfinal, 2)
+        return (ext << (mode_bits + val_bits)) | (mode << val_bits) | val
 
     def shutter2bytes(self, val):
         """Convert a shutter speed value
@@ -215,11 +274,14 @@ class property:
         return den_bytes + num_bytes
 
     def bytes2shutter(self, val):
-        tmp = struct.pack(self.__endian + "L", val)
+        if not 0 <= val <= 0xFFFFFFFF:
+            raise struct.error(f"Shutter speed out of the u32 range: {val}")
 
-        num = struct.unpack(self.__endian + "H", tmp[2:])[0]
-
-        den = struct.unpack(self.__endian + "H", tmp[:2])[0]
+        # The denominator is the first u16 in the byte order of the camera
+        if big_endian(self.__endian):
+            num, den = val & 0xFFFF, val >> 16
+        else:
+            num, den = val >> 16, val & 0xFFFF
 
         if num >= den:
             return str(num / den)
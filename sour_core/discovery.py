@@ -0,0 +1,298 @@
+import logging
+import threading
+import time
+
+import usb
+
+logger = logging.getLogger()
+
+PTP_USB_CLASS = 0x06
+
+DISCOVERY_INTERVAL = 1.0  # s
+# Age after which a cached scan is refreshed on request
+DISCOVERY_MAX_AGE = 2.0  # s
+
+
+def is_ptp_device(device):
+    """Check if a USB device exposes a PTP interface
+
+    Only the descriptors cached by libusb are used, no string
+    descriptor is read from the device.
+    """
+
+    if device.bDeviceClass == PTP_USB_CLASS:
+        return True
+
+    for cfg in device:
+        intf = usb.util.find_descriptor(cfg, bInterfaceClass=PTP_USB_CLASS)
+        if intf is not None:
+            return True
+
+    return False
+
+
+class CameraInfo:
+    def __init__(self, device):
+        """A camera found on the bus
+
+        The product name and the serial number need a control transfer
+        to be read, so they are read only when requested and cached.
+
+        Args:
+        - device (usb.core.Device): the USB device of the camera
+        """
+
+        self.device = device
+        self.bus = device.bus
+        self.address = device.address
+        self.idVendor = device.idVendor
+        self.idProduct = device.idProduct
+
+        self._strings = {}
+
+    @property
+    def key(self):
+        return (self.bus, self.address)
+
+    def _string(self, name, index):
+        if name not in self._strings:
+            try:
+                self._strings[name] = usb.util.get_string(self.device, index)
+            except (usb.core.USBError, ValueError):
+                # Not cached, the device may answer later
+                return None
+
+        return self._strings[name]
+
+    @property
+    def product(self):
+        return self._string("product", self.device.iProduct)
+
+    @property
+    def serial_number(self):
+        return self._string("serial", self.device.iSerialNumber)
+
+    def __repr__(self):
+        return (
+            f"CameraInfo(bus={self.bus}, address={self.address}, "
+            f"id={self.idVendor:04x}:{self.idProduct:04x})"
+        )
+
+
+class CameraDiscovery:
+    def __init__(self, interval=DISCOVERY_INTERVAL, max_age=DISCOVERY_MAX_AGE):
+        """Cache of the cameras connected to the bus
+
+        The bus is scanned incrementally: every device is classified only
+        the first time it is seen, and a scan just diffs the list of the
+        devices against the cache. The cache can be kept up to date by a
+        background thread, which also notifies the cameras added and
+        removed. pyusb does not expose the libusb hotplug callbacks, so
+        the thread polls the bus every interval sec.
+
+        Args:
+        - interval (float): polling period in sec of the background thread
+        - max_age (float): a request for the cameras triggers a scan if
+                           the last one is older than max_age sec and the
+                           background thread is not running
+        """
+
+        self.interval = interval
+        self.max_age = max_age
+
+        self._cameras = {}
+        # (bus, address, idVendor, idProduct) of the devices that are
+        # not cameras, so that they are not classified again
+        self._ignored = set()
+        self._last_scan = None
+
+        self._subscribers = {}
+        self._next_token = 0
+
+        self._lock = threading.RLock()
+        self._running = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _device_key(device):
+        return (device.bus, device.address, device.idVendor, device.idProduct)
+
+    def scan(self):
+        """Diff the devices on the bus against the cache
+
+        Returns:
+        - added (list): CameraInfo of the new cameras
+        - removed (list): CameraInfo of the cameras disconnected
+        """
+
+        devices = {
+            self._device_key(dev): dev for dev in usb.core.find(find_all=True)
+        }
+
+        added = []
+        removed = []
+
+        with self._lock:
+            for key, dev in devices.items():
+                if key[:2] in self._cameras or key in self._ignored:
+                    continue
+
+                try:
+                    ptp = is_ptp_device(dev)
+                except usb.core.USBError:
+                    continue
+
+                if ptp:
+                    info = CameraInfo(dev)
+                    self._cameras[info.key] = info
+                    added.append(info)
+                else:
+                    self._ignored.add(key)
+
+            present = {key[:2] for key in devices}
+
+            for key in list(self._cameras):
+                if key not in present:
+                    removed.append(self._cameras.pop(key))
+
+            self._ignored &= set(devices)
+            self._last_scan = time.monotonic()
+
+            callbacks = list(self._subscribers.values())
+
+        for info in added:
+            logger.info(f"Camera connected: {info}")
+        for info in removed:
+            logger.info(f"Camera disconnected: {info}")
+
+        for on_added, on_removed in callbacks:
+            for cb, items in ((on_added, added), (on_removed, removed)):
+                if cb is None:
+                    continue
+                for info in items:
+                    try:
+                        cb(info)
+                    except Exception:
+                        logger.exception(f"Error in the callback for {info}")
+
+        return added, removed
+
+    def _refresh(self, refresh):
+        if refresh or (
+            not self.running
+            and (
+                self._last_scan is None
+                or time.monotonic() - self._last_scan > self.max_age
+            )
+        ):
+            self.scan()
+
+    def cameras(self, name=None, refresh=False):
+        """The cameras connected to the bus
+
+        Args:
+        - name (str): if given, only the cameras with name in the product
+                      name are returned
+        - refresh (bool): force a scan of the bus
+
+        Returns:
+        - cameras (list): the CameraInfo of the cameras
+        """
+
+        self._refresh(refresh)
+
+        with self._lock:
+            cameras = list(self._cameras.values())
+
+        if name:
+            cameras = [c for c in cameras if name in (c.product or "")]
+
+        return cameras
+
+    def find(self, name=None, serial_number=None, refresh=False):
+        """Find a single camera by product name and/or serial number
+
+        Returns:
+        - camera (CameraInfo): the first camera matching or None
+        """
+
+        for info in self.cameras(name=name, refresh=refresh):
+            if serial_number is None or info.serial_number == serial_number:
+                return info
+
+        return None
+
+    def subscribe(self, on_added=None, on_removed=None):
+        """Register callbacks for the cameras added and removed
+
+        Args:
+        - on_added (callable): called with the CameraInfo of a new camera
+        - on_removed (callable): called with the CameraInfo of a camera
+                                 disconnected
+
+        Returns:
+        - token (int): token to be used to unsubscribe
+        """
+
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = (on_added, on_removed)
+
+        return token
+
+    def unsubscribe(self, token):
+        """Remove the callbacks registered with subscribe"""
+
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def start(self):
+        """Start polling the bus in a background thread"""
+
+        if self.running:
+            return
+
+        self._running.set()
+        self._thread = threading.Thread(
+            target=self._run, name="CameraDiscovery", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+
+        self._running.clear()
+
+        if self._thread is not None:
+            self._thread.join(self.interval * 2)
+            self._thread = None
+
+    def _run(self):
+        while self.running:
+            try:
+                self.scan()
+            except Exception as err:
+                logger.info(f"Camera discovery cannot scan the bus: {err}")
+
+            time.sleep(self.interval)
+
+
+_discovery = None
+_discovery_lock = threading.Lock()
+
+
+def get_discovery():
+    """The discovery service shared by the whole process"""
+
+    global _discovery
+
+    with _discovery_lock:
+        if _discovery is None:
+            _discovery = CameraDiscovery()
+
+    return _discovery
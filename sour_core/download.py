@@ -0,0 +1,188 @@
+import logging
+import queue
+import re
+import threading
+import time
+
+logger = logging.getLogger()
+
+DOWNLOAD_QUEUE_DEPTH = 2
+QUEUE_POLL = 0.1  # s
+
+
+class DownloadEngine:
+    def __init__(
+        self,
+        connection,
+        max_reading_size=None,
+        queue_depth=DOWNLOAD_QUEUE_DEPTH,
+        tuner=None,
+    ):
+        """Download a file split in chunks requested one by one
+
+        PTP allows a single transaction at a time, so the chunks cannot be
+        requested in parallel. The engine keeps the bus busy by running
+        the chunk transactions back to back on a reader thread, while the
+        chunks already received are written to disk by the caller thread.
+        The chunks are kept in the pooled receive buffers until written,
+        and queue_depth sets how many of them can be waiting.
+
+        Args:
+        - connection (USBconn): the connection used for the transfer
+        - max_reading_size (int): maximum size of a single USB read
+        - queue_depth (int): number of chunks buffered between the reader
+                             and the writer
+        - tuner (TransferTuner): if given, the size of the reads is taken
+                                 from the "chunk" size of the tuner and the
+                                 throughput of every chunk is reported to
+                                 it. max_reading_size is ignored
+        """
+
+        self.connection = connection
+        self.max_reading_size = max_reading_size
+        self.queue_depth = queue_depth
+        self.tuner = tuner
+
+        self.stats = None
+
+    def _reader(self, opId, request, finished, chunks, stop):
+        index = 0
+
+        try:
+            while not stop.is_set():
+                if self.tuner is not None:
+                    size = self.tuner.chunk_size
+                else:
+                    size = self.max_reading_size
+
+                t = time.monotonic()
+
+                result = self.connection.transaction(
+                    opId,
+                    params=request(index),
+                    max_reading_size=size,
+                    zero_copy=True,
+                )
+
+                payload = None
+                if result["Data"] is not None:
+                    payload = result["Data"].get("Payload")
+
+                if self.tuner is not None and payload is not None:
+                    self.tuner.record(
+                        "chunk",
+                        len(payload),
+                        time.monotonic() - t,
+                        limited=result["Data"]["Length"] > size,
+                    )
+
+                last = finished(result["Response"])
+
+                self._put(chunks, (payload, None), stop)
+
+                if last:
+                    break
+
+                index += 1
+
+        except Exception as err:
+            self._put(chunks, (None, err), stop)
+            return
+
+        self._put(chunks, (None, StopIteration()), stop)
+
+    def _put(self, chunks, item, stop):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=QUEUE_POLL)
+                return
+            except queue.Full:
+                pass
+
+        # The writer is gone, the chunk is not needed anymore
+        self.connection.release_view(item[0])
+
+    def download(self, file_name, opId, request, finished, header=None):
+        """Download a file
+
+        Args:
+        - file_name (str): path of the file to be written
+        - opId (int): operation code used to request a chunk
+        - request (callable): function returning the params of the
+                              command for the chunk index given as input
+        - finished (callable): function receiving the decoded Response of
+                               a chunk and returning True if it was the
+                               last one
+        - header (bytes): if given, the bytes before the first occurrence
+                          of header in the first chunk are skipped
+
+        Returns:
+        - stats (dict): the Bytes written, the number of Chunks, the Time
+                        in sec and the average throughput in MBps
+        """
+
+        chunks = queue.Queue(maxsize=self.queue_depth)
+        stop = threading.Event()
+
+        reader = threading.Thread(
+            target=self._reader,
+            args=(opId, request, finished, chunks, stop),
+            name="PTPDownload",
+            daemon=True,
+        )
+
+        written = 0
+        count = 0
+        file_start = None if header else 0
+
+        t = time.monotonic()
+        reader.start()
+
+        try:
+            with open(file_name, "wb") as writer:
+                while True:
+                    payload, err = chunks.get()
+
+                    if isinstance(err, StopIteration):
+                        break
+                    elif err is not None:
+                        raise err
+
+                    count += 1
+
+                    if payload is None:
+                        continue
+
+                    if file_start is None:
+                        found = re.search(re.escape(header), payload)
+                        if found:
+                            file_start = found.start()
+                            written += writer.write(payload[file_start:])
+                    else:
+                        written += writer.write(payload)
+
+                    self.connection.release_view(payload)
+
+        finally:
+            stop.set()
+
+            # Chunks left in the queue by an interrupted download
+            while True:
+                try:
+                    payload, _ = chunks.get_nowait()
+                except queue.Empty:
+                    break
+                self.connection.release_view(payload)
+
+            reader.join()
+
+        elapsed = time.monotonic() - t
+
+        self.stats = {
+            "Bytes": written,
+            "Chunks": count,
+            "Time": elapsed,
+            "MBps": written / elapsed / 2**20 if elapsed > 0 else 0.0,
+        }
+
+        return self.stats
@@ -0,0 +1,304 @@
+import logging
+import queue
+import threading
+import time
+
+import sour_core.codes.registry as registry
+import sour_core.codes.usb as USBcodes
+
+logger = logging.getLogger()
+
+EVENT_READ_TIMEOUT = 0.5  # s
+EVENT_QUEUE_SIZE = 1024
+
+PROP_CHANGED_EVENTS = ("DevicePropChanged", "SonyDevicePropChanged")
+OBJECT_ADDED_EVENTS = ("ObjectAdded", "SonyObjectAdded", "CaptureComplete")
+
+
+class PTPEvent:
+    def __init__(self, code, name, transaction, params, timestamp):
+        """A decoded PTP Event container
+
+        Args:
+        - code (int): the event code
+        - name (str): the decoded name of the event
+        - transaction (int): transaction ID carried by the event
+        - params (tuple): the parameters of the event. For property
+                          changes the first one is the property code
+        - timestamp (float): time.time() when the event was read
+        """
+
+        self.code = code
+        self.name = name
+        self.transaction = transaction
+        self.params = params
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        params = ", ".join(hex(p) for p in self.params)
+        return f"PTPEvent({self.name}, [{params}])"
+
+
+class EventWaiter:
+    def __init__(self, listener, names, predicate=None):
+        """Wait for a specific event
+
+        The waiter needs to be created before triggering the action that
+        generates the event, so that a fast event cannot be missed.
+
+        Args:
+        - listener (EventListener): the listener delivering the events
+        - names (tuple): the event names the waiter reacts to
+        - predicate (callable): optional filter on the event
+        """
+
+        self._listener = listener
+        self.names = names
+        self.predicate = predicate
+        self.event = None
+        self._flag = threading.Event()
+
+    def _match(self, event):
+        if event.name not in self.names:
+            return False
+
+        if self.predicate is not None and not self.predicate(event):
+            return False
+
+        self.event = event
+        self._flag.set()
+
+        return True
+
+    def wait(self, timeout=None):
+        """Block until the event is received
+
+        Args:
+        - timeout (float): maximum time to wait in sec
+
+        Returns:
+        - event (PTPEvent): the event received or None if not received
+        """
+
+        self._flag.wait(timeout)
+
+        self._listener._discard(self)
+
+        return self.event
+
+
+class EventListener:
+    def __init__(self, connection, read_timeout=EVENT_READ_TIMEOUT):
+        """Background listener for the interrupt endpoint
+
+        The listener drains the PTP Event containers sent by the camera,
+        decodes them and puts them in a thread-safe queue. Consumers can
+        also subscribe with callbacks or wait for a specific event.
+
+        Args:
+        - connection (USBconn): the connection to listen to
+        - read_timeout (float): timeout in sec of every single read. It
+                                sets how fast the thread can be stopped
+        """
+
+        self.connection = connection
+        self.read_timeout = read_timeout
+
+        self._EVENTCODES = registry.EVENTCODES
+
+        self.queue = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+
+        self._subscribers = {}
+        self._waiters = []
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+        self._running = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def start(self):
+        """Start the listener thread"""
+
+        if self.running:
+            return
+
+        self._running.set()
+        self._thread = threading.Thread(
+            target=self._run, name="PTPEventListener", daemon=True
+        )
+        self._thread.start()
+
+        logger.info("PTP Event Listener Started")
+
+    def stop(self):
+        """Stop the listener thread"""
+
+        self._running.clear()
+
+        if self._thread is not None:
+            if self._thread is not threading.current_thread():
+                self._thread.join(self.read_timeout * 2)
+            self._thread = None
+
+        logger.info("PTP Event Listener Stopped")
+
+    def subscribe(self, callback, names=None):
+        """Register a callback for the incoming events
+
+        Args:
+        - callback (callable): function called with the PTPEvent as
+                               argument. It runs on the listener thread
+        - names (list): event names the callback is interested in. If
+                        None, the callback gets all the events
+
+        Returns:
+        - token (int): token to be used to unsubscribe
+        """
+
+        if isinstance(names, str):
+            names = (names,)
+
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = (
+                callback,
+                tuple(names) if names else None,
+            )
+
+        return token
+
+    def unsubscribe(self, token):
+        """Remove a callback registered with subscribe"""
+
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def expect(self, names, predicate=None):
+        """Create a waiter for the next matching event
+
+        Args:
+        - names (str or tuple): the event names to wait for
+        - predicate (callable): optional filter on the event
+
+        Returns:
+        - waiter (EventWaiter): call waiter.wait(timeout) after the
+                                action that triggers the event
+        """
+
+        if isinstance(names, str):
+            names = (names,)
+
+        waiter = EventWaiter(self, tuple(names), predicate)
+
+        with self._lock:
+            self._waiters.append(waiter)
+
+        return waiter
+
+    def wait_for(self, names, timeout=None, predicate=None):
+        """Wait for the next matching event
+
+        Returns:
+        - event (PTPEvent): the event received or None if not received
+        """
+
+        return self.expect(names, predicate).wait(timeout)
+
+    def _discard(self, waiter):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def get(self, timeout=None):
+        """Get the next event from the queue
+
+        Returns:
+        - event (PTPEvent): the next event or None if the queue is empty
+        """
+
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def decode(self, msg):
+        """Decode an Event container
+
+        Args:
+        - msg (bytes): the encoded container
+
+        Returns:
+        - event (PTPEvent): the decoded event or None if msg is not an
+                            Event container
+        """
+
+        codec = self.connection._codec
+
+        length, msg_type, code, transaction = codec.decode_header(msg)
+
+        if msg_type != USBcodes.USB_OPERATIONS["Event"]:
+            return None
+
+        length = min(length, len(msg))
+
+        params = tuple(
+            codec.decode_u32(msg, idx)
+            for idx in range(codec.header.size, length - 3, 4)
+        )
+
+        name = registry.eventcode_name(code)
+
+        return PTPEvent(code, name, transaction, params, time.time())
+
+    def dispatch(self, event):
+        """Deliver an event to the queue, the waiters and the callbacks"""
+
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # The oldest event is dropped to keep the latest state
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(event)
+
+        with self._lock:
+            self._waiters = [w for w in self._waiters if not w._match(event)]
+            callbacks = [
+                cb
+                for cb, names in self._subscribers.values()
+                if names is None or event.name in names
+            ]
+
+        for cb in callbacks:
+            try:
+                cb(event)
+            except Exception:
+                logger.exception(f"Error in the callback for {event}")
+
+    def _run(self):
+        while self.running:
+            try:
+                msg = self.connection._receive_event(
+                    timeout=self.read_timeout
+                )
+            except Exception as err:
+                if self.running:
+                    logger.info(f"Event Listener cannot read: {err}")
+                    time.sleep(self.read_timeout)
+                continue
+
+            if msg is None:
+                continue
+
+            event = self.decode(msg)
+
+            if event is not None:
+                logger.debug(f"Received {event}")
+                self.dispatch(event)
@@ -0,0 +1,494 @@
+import array
+import bisect
+import logging
+import os
+import struct
+import threading
+import time
+
+import sour_core.codes.registry as registry
+
+logger = logging.getLogger()
+
+HISTORY_MAGIC = b"SOURHIS"
+HISTORY_VERSION = 1
+
+# Magic, version and wall clock time of creation of a segment
+HISTORY_HEADER = struct.Struct("<7sBd")
+
+# Wall clock time, property code, record kind and value type
+RECORD_HEADER = struct.Struct("<dHBB")
+
+RECORD_DELTA = 0
+# Value of a property repeated at the start of a segment, so that every
+# segment can be read without the ones before it
+RECORD_KEYFRAME = 1
+
+VALUE_NONE = 0
+VALUE_INT = 1
+VALUE_FLOAT = 2
+VALUE_STR = 3
+
+VALUE_INT_STRUCT = struct.Struct("<q")
+VALUE_FLOAT_STRUCT = struct.Struct("<d")
+VALUE_STR_LENGTH = struct.Struct("<H")
+
+SEGMENT_PREFIX = "history_"
+SEGMENT_SUFFIX = ".soh"
+
+HISTORY_SEGMENT_SIZE = 2**20
+HISTORY_MAX_SEGMENTS = 16
+
+
+def property_code(name):
+    """Code of a property name, also for the names of unknown codes"""
+
+    code = registry.PROPCODES["Values"].get(name)
+
+    if code is None and name.startswith("Unknown"):
+        code = int(name.split(":")[1], 16)
+
+    if code is None:
+        raise KeyError(f"Property without code: {name}")
+
+    return code
+
+
+def encode_value(value):
+    """Type tag and bytes of a property value"""
+
+    if value is None:
+        return VALUE_NONE, b""
+    elif isinstance(value, bool) or isinstance(value, int):
+        return VALUE_INT, VALUE_INT_STRUCT.pack(int(value))
+    elif isinstance(value, float):
+        return VALUE_FLOAT, VALUE_FLOAT_STRUCT.pack(value)
+
+    data = str(value).encode("utf-8")
+
+    return VALUE_STR, VALUE_STR_LENGTH.pack(len(data)) + data
+
+
+def decode_value(tag, data, offset=0):
+    """Decode a value encoded by encode_value
+
+    Returns:
+    - value: the decoded value
+    - end (int): the offset after the value
+    """
+
+    if tag == VALUE_NONE:
+        return None, offset
+    elif tag == VALUE_INT:
+        return (
+            VALUE_INT_STRUCT.unpack_from(data, offset)[0],
+            offset + VALUE_INT_STRUCT.size,
+        )
+    elif tag == VALUE_FLOAT:
+        return (
+            VALUE_FLOAT_STRUCT.unpack_from(data, offset)[0],
+            offset + VALUE_FLOAT_STRUCT.size,
+        )
+    elif tag == VALUE_STR:
+        length = VALUE_STR_LENGTH.unpack_from(data, offset)[0]
+        offset += VALUE_STR_LENGTH.size
+        return data[offset : offset + length].decode("utf-8"), offset + length
+
+    raise ValueError(f"Unknown value type {tag}")
+
+
+class HistoryStore:
+    def __init__(
+        self,
+        directory,
+        segment_size=HISTORY_SEGMENT_SIZE,
+        max_segments=HISTORY_MAX_SEGMENTS,
+    ):
+        """Append-only history of the property values
+
+        Only the changes are stored, as small binary records with the wall
+        clock time, the property code and the new value. The records are
+        appended to segment files of at most segment_size bytes, and the
+        oldest segment is deleted when there are more than max_segments,
+        so the disk usage is bounded. Every segment starts with the last
+        values of all the properties, so that the value of a property at
+        any time covered by the history is known.
+
+        The time and the position of the records are indexed in memory for
+        every property, so that a range query is a bisection followed by
+        the reads of the records in the range.
+
+        Args:
+        - directory (str): directory of the segment files. The history
+                           already there is loaded and extended
+        - segment_size (int): maximum size in bytes of a segment file
+        - max_segments (int): maximum number of segment files kept
+        """
+
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Property name to the times, segments and offsets of its records
+        self._times = {}
+        self._segments = {}
+        self._offsets = {}
+
+        # Last value of every property
+        self._last = {}
+
+        # Segment to the keyframes at its start, property name to the
+        # position of its record. They give the values at the start of the
+        # oldest segment, whose previous changes were deleted
+        self._keyframes = {}
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment = None
+
+        existing = self._existing_segments()
+
+        end = None
+
+        for segment in existing:
+            end = self._load_segment(segment)
+
+        if end is not None:
+            # A record truncated by an interrupted write is dropped
+            with open(self._segment_path(existing[-1]), "r+b") as f:
+                f.truncate(end)
+
+            self._open_segment(existing[-1], new=False)
+        else:
+            self._open_segment(existing[-1] + 1 if existing else 0, new=True)
+
+    def _segment_path(self, segment):
+        return os.path.join(
+            self.directory, f"{SEGMENT_PREFIX}{segment:06d}{SEGMENT_SUFFIX}"
+        )
+
+    def _existing_segments(self):
+        segments = []
+
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith(SEGMENT_PREFIX) and file_name.endswith(
+                SEGMENT_SUFFIX
+            ):
+                index = file_name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]
+                if index.isdigit():
+                    segments.append(int(index))
+
+        return sorted(segments)
+
+    def _index(self, name, timestamp, segment, offset):
+        if name not in self._times:
+            self._times[name] = array.array("d")
+            self._segments[name] = array.array("l")
+            self._offsets[name] = array.array("q")
+
+        self._times[name].append(timestamp)
+        self._segments[name].append(segment)
+        self._offsets[name].append(offset)
+
+    def _load_segment(self, segment):
+        with open(self._segment_path(segment), "rb") as f:
+            data = f.read()
+
+        if len(data) < HISTORY_HEADER.size:
+            return None
+
+        magic, version, _ = HISTORY_HEADER.unpack_from(data)
+
+        if magic != HISTORY_MAGIC or version != HISTORY_VERSION:
+            logger.info(f"Skipped history segment {segment}: unknown format")
+            return None
+
+        offset = HISTORY_HEADER.size
+
+        while offset + RECORD_HEADER.size <= len(data):
+            timestamp, code, kind, tag = RECORD_HEADER.unpack_from(
+                data, offset
+            )
+
+            try:
+                value, end = decode_value(
+                    tag, data, offset + RECORD_HEADER.size
+                )
+            except (struct.error, UnicodeDecodeError, ValueError):
+                break
+
+            if end > len(data):
+                break
+
+            name = registry.propcode_name(code)
+
+            if kind == RECORD_DELTA:
+                self._index(name, timestamp, segment, offset)
+            else:
+                self._keyframes.setdefault(segment, {})[name] = offset
+
+            self._last[name] = value
+            offset = end
+
+        return offset
+
+    def _open_segment(self, segment, new):
+        if new:
+            self._file = open(self._segment_path(segment), "wb")
+            self._file.write(
+                HISTORY_HEADER.pack(
+                    HISTORY_MAGIC, HISTORY_VERSION, time.time()
+                )
+            )
+        else:
+            self._file = open(self._segment_path(segment), "ab")
+
+        self._segment = segment
+
+    def _write(self, name, value, timestamp, kind):
+        tag, payload = encode_value(value)
+
+        record = (
+            RECORD_HEADER.pack(timestamp, property_code(name), kind, tag)
+            + payload
+        )
+
+        offset = self._file.tell()
+
+        self._file.write(record)
+
+        return offset
+
+    def _rotate(self, timestamp):
+        self._file.close()
+
+        self._open_segment(self._segment + 1, new=True)
+
+        keyframes = self._keyframes.setdefault(self._segment, {})
+
+        for name, value in self._last.items():
+            keyframes[name] = self._write(
+                name, value, timestamp, RECORD_KEYFRAME
+            )
+
+        self._file.flush()
+
+        segments = self._existing_segments()
+
+        for segment in segments[: max(len(segments) - self.max_segments, 0)]:
+            os.remove(self._segment_path(segment))
+            self._drop_segment(segment)
+
+    def _drop_segment(self, segment):
+        self._keyframes.pop(segment, None)
+
+        for name in list(self._times):
+            first = bisect.bisect_right(self._segments[name], segment)
+
+            del self._times[name][:first]
+            del self._segments[name][:first]
+            del self._offsets[name][:first]
+
+            if not self._times[name]:
+                del self._times[name], self._segments[name]
+                del self._offsets[name]
+
+    def append(self, name, value, timestamp=None):
+        """Record a new value of a property
+
+        Nothing is written if the value did not change.
+
+        Args:
+        - name (str): the property name
+        - value (int, float, str or None): the new value
+        - timestamp (float): time.time() of the change. If None the
+                             current time is used
+
+        Returns:
+        - written (bool): True if the value was recorded
+        """
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            if self._file is None:
+                raise ValueError("History store closed")
+
+            if name in self._last and self._last[name] == value:
+                return False
+
+            if self._file.tell() >= self.segment_size:
+                self._rotate(timestamp)
+
+            offset = self._write(name, value, timestamp, RECORD_DELTA)
+            self._file.flush()
+
+            self._last[name] = value
+            self._index(name, timestamp, self._segment, offset)
+
+        return True
+
+    def names(self):
+        """The properties with a history"""
+
+        with self._lock:
+            return list(self._times)
+
+    def _read(self, name, first, last):
+        """Read the records first to last - 1 of the index of a property"""
+
+        return self._read_records(
+            [
+                (self._segments[name][idx], self._offsets[name][idx])
+                for idx in range(first, last)
+            ]
+        )
+
+    def _read_records(self, positions):
+        """Read the records at a list of (segment, offset)"""
+
+        values = []
+        handles = {}
+
+        try:
+            for segment, offset in positions:
+
+                if segment not in handles:
+                    if segment == self._segment:
+                        self._file.flush()
+                    handles[segment] = open(self._segment_path(segment), "rb")
+
+                f = handles[segment]
+                f.seek(offset)
+
+                header = f.read(RECORD_HEADER.size)
+                timestamp, _, _, tag = RECORD_HEADER.unpack(header)
+
+                if tag == VALUE_STR:
+                    size = VALUE_STR_LENGTH.unpack(
+                        f.read(VALUE_STR_LENGTH.size)
+                    )[0]
+                    value = f.read(size).decode("utf-8")
+                else:
+                    size = {
+                        VALUE_NONE: 0,
+                        VALUE_INT: VALUE_INT_STRUCT.size,
+                        VALUE_FLOAT: VALUE_FLOAT_STRUCT.size,
+                    }[tag]
+                    value, _ = decode_value(tag, f.read(size))
+
+                values.append((timestamp, value))
+        finally:
+            for f in handles.values():
+                f.close()
+
+        return values
+
+    def changes(self, name, start=None, end=None):
+        """The changes of a property in a time range
+
+        Args:
+        - name (str): the property name
+        - start (float): time.time() of the start of the range. If None
+                         from the oldest record
+        - end (float): time.time() of the end of the range, included. If
+                       None up to the last record
+
+        Returns:
+        - changes (list): (timestamp, value) tuples in time order
+        """
+
+        with self._lock:
+            times = self._times.get(name)
+
+            if times is None:
+                return []
+
+            first = 0
+            last = len(times)
+
+            if start is not None:
+                first = bisect.bisect_left(times, start)
+            if end is not None:
+                last = bisect.bisect_right(times, end)
+
+            return self._read(name, first, last)
+
+    def value_at(self, name, timestamp):
+        """The value of a property at a time
+
+        Returns:
+        - value: the value or None if the time is not covered
+        """
+
+        with self._lock:
+            times = self._times.get(name, ())
+
+            idx = bisect.bisect_right(times, timestamp)
+
+            if idx > 0:
+                return self._read(name, idx - 1, idx)[0][1]
+
+            # Before the first change still recorded, the value is the one
+            # at the start of the oldest segment
+            oldest = min(self._keyframes, default=None)
+
+            if oldest is None or name not in self._keyframes[oldest]:
+                return None
+
+            position = (oldest, self._keyframes[oldest][name])
+            keyframe_time, value = self._read_records([position])[0]
+
+            return value if keyframe_time <= timestamp else None
+
+    def disk_usage(self):
+        """Size in bytes of the segment files"""
+
+        with self._lock:
+            return sum(
+                os.path.getsize(self._segment_path(segment))
+                for segment in self._existing_segments()
+            )
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class HistoryRecorder:
+    def __init__(self, camera, store, names=None):
+        """Record the property changes of a camera in a HistoryStore
+
+        The recorder subscribes to the property changes of the camera, so
+        only the values that actually change are written.
+
+        Args:
+        - camera (SONYconn): the camera
+        - store (HistoryStore): the store of the history
+        - names (list): the properties recorded. If None all of them
+        """
+
+        self.camera = camera
+        self.store = store
+        self.names = names
+
+        for name, prop in list(camera.camera_properties.items()):
+            if names is None or name in names:
+                self.store.append(name, prop["CurrentValue"])
+
+        self._token = camera.subscribe_properties(self._on_change, names)
+
+    def _on_change(self, name, old, new):
+        self.store.append(name, new)
+
+    def stop(self):
+        """Stop recording, the store is left open"""
+
+        if self._token is not None:
+            self.camera.unsubscribe_properties(self._token)
+            self._token = None
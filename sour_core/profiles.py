@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+
+# Properties saved in a profile, grouped in the stages they are applied:
+# the program mode changes the values available for the others, so they
+# are compared only after it is applied
+PROFILE_STAGES = (
+    ("ExposureProgramMode",),
+    ("FocusMode", "ShutterSpeed", "ISO"),
+)
+
+PROFILE_PROPERTIES = tuple(prop for stage in PROFILE_STAGES for prop in stage)
+
+
+class Profile:
+    def __init__(self, name, settings):
+        """A named camera configuration
+
+        Args:
+        - name (str): the name of the profile
+        - settings (dict): property name to the label of its value, as
+                           given by CurrentValue, e.g. {"ISO": "400"}
+        """
+
+        unknown = [prop for prop in settings if prop not in PROFILE_PROPERTIES]
+
+        if unknown:
+            raise KeyError(f"Properties not supported in a profile: {unknown}")
+
+        self.name = name
+        self.settings = dict(settings)
+
+    @classmethod
+    def from_properties(cls, name, properties, props=None):
+        """Build a profile from the current camera properties
+
+        Args:
+        - name (str): the name of the profile
+        - properties (dict): the camera properties, e.g. camera_properties
+        - props (list): the properties to be saved. If None all the ones
+                        supported that are available
+
+        Returns:
+        - profile (Profile): the new profile
+        """
+
+        if props is None:
+            props = [p for p in PROFILE_PROPERTIES if p in properties]
+
+        return cls(
+            name, {prop: properties[prop]["CurrentValue"] for prop in props}
+        )
+
+    def diff(self, properties, props=None):
+        """The settings of the profile that differ from the properties
+
+        Args:
+        - properties (dict): the camera properties
+        - props (list): the properties to be compared. If None all the
+                        ones of the profile
+
+        Returns:
+        - changes (dict): property name to the value of the profile
+        """
+
+        if props is None:
+            props = self.settings
+
+        changes = {}
+
+        for prop in props:
+            if prop not in self.settings:
+                continue
+
+            current = properties.get(prop)
+            value = self.settings[prop]
+
+            if current is None or current["CurrentValue"] != value:
+                changes[prop] = value
+
+        return changes
+
+    def to_dict(self):
+        return dict(self.settings)
+
+    def __repr__(self):
+        return f"Profile({self.name}, {self.settings})"
+
+
+class ProfileStore:
+    def __init__(self, file_name):
+        """Named profiles saved in a JSON file
+
+        Args:
+        - file_name (str): path of the JSON file. It is created when the
+                           first profile is saved
+        """
+
+        self.file_name = file_name
+
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.file_name):
+            return {}
+
+        with open(self.file_name, "r") as jfile:
+            return json.load(jfile)
+
+    def _write(self, profiles):
+        tmp = self.file_name + ".tmp"
+
+        with open(tmp, "w") as jfile:
+            json.dump(profiles, jfile, indent=4)
+
+        os.replace(tmp, self.file_name)
+
+    def names(self):
+        """The names of the profiles saved"""
+
+        with self._lock:
+            return list(self._read())
+
+    def save(self, profile):
+        """Save a profile, replacing the one with the same name"""
+
+        with self._lock:
+            profiles = self._read()
+            profiles[profile.name] = profile.to_dict()
+            self._write(profiles)
+
+    def load(self, name):
+        """Load a profile
+
+        Returns:
+        - profile (Profile): the profile saved with name
+        """
+
+        with self._lock:
+            profiles = self._read()
+
+        if name not in profiles:
+            raise KeyError(f"Profile not found: {name}")
+
+        return Profile(name, profiles[name])
+
+    def delete(self, name):
+        """Remove a profile, if saved"""
+
+        with self._lock:
+            profiles = self._read()
+
+            if profiles.pop(name, None) is not None:
+                self._write(profiles)
@@ -0,0 +1,340 @@
+import logging
+import threading
+import time
+
+import sour_core.codes.registry as registry
+
+logger = logging.getLogger()
+
+
+def _field(prop, field):
+    if prop is None or field is None:
+        return prop
+
+    return prop.get(field)
+
+
+def diff_properties(old, new, names=None, field="CurrentValue"):
+    """Compare two snapshots of the properties
+
+    Args:
+    - old (dict): the previous snapshot, property name to its
+                  characteristics
+    - new (dict): the new snapshot
+    - names (list): the properties to be compared. If None all the ones
+                    in the two snapshots
+    - field (str): the characteristic compared, e.g. "CurrentValue". If
+                   None the whole properties are compared
+
+    Returns:
+    - changes (dict): property name to (old value, new value) for the
+                      properties that changed. A property missing from a
+                      snapshot has value None
+    """
+
+    if names is None:
+        names = list(old) + [name for name in new if name not in old]
+
+    changes = {}
+
+    for name in names:
+        before = _field(old.get(name), field)
+        after = _field(new.get(name), field)
+
+        if before != after:
+            changes[name] = (before, after)
+
+    return changes
+
+
+class PropertyCache:
+    def __init__(self, max_age=None, policies=None):
+        """Cache of the properties read from the camera
+
+        Every property keeps the time it was fetched and a generation
+        counter, increased every time the stored value changes. A property
+        is fresh if it was fetched after its last invalidation and it is
+        not older than its max age. The invalidations come from the
+        property change events of the camera and from the setters.
+
+        The times are time.time() values, as the timestamps of the events,
+        so that an event read before a fetch started does not invalidate
+        the value fetched.
+
+        Without a source of invalidations (tracking False) the changes
+        made on the camera body are not seen, so a property without a
+        max age is never fresh.
+
+        Args:
+        - max_age (float): default max age in sec of a property. If None
+                           the properties expire only when invalidated
+        - policies (dict): property name to its own max age in sec
+        """
+
+        self.max_age = max_age
+        self.policies = dict(policies or {})
+
+        # The dictionary exposed as SONYconn.camera_properties. It is
+        # updated in place, so references to it stay valid
+        self.values = {}
+
+        # True while the property change events are delivered to on_event
+        self.tracking = False
+
+        self._fetched = {}
+        self._invalidated = {}
+        self._generations = {}
+        self.generation = 0
+
+        self._subscribers = {}
+        self._next_token = 0
+
+        self._lock = threading.RLock()
+
+    def __contains__(self, name):
+        return name in self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def loaded(self):
+        """True if the properties were read at least once"""
+
+        return self.generation > 0
+
+    def set_policy(self, name, max_age):
+        """Set the max age in sec of a property, None to remove it"""
+
+        with self._lock:
+            if max_age is None:
+                self.policies.pop(name, None)
+            else:
+                self.policies[name] = max_age
+
+    def store(self, vals, timestamp=None, full=False):
+        """Store the properties read from the camera
+
+        Args:
+        - vals (dict): property name to its characteristics
+        - timestamp (float): time.time() when the request was sent. If
+                             None the current time is used
+        - full (bool): True if vals is a complete dump, so the properties
+                       missing from it are removed
+
+        Returns:
+        - updated (list): the names of the properties stored
+        """
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        changes = []
+
+        with self._lock:
+            observed = self._observed()
+
+            for name, prop in vals.items():
+                current = self.values.get(name)
+
+                if name in observed or None in observed:
+                    # The old value is kept only for the observed names
+                    old = None if current is None else current.copy()
+                    changes.append((name, old, self.values.get(name, prop)))
+
+                if current is None:
+                    self.values[name] = prop
+                    self._generations[name] = (
+                        self._generations.get(name, 0) + 1
+                    )
+                elif current != prop:
+                    if hasattr(current, "assign") and hasattr(prop, "assign"):
+                        current.assign(prop)
+                    elif isinstance(current, dict):
+                        current.clear()
+                        current.update(prop)
+                    else:
+                        self.values[name] = prop
+                    self._generations[name] += 1
+
+                self._fetched[name] = timestamp
+
+            if full:
+                for name in [n for n in self.values if n not in vals]:
+                    old = self.values.pop(name)
+                    self._fetched.pop(name, None)
+                    changes.append((name, old, None))
+
+            self.generation += 1
+
+        if changes:
+            self._notify(changes)
+
+        return list(vals)
+
+    def _observed(self):
+        """The names observed by the subscribers, None for all of them"""
+
+        return {
+            name
+            for _, names, _ in self._subscribers.values()
+            for name in (names or (None,))
+        }
+
+    def subscribe(self, callback, names=None, field="CurrentValue"):
+        """Register a callback for the changes of the stored properties
+
+        The callback runs on the thread storing the properties, only when
+        the observed field actually changes.
+
+        Args:
+        - callback (callable): called as callback(name, old, new) with the
+                               old and the new value of the field. They
+                               are None if the property was missing
+        - names (list): the properties observed. If None all of them
+        - field (str): the characteristic observed. If None the callback
+                       gets the whole properties, whenever any of their
+                       characteristics changes
+
+        Returns:
+        - token (int): token to be used to unsubscribe
+        """
+
+        if isinstance(names, str):
+            names = (names,)
+
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = (
+                callback,
+                frozenset(names) if names else None,
+                field,
+            )
+
+        return token
+
+    def unsubscribe(self, token):
+        """Remove a callback registered with subscribe"""
+
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def observed(self, name):
+        """True if a subscriber observes the property"""
+
+        with self._lock:
+            observed = self._observed()
+
+        return None in observed or name in observed
+
+    def _notify(self, changes):
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+
+        for callback, names, field in subscribers:
+            for name, old, new in changes:
+                if names is not None and name not in names:
+                    continue
+
+                before = _field(old, field)
+                after = _field(new, field)
+
+                if before == after:
+                    continue
+
+                try:
+                    callback(name, before, after)
+                except Exception:
+                    logger.exception(f"Error in the callback for {name}")
+
+    def invalidate(self, name=None, timestamp=None):
+        """Mark a property, or all of them if name is None, as stale
+
+        Args:
+        - name (str): name of the property
+        - timestamp (float): time.time() of the change. The values fetched
+                             after it are still fresh
+        """
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            names = list(self.values) if name is None else [name]
+
+            for n in names:
+                self._invalidated[n] = max(
+                    self._invalidated.get(n, timestamp), timestamp
+                )
+
+    def on_event(self, event):
+        """Invalidate the property notified by a PTP event
+
+        It can be subscribed to the property change events of an
+        EventListener. An event without the property code invalidates all
+        the properties.
+        """
+
+        if event.params:
+            name = registry.propcode_name(event.params[0])
+        else:
+            name = None
+
+        self.invalidate(name, event.timestamp)
+
+    def age(self, name):
+        """Time in sec since a property was fetched, None if never fetched"""
+
+        fetched = self._fetched.get(name)
+
+        if fetched is None:
+            return None
+
+        return time.time() - fetched
+
+    def is_fresh(self, name, max_age=None):
+        """Check if a property can be served without asking the camera
+
+        Args:
+        - name (str): name of the property
+        - max_age (float): overrides the policy of the property
+        """
+
+        with self._lock:
+            fetched = self._fetched.get(name)
+
+            if fetched is None:
+                return False
+
+            if fetched < self._invalidated.get(name, fetched):
+                return False
+
+            if max_age is None:
+                max_age = self.policies.get(name, self.max_age)
+
+            if max_age is None:
+                return self.tracking
+
+            return time.time() - fetched <= max_age
+
+    def stale(self, names=None, max_age=None):
+        """The names, among names or all the properties, not fresh"""
+
+        if names is None:
+            names = list(self.values)
+
+        return [n for n in names if not self.is_fresh(n, max_age)]
+
+    def get(self, name, max_age=None):
+        """A property if it is fresh, None otherwise"""
+
+        if not self.is_fresh(name, max_age):
+            return None
+
+        return self.values.get(name)
+
+    def property_generation(self, name):
+        """Number of changes of the value stored for a property"""
+
+        return self._generations.get(name, 0)
@@ -0,0 +1,242 @@
+import array
+import collections.abc
+import sys
+
+import sour_core.codes.utils as code_utils
+import sour_core.codes.sony_misc as SMcodes
+
+# array typecodes with the same size of the standard struct datatypes
+ARRAY_TYPECODES = {
+    "b": "b",
+    "B": "B",
+    "h": "h",
+    "H": "H",
+    "l": "i",
+    "L": "I",
+    "q": "q",
+    "Q": "Q",
+}
+
+NATIVE_ENDIAN = "<" if sys.byteorder == "little" else ">"
+
+RANGE_KEYS = ("MinValue", "MaxValue", "StepValue")
+
+
+def raw_values(view, offset, datatype, count, endian, unpack):
+    """Raw values of an enumeration stored in an array
+
+    Args:
+    - view (memoryview): the buffer with the values
+    - offset (int): position of the first value
+    - datatype (str): struct datatype of the values
+    - count (int): number of values
+    - endian (str): struct endianess character of the buffer
+    - unpack (callable): fallback used for the datatypes without an
+                         array typecode, called as
+                         unpack(view, offset, datatype, count)
+
+    Returns:
+    - values (array or tuple): the raw values
+    """
+
+    typecode = ARRAY_TYPECODES.get(datatype)
+
+    if typecode is None:
+        return unpack(view, offset, datatype, count)
+
+    values = array.array(typecode)
+    values.frombytes(view[offset : offset + count * values.itemsize])
+
+    if endian != NATIVE_ENDIAN and values.itemsize > 1:
+        values.byteswap()
+
+    return values
+
+
+class PropertyDesc(collections.abc.Mapping):
+    __slots__ = (
+        "name",
+        "code",
+        "datatype",
+        "getset",
+        "visibility",
+        "default_raw",
+        "current_raw",
+        "fmt_flag",
+        "range_raw",
+        "photo_raw",
+        "video_raw",
+        "_decode",
+    )
+
+    def __init__(
+        self,
+        name,
+        code,
+        datatype,
+        getset,
+        visibility,
+        default_raw,
+        current_raw,
+        fmt_flag,
+        range_raw=None,
+        photo_raw=None,
+        video_raw=None,
+        decode=None,
+    ):
+        """Description of a camera property
+
+        Only the raw values are stored: the enumerations are kept in
+        arrays and the labels are decoded when they are accessed. The
+        object is a read-only Mapping with the keys of the dictionaries
+        given by the old decoder, so that it can be used in their place.
+
+        Args:
+        - name (str): the property name
+        - code (int): the property code
+        - datatype (str): struct datatype of the values
+        - getset (int): raw GetSet flag
+        - visibility (int): raw visibility code
+        - default_raw: raw factory default value
+        - current_raw: raw current value
+        - fmt_flag (int): 1 for a range, 2 for an enumeration
+        - range_raw (tuple): raw min, max and step for a range
+        - photo_raw (array): raw values available in photo mode
+        - video_raw (array): raw values available in video mode
+        - decode (callable): function (name, raw) returning the label of
+                             a value. If None the raw values are given
+        """
+
+        self.name = name
+        self.code = code
+        self.datatype = datatype
+        self.getset = getset
+        self.visibility = visibility
+        self.default_raw = default_raw
+        self.current_raw = current_raw
+        self.fmt_flag = fmt_flag
+        self.range_raw = range_raw
+        self.photo_raw = photo_raw
+        self.video_raw = video_raw
+        self._decode = decode
+
+    def label(self, raw):
+        """Decoded label of a raw value of the property"""
+
+        if self._decode is None:
+            return raw
+
+        return self._decode(self.name, raw)
+
+    def labels(self, mode="Photo"):
+        """Decoded labels of the values available in a mode"""
+
+        raw = self.photo_raw if mode == "Photo" else self.video_raw
+
+        if raw is None:
+            return None
+
+        return [self.label(val) for val in raw]
+
+    def keys(self):
+        keys = [
+            "PropertyCode",
+            "DataType",
+            "GetSet",
+            "Visibility",
+            "FactoryDefaultValue",
+            "CurrentValue",
+            "FmtFlag",
+        ]
+
+        if self.fmt_flag == 1:
+            keys += RANGE_KEYS
+        elif self.fmt_flag == 2:
+            keys.append("AvailableValues")
+
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __getitem__(self, key):
+        if key == "CurrentValue":
+            return self.label(self.current_raw)
+        elif key == "AvailableValues" and self.fmt_flag == 2:
+            available = {"Photo": self.labels("Photo")}
+            if self.video_raw is not None:
+                available["Video"] = self.labels("Video")
+            return available
+        elif key == "PropertyCode":
+            return self.code
+        elif key == "DataType":
+            return self.datatype
+        elif key == "GetSet":
+            return "GetSet" if self.getset == 1 else "Set"
+        elif key == "Visibility":
+            return code_utils.decode_code(
+                SMcodes.SONY_VISIBILITY["Values"], self.visibility
+            )
+        elif key == "FactoryDefaultValue":
+            return self.label(self.default_raw)
+        elif key == "FmtFlag":
+            return self.fmt_flag
+        elif self.fmt_flag == 1 and key in RANGE_KEYS:
+            return self.range_raw[RANGE_KEYS.index(key)]
+
+        raise KeyError(key)
+
+    def _state(self):
+        return (
+            self.code,
+            self.datatype,
+            self.getset,
+            self.visibility,
+            self.default_raw,
+            self.current_raw,
+            self.fmt_flag,
+            self.range_raw,
+            self.photo_raw,
+            self.video_raw,
+        )
+
+    def __eq__(self, other):
+        if isinstance(other, PropertyDesc):
+            return self._state() == other._state()
+
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def copy(self):
+        """Shallow copy, the raw arrays are shared"""
+
+        return PropertyDesc(
+            self.name,
+            *self._state(),
+            decode=self._decode,
+        )
+
+    def assign(self, other):
+        """Take the values of another description of the same property
+
+        Used to update a property in place, so that the references to it
+        stay valid.
+        """
+
+        for attr in PropertyDesc.__slots__:
+            setattr(self, attr, getattr(other, attr))
+
+    def to_dict(self):
+        """The property as plain dictionaries and lists, e.g. for JSON"""
+
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self):
+        return f"PropertyDesc({self.name}, {self['CurrentValue']!r})"
@@ -0,0 +1,498 @@
+import sour_core.ptp_codec as ptp_codec
+import sour_core.codes.utils as code_utils
+import sour_core.codes.registry as registry
+import sour_core.property_desc as property_desc
+
+# Code, DataType, GetSet and Visibility of a property
+PROPERTY_HEADER_LAYOUT = "HHBB"
+
+# The count of the video values is below this value, while the code of
+# the next property is above it
+VIDEO_COUNT_LIMIT = 0x1000
+
+# Maximum number of decoded entries kept by a parser
+ENTRY_CACHE_SIZE = 4096
+
+# Maximum number of decoded values kept by a parser
+VALUE_CACHE_SIZE = 8192
+
+
+class PropertyParser:
+    def __init__(self, endian="<"):
+        """Parser of the property dumps of GetAllDevicePropData
+
+        The dump is walked once on a memoryview with precompiled structs.
+        The offsets of the properties can be indexed without decoding the
+        values, so that single properties can be decoded on demand. Most
+        of the entries do not change between two dumps, so the decoded
+        entries are memoized on their raw bytes and only the entries that
+        changed are decoded again.
+
+        The properties are given as PropertyDesc, which keep the raw
+        values and decode the labels when they are accessed.
+
+        The static part of every entry, i.e. everything after the current
+        value, is kept for each property code. It can be saved and loaded
+        with static_descriptors and load_static, so that a camera seen
+        before needs only the current values to be decoded.
+
+        Args:
+        - endian (str): struct endianess character of the camera
+        """
+
+        self.endian = endian
+
+        self._count = ptp_codec.get_struct(endian, "Q")
+        self._header = ptp_codec.get_struct(endian, PROPERTY_HEADER_LAYOUT)
+        self._u8 = ptp_codec.get_struct(endian, "B")
+        self._u16 = ptp_codec.get_struct(endian, "H")
+
+        self._decoders = {}
+        self._memo = {}
+        self._entries = {}
+
+        # Property code to the static part of its entry: datatype code,
+        # GetSet, the raw tail bytes, the size of a value and a template
+        # PropertyDesc with the decoded tail
+        self._static = {}
+
+        # Incremented whenever a decoded entry changes the static parts
+        self.static_version = 0
+
+    def _struct(self, datatype):
+        return ptp_codec.get_struct(self.endian, datatype)
+
+    def _unpack(self, view, offset, datatype, count):
+        """Unpack count consecutive values of a datatype
+
+        Datatypes made of more fields (e.g. "qq") give their first field,
+        as the single value decoder did.
+        """
+
+        if len(datatype) == 1 and datatype != "s":
+            return ptp_codec.get_struct(
+                self.endian, str(count) + datatype
+            ).unpack_from(view, offset)
+
+        single = self._struct(datatype)
+
+        return tuple(
+            single.unpack_from(view, offset + idx * single.size)[0]
+            for idx in range(count)
+        )
+
+    def _value_decoder(self, name):
+        """Return the function converting a raw value of a property
+
+        The conversions are the same of codes.utils.property.decoder
+        """
+
+        try:
+            return self._decoders[name]
+        except KeyError:
+            pass
+
+        conv = code_utils.property(name, None, self.endian)
+
+        if name == "ISO":
+            func = conv.bin2ISO
+        elif name == "ShutterSpeed":
+            func = conv.bytes2shutter
+        elif name == "ExposureBiasCompensation":
+            func = conv.bytes2expcomp
+        elif name in registry.PROPVALUES:
+            names = registry.PROPVALUES[name]["Values"]
+
+            def func(val):
+                return code_utils.decode_code(names, val)
+
+        else:
+            func = None
+
+        self._decoders[name] = func
+
+        return func
+
+    def _decode_value(self, name, val):
+        key = (name, val)
+
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+
+        func = self._value_decoder(name)
+
+        out = func(val) if func is not None else val
+
+        if isinstance(out, bytes):
+            out = out.decode("utf-8")
+
+        # Values such as the battery level or the focus position keep
+        # changing, so the memo is bounded like the entry cache
+        if len(self._memo) >= VALUE_CACHE_SIZE:
+            self._memo.clear()
+
+        self._memo[key] = out
+
+        return out
+
+    def _skip_values(self, view, offset, size):
+        """Offset after an enumeration of values starting at offset"""
+
+        count = self._u16.unpack_from(view, offset)[0]
+
+        return offset + 2 + count * size
+
+    def _property_end(self, view, offset):
+        """Walk a property without decoding its values
+
+        Returns:
+        - code (int): the property code
+        - end (int): the offset after the property
+        """
+
+        code, dt_code, _, _ = self._header.unpack_from(view, offset)
+
+        datatype = registry.datatype_name(dt_code)
+        size = self._struct(datatype).size
+
+        offset += self._header.size + 2 * size
+
+        fmt_flag = self._u8.unpack_from(view, offset)[0]
+        offset += 1
+
+        if fmt_flag == 1:
+            offset += 3 * size
+        elif fmt_flag == 2:
+            offset = self._skip_values(view, offset, size)
+
+            if self._has_video(view, offset):
+                offset = self._skip_values(view, offset, size)
+
+        return code, offset
+
+    def _has_video(self, view, offset):
+        if offset + 2 > len(view):
+            return False
+
+        return self._u16.unpack_from(view, offset)[0] < VIDEO_COUNT_LIMIT
+
+    def index(self, msg):
+        """Build the offset index of a dump
+
+        Args:
+        - msg (bytes-like): the payload of GetAllDevicePropData
+
+        Returns:
+        - index (dict): property name to (offset, end) of its entry
+        """
+
+        view = memoryview(msg)
+
+        count = self._count.unpack_from(view)[0]
+        offset = self._count.size
+
+        index = {}
+
+        for _ in range(count):
+            code, end = self._property_end(view, offset)
+            index[registry.propcode_name(code)] = (offset, end)
+            offset = end
+
+        return index
+
+    def decode(self, msg, offset=0):
+        """Decode a single property
+
+        Args:
+        - msg (bytes-like): a buffer with the property entry
+        - offset (int): position of the entry in msg
+
+        Returns:
+        - property_name (str): the name of the property
+        - vals (PropertyDesc): the property characteristics, with the
+                               keys of the old decoder
+        - end (int): the offset after the property entry
+        """
+
+        view = msg if isinstance(msg, memoryview) else memoryview(msg)
+
+        known = self._decode_known(view, offset)
+
+        if known is not None:
+            return known
+
+        _, end = self._property_end(view, offset)
+
+        key = view[offset:end].tobytes()
+
+        try:
+            property_name, template = self._entries[key]
+        except KeyError:
+            property_name, template, _ = self._decode_entry(view, offset)
+
+            if len(self._entries) >= ENTRY_CACHE_SIZE:
+                self._entries.clear()
+
+            self._entries[key] = (property_name, template)
+
+        # The cached entry is never handed out, as the cache updates the
+        # properties in place. The copies share the raw arrays
+        return property_name, template.copy(), end
+
+    def _decode_known(self, view, offset):
+        """Decode an entry whose static part is known
+
+        Returns:
+        - (property_name, vals, end) or None if the static part of the
+          entry is not known or it changed
+        """
+
+        code, dt_code, getset, visibility = self._header.unpack_from(
+            view, offset
+        )
+
+        static = self._static.get(code)
+
+        if static is None or static[0] != dt_code or static[1] != getset:
+            return None
+
+        _, _, tail, size, t = static
+
+        start = offset + self._header.size
+
+        # The tail can grow at its end, e.g. with a video list, so the
+        # entry is walked before being compared
+        _, end = self._property_end(view, offset)
+
+        if view[start + 2 * size : end] != tail:
+            return None
+
+        default, current = self._unpack(view, start, t.datatype, 2)
+
+        vals = property_desc.PropertyDesc(
+            t.name,
+            code,
+            t.datatype,
+            getset,
+            visibility,
+            default,
+            current,
+            t.fmt_flag,
+            t.range_raw,
+            t.photo_raw,
+            t.video_raw,
+            t._decode,
+        )
+
+        return t.name, vals, end
+
+    def _decode_tail(self, view, offset, datatype, size):
+        """Decode the part of an entry after the current value
+
+        Returns:
+        - fmt_flag (int): 1 for a range, 2 for an enumeration
+        - range_raw (tuple): raw min, max and step of a range
+        - photo (array): raw values available in photo mode
+        - video (array): raw values available in video mode
+        - end (int): the offset after the entry
+        """
+
+        fmt_flag = self._u8.unpack_from(view, offset)[0]
+        offset += 1
+
+        range_raw = photo = video = None
+
+        if fmt_flag == 1:
+            range_raw = self._unpack(view, offset, datatype, 3)
+            offset += 3 * size
+
+        elif fmt_flag == 2:
+            photo, offset = self._raw_values(view, offset, datatype, size)
+
+            if self._has_video(view, offset):
+                video, offset = self._raw_values(view, offset, datatype, size)
+
+        return fmt_flag, range_raw, photo, video, offset
+
+    def _store_static(self, code, dt_code, getset, tail):
+        """Keep the static part of an entry, given as raw tail bytes"""
+
+        datatype = registry.datatype_name(dt_code)
+        size = self._struct(datatype).size
+
+        fmt_flag, range_raw, photo, video, _ = self._decode_tail(
+            memoryview(tail), 0, datatype, size
+        )
+
+        template = property_desc.PropertyDesc(
+            registry.propcode_name(code),
+            code,
+            datatype,
+            getset,
+            None,
+            None,
+            None,
+            fmt_flag,
+            range_raw,
+            photo,
+            video,
+            decode=self._decode_value,
+        )
+
+        self._static[code] = (dt_code, getset, tail, size, template)
+
+    def static_descriptors(self):
+        """The static parts of the entries decoded
+
+        Returns:
+        - descriptors (dict): property code to (datatype code, GetSet,
+                              raw bytes of the entry after the current
+                              value)
+        """
+
+        return {
+            code: (static[0], static[1], static[2])
+            for code, static in self._static.items()
+        }
+
+    def load_static(self, descriptors):
+        """Load static parts saved with static_descriptors"""
+
+        for code, (dt_code, getset, tail) in descriptors.items():
+            self._store_static(code, dt_code, getset, bytes(tail))
+
+    def _decode_entry(self, view, offset):
+        """Decode a single property without the entry cache"""
+
+        code, dt_code, getset, visibility = self._header.unpack_from(
+            view, offset
+        )
+        offset += self._header.size
+
+        property_name = registry.propcode_name(code)
+        datatype = registry.datatype_name(dt_code)
+
+        size = self._struct(datatype).size
+
+        default, current = self._unpack(view, offset, datatype, 2)
+        offset += 2 * size
+
+        tail_start = offset
+
+        fmt_flag, range_raw, photo, video, offset = self._decode_tail(
+            view, offset, datatype, size
+        )
+
+        vals = property_desc.PropertyDesc(
+            property_name,
+            code,
+            datatype,
+            getset,
+            visibility,
+            default,
+            current,
+            fmt_flag,
+            range_raw,
+            photo,
+            video,
+            decode=self._decode_value,
+        )
+
+        tail = view[tail_start:offset].tobytes()
+
+        static = self._static.get(code)
+
+        if static is None or static[:3] != (dt_code, getset, tail):
+            self.static_version += 1
+
+        self._static[code] = (dt_code, getset, tail, size, vals)
+
+        return property_name, vals, offset
+
+    def _raw_values(self, view, offset, datatype, size):
+        count = self._u16.unpack_from(view, offset)[0]
+        offset += 2
+
+        raw = property_desc.raw_values(
+            view, offset, datatype, count, self.endian, self._unpack
+        )
+
+        return raw, offset + count * size
+
+    def parse(self, msg):
+        """Decode all the properties of a dump
+
+        Args:
+        - msg (bytes-like): the payload of GetAllDevicePropData
+
+        Returns:
+        - properties (dict): property name to its characteristics
+        """
+
+        view = msg if isinstance(msg, memoryview) else memoryview(msg)
+
+        count = self._count.unpack_from(view)[0]
+        offset = self._count.size
+
+        properties = {}
+
+        for _ in range(count):
+            name, vals, offset = self.decode(view, offset)
+            properties[name] = vals
+
+        return properties
+
+
+class PropertyDump:
+    def __init__(self, parser, msg):
+        """A property dump decoded on demand
+
+        Only the offset index is built when the dump is received, while
+        the properties are decoded the first time they are accessed.
+
+        Args:
+        - parser (PropertyParser): the parser of the camera
+        - msg (bytes): the payload of GetAllDevicePropData
+        """
+
+        self.parser = parser
+        self.msg = bytes(msg)
+        self.offsets = parser.index(self.msg)
+
+        self._decoded = {}
+
+    def __contains__(self, name):
+        return name in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __getitem__(self, name):
+        try:
+            return self._decoded[name]
+        except KeyError:
+            pass
+
+        offset, _ = self.offsets[name]
+        _, vals, _ = self.parser.decode(self.msg, offset)
+
+        self._decoded[name] = vals
+
+        return vals
+
+    def raw(self, name):
+        """The encoded entry of a property"""
+
+        offset, end = self.offsets[name]
+
+        return self.msg[offset:end]
+
+    def to_dict(self):
+        """Decode all the properties"""
+
+        return {name: self[name] for name in self.offsets}
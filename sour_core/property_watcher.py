@@ -0,0 +1,108 @@
+import logging
+import threading
+
+import sour_core.events as events
+import sour_core.codes.registry as registry
+
+logger = logging.getLogger()
+
+# Time waited after a change event to collect the following ones in a
+# single refresh
+WATCH_COALESCE = 0.02  # s
+
+
+class PropertyWatcher:
+    def __init__(self, camera, coalesce=WATCH_COALESCE):
+        """Refresh the observed properties notified by the camera events
+
+        The property change events only carry the property code, so the
+        watcher reads the new values of the properties observed by the
+        subscribers of the property cache. The refresh runs on its own
+        thread, so that the event listener is never blocked by a USB
+        transaction. The events received within coalesce sec are served
+        by a single refresh.
+
+        Args:
+        - camera (SONYconn): the camera whose properties are watched
+        - coalesce (float): time in sec to wait for further events before
+                            refreshing
+        """
+
+        self.camera = camera
+        self.coalesce = coalesce
+
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._token = None
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self, listener):
+        """Start watching the events of an EventListener"""
+
+        if self._running:
+            return
+
+        self._running = True
+        self._token = listener.subscribe(
+            self._on_event, events.PROP_CHANGED_EVENTS
+        )
+
+        self._thread = threading.Thread(
+            target=self._run, name="PropertyWatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, listener=None):
+        """Stop watching the events"""
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        if listener is not None and self._token is not None:
+            listener.unsubscribe(self._token)
+
+        self._token = None
+
+        if self._thread is not None:
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+
+    def _on_event(self, event):
+        if not event.params:
+            return
+
+        name = registry.propcode_name(event.params[0])
+
+        if not self.camera.property_cache.observed(name):
+            return
+
+        with self._cond:
+            self._pending.add(name)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+
+                if not self._running:
+                    return
+
+                # Wait for the burst of events to end
+                self._cond.wait(self.coalesce)
+
+                names = list(self._pending)
+                self._pending.clear()
+
+            try:
+                self.camera.refresh_properties(names)
+            except Exception as err:
+                logger.info(f"Property watcher cannot refresh {names}: {err}")
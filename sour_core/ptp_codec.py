@@ -0,0 +1,159 @@
+import struct
+
+BASE_PTP_MSG_LENGTH = 12
+
+# Length, MsgType, OpCode, TransactionId
+PTP_HEADER_LAYOUT = "LHHL"
+
+# The native mode "@" aligns the fields and uses the native sizes, which
+# the single struct of a container must not do. Its byte order is kept
+# with the standard sizes and no padding
+STANDARD_ENDIAN = {"@": "="}
+
+_STRUCT_CACHE = {}
+
+
+def get_struct(endian, layout):
+    """Return a compiled struct for a given endianess and layout
+
+    The compiled objects are cached at module level, so every layout
+    is parsed only once during the lifetime of the process.
+
+    Args:
+    - endian (str): struct endianess character (e.g. "<")
+    - layout (str): struct format without the endianess character
+
+    Returns:
+    - compiled (struct.Struct): the compiled struct
+    """
+
+    key = (endian, layout)
+
+    try:
+        return _STRUCT_CACHE[key]
+    except KeyError:
+        compiled = struct.Struct(endian + layout)
+        _STRUCT_CACHE[key] = compiled
+        return compiled
+
+
+def flatten_params(params):
+    """Flatten the dict-based params into datatypes and values
+
+    Args:
+    - params (dict): a dictionary with the same structure used by
+                     USBconn._PTPMsg, i.e. each item has a DataType and
+                     a Value key that can be either single items or
+                     lists of the same length
+
+    Returns:
+    - datatypes (list): the struct datatype of each value
+    - values (list): the values to be packed
+    """
+
+    datatypes = []
+    values = []
+
+    if not params:
+        return datatypes, values
+
+    for item in params.values():
+        if isinstance(item["Value"], list):
+            datatypes.extend(item["DataType"])
+            values.extend(item["Value"])
+        else:
+            datatypes.append(item["DataType"])
+            values.append(item["Value"])
+
+    return datatypes, values
+
+
+class PTPCodec:
+    def __init__(self, endian="<"):
+        """Encoder and decoder of PTP containers
+
+        The codec packs the header and all the parameters of a container
+        in a single struct call and decodes the header of an incoming
+        container with a single unpack.
+
+        Args:
+        - endian (str): struct endianess character used by the camera.
+                        "@" is used as "="
+        """
+
+        self.endian = STANDARD_ENDIAN.get(endian, endian)
+        self.header = get_struct(self.endian, PTP_HEADER_LAYOUT)
+        self._u32 = get_struct(self.endian, "L")
+        self._layouts = {}
+
+    def _params_struct(self, datatypes, values):
+        """Return the compiled struct for a container with params"""
+
+        if any(isinstance(v, (bytes, bytearray)) for v in values):
+            layout = PTP_HEADER_LAYOUT + "".join(
+                str(len(v)) + "s" if isinstance(v, (bytes, bytearray)) else dt
+                for dt, v in zip(datatypes, values)
+            )
+            return get_struct(self.endian, layout)
+
+        key = tuple(datatypes)
+
+        try:
+            return self._layouts[key]
+        except KeyError:
+            compiled = get_struct(
+                self.endian, PTP_HEADER_LAYOUT + "".join(datatypes)
+            )
+            self._layouts[key] = compiled
+            return compiled
+
+    def encode(self, msg_type, opcode, transaction=0, datatypes=(), values=()):
+        """Encode a PTP container
+
+        Args:
+        - msg_type (int): container type (Command, Data, ...)
+        - opcode (int): operation code of the container
+        - transaction (int): transaction ID
+        - datatypes (list): struct datatypes of the params
+        - values (list): values of the params. Bytes values are
+                         appended as they are
+
+        Returns:
+        - msg (bytes): the encoded container
+        """
+
+        if not values:
+            return self.header.pack(
+                BASE_PTP_MSG_LENGTH, msg_type, opcode, transaction
+            )
+
+        compiled = self._params_struct(datatypes, values)
+
+        return compiled.pack(
+            compiled.size, msg_type, opcode, transaction, *values
+        )
+
+    def encode_params(self, msg_type, opcode, transaction=0, params=None):
+        """Encode a PTP container starting from the dict-based params"""
+
+        datatypes, values = flatten_params(params)
+
+        return self.encode(msg_type, opcode, transaction, datatypes, values)
+
+    def decode_header(self, msg, offset=0):
+        """Decode the header of a PTP container
+
+        Args:
+        - msg (bytes-like): the incoming container
+        - offset (int): position of the container in msg
+
+        Returns:
+        - header (tuple): Length, MsgType, OpCode and TransactionId
+        """
+
+        return self.header.unpack_from(msg, offset)
+
+    def decode_u32(self, msg, offset=0):
+        """Decode a single 32-bit parameter"""
+
+        return self._u32.unpack_from(msg, offset)[0]
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Maximum time to find the camera again and restore the session, and the
+# interval between two searches of the camera
+RECONNECT_TIMEOUT = 5.0  # s
+RECONNECT_INTERVAL = 0.02  # s
+
+# Number of recoveries kept in the metrics
+RECOVERY_HISTORY = 100
+
+
+class ReconnectManager:
+    def __init__(
+        self, camera, timeout=RECONNECT_TIMEOUT, interval=RECONNECT_INTERVAL
+    ):
+        """Restore the connection to a camera after a transport failure
+
+        The manager is called by the transaction engine when a transaction
+        fails on the transport. It finds the same physical camera again
+        through Transport.reopen (by serial number for USB), moves the
+        connection to the new transport, opens the session again with the
+        handshake and keeps the transaction IDs and the known properties,
+        which are marked as stale. The failed transaction is then run
+        again by the engine.
+
+        Every recovery is recorded in recoveries, with the time taken to
+        recover.
+
+        Args:
+        - camera (SONYconn): the camera to be recovered
+        - timeout (float): maximum time in sec for a recovery
+        - interval (float): time in sec between two attempts to find the
+                            camera
+        """
+
+        self.camera = camera
+        self.timeout = timeout
+        self.interval = interval
+
+        self.recoveries = []
+
+        self._lock = threading.Lock()
+        self._enabled = False
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    def enable(self):
+        """Recover the transactions that fail on the transport"""
+
+        self.camera.connection.transactions.recovery = self.recover
+        self._enabled = True
+
+    def disable(self):
+        self.camera.connection.transactions.recovery = None
+        self._enabled = False
+
+    @property
+    def last_recovery(self):
+        """The metrics of the last recovery, None if there was none"""
+
+        return self.recoveries[-1] if self.recoveries else None
+
+    def _record(self, start, error, attempts, recovered):
+        duration = time.monotonic() - start
+
+        self.recoveries.append(
+            {
+                "Time": time.time(),
+                "Error": str(error),
+                "Attempts": attempts,
+                "Recovered": recovered,
+                "RecoveryTime": duration,
+            }
+        )
+
+        if len(self.recoveries) > RECOVERY_HISTORY:
+            del self.recoveries[0]
+
+        if recovered:
+            logger.info(f"Connection recovered in {duration * 1000:.1f} ms")
+        else:
+            logger.info(f"Connection not recovered after {duration:.2f} s")
+
+    def _find_transport(self, deadline):
+        """Wait for the camera to be available again
+
+        Returns:
+        - transport (Transport): the new transport or None
+        - attempts (int): the number of searches done
+        """
+
+        old = self.camera.connection.transport
+
+        attempts = 0
+
+        while True:
+            attempts += 1
+
+            new = old.reopen()
+
+            if new is not None or time.monotonic() >= deadline:
+                return new, attempts
+
+            time.sleep(self.interval)
+
+    def recover(self, error):
+        """Restore the connection after a transport error
+
+        Args:
+        - error (Exception): the error of the transport
+
+        Returns:
+        - recovered (bool): True if the session is open again
+        """
+
+        with self._lock:
+            start = time.monotonic()
+            deadline = start + self.timeout
+
+            logger.info(f"Transport failure, reconnecting: {error}")
+
+            connection = self.camera.connection
+            tid = connection.transactions.current_id
+
+            new, attempts = self._find_transport(deadline)
+
+            if new is None:
+                self._record(start, error, attempts, False)
+                return False
+
+            connection.replace_transport(new)
+            connection.transactions.reset(tid)
+
+            try:
+                recovered = self.camera.resume_session()
+            except Exception as err:
+                logger.info(f"Cannot resume the session: {err}")
+                recovered = False
+
+            if recovered:
+                # The camera may have changed while it was not reachable
+                self.camera.property_cache.invalidate()
+
+            self._record(start, error, attempts, recovered)
+
+            return recovered
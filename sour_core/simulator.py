@@ -0,0 +1,780 @@
+import collections
+import heapq
+import itertools
+import logging
+import time
+
+import sour_core.transport as transport
+import sour_core.ptp_codec as ptp_codec
+import sour_core.codes.registry as registry
+import sour_core.codes.usb as USBcodes
+import sour_core.codes.properties as PROPcodes
+import sour_core.codes.datatype as DTcodes
+import sour_core.codes.response as RESPcodes
+import sour_core.codes.sony_misc as SMcodes
+
+logger = logging.getLogger()
+
+LIVE_VIEW_HANDLE = 0xFFFFC002
+
+JPEG_START = b"\xff\xd8\xff\xe0"
+JPEG_END = b"\xff\xd9"
+MP4_START = b"\x00\x00\x00\x18\x66\x74\x79\x70"
+
+# Bytes sent by the camera before the file in the first GetFile chunk
+FILE_PREFIX_LENGTH = 16
+
+# Name, datatype, current value, photo values and video values of the
+# properties exposed by the simulated camera. The values are the raw ones
+# sent on the wire
+DEFAULT_PROPERTIES = [
+    (
+        "ExposureProgramMode",
+        "L",
+        PROPcodes.SONY_EXPMODE["Values"]["Photo_M"],
+        list(PROPcodes.SONY_EXPMODE["Values"].values()),
+        list(PROPcodes.SONY_EXPMODE["Values"].values()),
+    ),
+    (
+        "FocusMode",
+        "H",
+        PROPcodes.SONY_FOCUS_MODE["Values"]["AF_S"],
+        list(PROPcodes.SONY_FOCUS_MODE["Values"].values()),
+        list(PROPcodes.SONY_FOCUS_MODE["Values"].values()),
+    ),
+    (
+        "ISO",
+        "L",
+        100,
+        [PROPcodes.SONY_ISO_AUTO]
+        + [100, 125, 160, 200, 250, 320, 400, 500, 640, 800, 1000]
+        + [1250, 1600, 2000, 2500, 3200, 4000, 5000, 6400, 12800],
+        [PROPcodes.SONY_ISO_AUTO]
+        + [100, 200, 400, 800, 1600, 3200, 6400, 12800],
+    ),
+    (
+        "ShutterSpeed",
+        "L",
+        (1 << 16) | 250,
+        [(30 << 16) | 1, (10 << 16) | 1, (1 << 16) | 1, (1 << 16) | 2]
+        + [(1 << 16) | den for den in (4, 8, 15, 30, 60, 125, 250, 500)]
+        + [(1 << 16) | den for den in (1000, 2000, 4000, 8000)],
+        [(1 << 16) | den for den in (30, 60, 125, 250, 500, 1000)],
+    ),
+    (
+        "ExposureBiasCompensation",
+        "h",
+        0,
+        list(range(-3000, 3001, 333)),
+        list(range(-3000, 3001, 333)),
+    ),
+    ("FocusFound", "B", 1, None, None),
+    ("ManualFocusDistance", "H", 50, None, None),
+    ("BatteryLevel", "b", 80, None, None),
+]
+
+# Raw values of FocusFound
+FOCUS_SEARCHING = 1
+FOCUS_FOUND = 2
+
+
+class SimulatedProperty:
+    def __init__(self, code, datatype, current, photo=None, video=None):
+        """A device property of the simulated camera
+
+        Args:
+        - code (int): the property code
+        - datatype (str): struct datatype of the values
+        - current (int): the current raw value
+        - photo (list): raw values available in photo mode. If None, the
+                        property has no enumeration
+        - video (list): raw values available in video mode
+        """
+
+        self.code = code
+        self.datatype = datatype
+        self.default = current
+        self.current = current
+        self.photo = photo
+        self.video = video if video is not None else photo
+
+    def encode(self, endian):
+        """Encode the property with the layout of GetAllDevicePropData"""
+
+        dt_code = DTcodes.PTP_DATATYPE["Values"][self.datatype]["Code"]
+
+        fmt_flag = 0 if self.photo is None else 2
+
+        layout = "HHBB" + self.datatype * 2 + "B"
+        values = [self.code, dt_code, 1, 1, self.default, self.current]
+        values.append(fmt_flag)
+
+        if fmt_flag == 2:
+            for items in (self.photo, self.video):
+                layout += "H" + self.datatype * len(items)
+                values.append(len(items))
+                values.extend(items)
+
+        return ptp_codec.get_struct(endian, layout).pack(*values)
+
+
+class SimulatedCamera:
+    def __init__(
+        self,
+        model="ILCE-7M3",
+        serial_number="00000000000000000000000000000001",
+        firmware="3.01",
+        endian="<",
+        command_latency=0.002,
+        data_rate=40 * 2**20,
+        event_latency=0.01,
+        af_latency=0.1,
+        capture_latency=0.2,
+        ready_latency=0.0,
+        control_latency=0.0,
+        press_latency=0.0,
+        live_view_size=200 * 2**10,
+        live_view_frame=None,
+        photo_size=8 * 2**20,
+        file_chunk_size=2**20,
+        extra_properties=150,
+    ):
+        """Behavioural model of a Sony camera speaking PTP
+
+        The camera answers the commands used by SONYconn with containers
+        that follow the same layout of a real camera, with a timing set
+        by the latencies and by the data rate. It is driven through a
+        SimulatedTransport.
+
+        Args:
+        - model (str): the model name of the camera
+        - serial_number (str): the serial number of the camera
+        - firmware (str): the firmware version of the camera, returned as
+                          DeviceVersion by GetDeviceInfo
+        - endian (str): struct endianess character of the containers
+        - command_latency (float): time in sec between the end of the
+                                   command and the first container sent
+                                   back by the camera
+        - data_rate (float): transfer rate in bytes/s of the data phase
+        - event_latency (float): time in sec between a property change
+                                 and its event
+        - af_latency (float): time in sec for the autofocus to lock
+        - capture_latency (float): time in sec between the release of
+                                   the shutter and the new object
+        - ready_latency (float): time in sec after the session is opened
+                                 during which the vendor commands are
+                                 answered with DeviceBusy
+        - control_latency (float): time in sec after a control command
+                                   during which the next control command
+                                   is answered with DeviceBusy
+        - press_latency (float): minimum time in sec the shutter button
+                                 must be held down to take a photo
+        - live_view_size (int): size in bytes of a live view frame
+        - live_view_frame (bytes): JPEG returned as live view frame. If
+                                   None, a synthetic payload framed as a
+                                   JPEG is generated
+        - photo_size (int): size in bytes of a captured photo
+        - file_chunk_size (int): size in bytes of a GetFile chunk
+        - extra_properties (int): number of additional vendor properties
+                                  returned in the property dump, to get
+                                  the same payload size of a real camera
+        """
+
+        self.model = model
+        self.serial_number = serial_number
+        self.firmware = firmware
+        self.endian = endian
+
+        self.command_latency = command_latency
+        self.data_rate = data_rate
+        self.event_latency = event_latency
+        self.af_latency = af_latency
+        self.capture_latency = capture_latency
+        self.ready_latency = ready_latency
+        self.control_latency = control_latency
+        self.press_latency = press_latency
+
+        self.live_view_size = live_view_size
+        self.photo_size = photo_size
+        self.file_chunk_size = file_chunk_size
+
+        self._codec = ptp_codec.PTPCodec(endian)
+
+        self._OPCODES = registry.OPCODES
+        self._PROPCODES = registry.PROPCODES
+        self._EVENTCODES = registry.EVENTCODES
+        self._RESPCODES = RESPcodes.RESPCODES["Values"]
+
+        self.properties = collections.OrderedDict()
+
+        for name, datatype, current, photo, video in DEFAULT_PROPERTIES:
+            code = self._PROPCODES["Values"][name]
+            self.properties[code] = SimulatedProperty(
+                code, datatype, current, photo, video
+            )
+
+        for idx in range(extra_properties):
+            code = 0xD300 + idx
+            self.properties[code] = SimulatedProperty(
+                code, "H", idx, list(range(8)), list(range(4))
+            )
+
+        if live_view_frame is None:
+            live_view_frame = self._synthetic_file(
+                JPEG_START, JPEG_END, live_view_size
+            )
+
+        self.live_view_frame = live_view_frame
+
+        self.session_open = False
+        self.ready_at = 0.0
+        self.attached_at = 0.0
+
+        # End of the busy time of the last control command and time the
+        # shutter button was pressed
+        self.control_busy_until = 0.0
+        self.pressed_at = None
+        self.recording = False
+
+        # Properties changed since the last dump, for the changed-only
+        # mode of GetAllDevicePropData
+        self.changed = set()
+
+        self.files = collections.OrderedDict()
+        self._next_object = 1
+
+        self.outgoing = collections.deque()
+        self.events = collections.deque()
+
+        self._timers = []
+        self._timer_count = itertools.count()
+
+        self._handlers = {
+            "GetDeviceInfo": self._device_info,
+            "OpenSession": self._open_session,
+            "CloseSession": self._close_session,
+            "MTPSession": self._open_session,
+            "SDIOConnect": self._sdio_connect,
+            "SDIOGetExtDeviceInfo": self._ext_device_info,
+            "GetAllDevicePropData": self._all_properties,
+            "SonyGetDevicePropDesc": self._property_desc,
+            "SetControlDeviceA": self._set_control_a,
+            "SetControlDeviceB": self._set_control_b,
+            "GetObject": self._get_object,
+            "GetFile": self._get_file,
+            "SendRequest": self._ok,
+            "EnableTrustedFileOp": self._ok,
+        }
+
+        # Commands followed by a data phase from the host
+        self.data_out = (
+            self._OPCODES["Values"]["SetControlDeviceA"],
+            self._OPCODES["Values"]["SetControlDeviceB"],
+            self._OPCODES["Values"]["EnableTrustedFileOp"],
+        )
+
+    @staticmethod
+    def _synthetic_file(start, end, size):
+        """Build a payload of a given size framed by start and end"""
+
+        body = size - len(start) - len(end)
+        pattern = bytes(range(0x20, 0x7F))
+
+        return (
+            start
+            + (pattern * (body // len(pattern) + 1))[: max(body, 0)]
+            + end
+        )
+
+    def add_file(self, name, content=None, size=None, download_code=None):
+        """Store a new file in the camera
+
+        Args:
+        - name (str): the file name
+        - content (bytes): the content of the file. If None a synthetic
+                           file of the given size is generated
+        - size (int): size in bytes of the synthetic file
+        - download_code (int): code returned by the camera at the end of
+                               the download. If None, one is generated
+
+        Returns:
+        - file_code (int): the code to be used to download the file
+        """
+
+        if content is None:
+            if name.upper().endswith("MP4"):
+                content = self._synthetic_file(
+                    MP4_START, b"", size or self.photo_size
+                )
+            else:
+                content = self._synthetic_file(
+                    JPEG_START, JPEG_END, size or self.photo_size
+                )
+
+        file_code = self._next_object
+        self._next_object += 1
+
+        if download_code is None:
+            download_code = 0x10000000 | file_code
+
+        self.files[file_code] = {
+            "Name": name,
+            "Content": content,
+            "DownloadCode": download_code,
+        }
+
+        return file_code
+
+    def schedule(self, delay, func, *args):
+        """Run func after delay sec of simulated time"""
+
+        heapq.heappush(
+            self._timers,
+            (time.monotonic() + delay, next(self._timer_count), func, args),
+        )
+
+    def next_timer(self):
+        """Time of the next scheduled action or None"""
+
+        return self._timers[0][0] if self._timers else None
+
+    def advance(self, now):
+        """Run all the actions scheduled before now"""
+
+        while self._timers and self._timers[0][0] <= now:
+            _, _, func, args = heapq.heappop(self._timers)
+            func(*args)
+
+    def emit_event(self, name, *params):
+        """Queue an Event container on the interrupt channel"""
+
+        code = self._EVENTCODES["Values"][name]
+
+        msg = self._codec.encode(
+            USBcodes.USB_OPERATIONS["Event"],
+            code,
+            0,
+            ["L"] * len(params),
+            list(params),
+        )
+
+        self.events.append([time.monotonic(), msg, 0])
+
+    def set_property(self, code, value):
+        """Change a property and notify the change with an event"""
+
+        prop = self.properties[code]
+
+        if prop.current == value:
+            return
+
+        prop.current = value
+        self.changed.add(code)
+
+        self.schedule(
+            self.event_latency, self.emit_event, "SonyDevicePropChanged", code
+        )
+
+    def command(self, opcode, transaction, params, data=None):
+        """Run a command and queue the containers sent back
+
+        Args:
+        - opcode (int): the operation code
+        - transaction (int): the transaction ID
+        - params (tuple): the u32 params of the command
+        - data (bytes): the payload of the data phase sent by the host
+        """
+
+        name = registry.opcode_name(opcode)
+
+        handler = self._handlers.get(name)
+
+        if handler is None:
+            payload, resp, resp_params = None, "OperationNotSupported", ()
+        elif not self.session_open and name not in (
+            "GetDeviceInfo",
+            "OpenSession",
+            "MTPSession",
+        ):
+            payload, resp, resp_params = None, "SessionNotOpen", ()
+        elif time.monotonic() < self.ready_at and name not in (
+            "OpenSession",
+            "CloseSession",
+            "MTPSession",
+        ):
+            payload, resp, resp_params = None, "DeviceBusy", ()
+        elif name in (
+            "SetControlDeviceA",
+            "SetControlDeviceB",
+        ) and time.monotonic() < self.control_busy_until:
+            payload, resp, resp_params = None, "DeviceBusy", ()
+        else:
+            payload, resp, resp_params = handler(params, data)
+
+        ready = time.monotonic() + self.command_latency
+
+        if payload is not None:
+            msg = self._codec.encode(
+                USBcodes.USB_OPERATIONS["Data"],
+                opcode,
+                transaction,
+                ["s"],
+                [bytes(payload)],
+            )
+            ready += len(msg) / self.data_rate
+            self.outgoing.append([ready, msg, 0])
+
+        msg = self._codec.encode(
+            USBcodes.USB_OPERATIONS["Response"],
+            self._RESPCODES[resp],
+            transaction,
+            ["L"] * len(resp_params),
+            list(resp_params),
+        )
+        self.outgoing.append([ready, msg, 0])
+
+    def unplug(self, duration=0.0):
+        """Drop the session and the queued containers, as on a USB reset
+
+        Args:
+        - duration (float): time in sec before the camera is back on the
+                            bus
+        """
+
+        self.session_open = False
+        self.outgoing.clear()
+        self.events.clear()
+        self.attached_at = time.monotonic() + duration
+
+    def _ok(self, params, data):
+        return None, "OK", ()
+
+    def _ptp_string(self, text):
+        if not text:
+            return b"\x00"
+
+        codec = "utf-16-le" if self.endian == "<" else "utf-16-be"
+
+        return bytes([len(text) + 1]) + (text + "\x00").encode(codec)
+
+    def _ptp_array(self, values):
+        return ptp_codec.get_struct(
+            self.endian, "L" + "H" * len(values)
+        ).pack(len(values), *values)
+
+    def _device_info(self, params, data):
+        # DeviceInfo dataset of the PTP specification, with the Sony
+        # vendor extension
+        header = ptp_codec.get_struct(self.endian, "HLH")
+        u16 = ptp_codec.get_struct(self.endian, "H")
+
+        payload = b"".join(
+            [
+                header.pack(100, 0x11, 100),
+                self._ptp_string("Sony PTP Extensions"),
+                u16.pack(0),
+                self._ptp_array(sorted(self._OPCODES["Values"].values())),
+                self._ptp_array(sorted(self._EVENTCODES["Values"].values())),
+                self._ptp_array(list(self.properties)),
+                self._ptp_array([]),
+                self._ptp_array([0x3801]),
+                self._ptp_string("Sony Corporation"),
+                self._ptp_string(self.model),
+                self._ptp_string(self.firmware),
+                self._ptp_string(self.serial_number),
+            ]
+        )
+
+        return payload, "OK", ()
+
+    def _open_session(self, params, data):
+        if self.session_open:
+            return None, "SessionAlreadyOpened", ()
+
+        self.session_open = True
+        self.ready_at = time.monotonic() + self.ready_latency
+
+        return None, "OK", ()
+
+    def _close_session(self, params, data):
+        self.session_open = False
+
+        return None, "OK", ()
+
+    def _sdio_connect(self, params, data):
+        return bytes(8), "OK", ()
+
+    def _ext_device_info(self, params, data):
+        # Protocol version followed by the codes of the supported
+        # properties and controls
+        codes = list(self.properties)
+
+        payload = ptp_codec.get_struct(
+            self.endian, "HL" + "H" * len(codes)
+        ).pack(params[0] if params else 0, len(codes), *codes)
+
+        return payload, "OK", ()
+
+    def property_dump(self, codes=None):
+        """Encode the payload of GetAllDevicePropData
+
+        Args:
+        - codes (list): the properties to be included. If None all the
+                        properties are included
+        """
+
+        if codes is None:
+            codes = list(self.properties)
+
+        return ptp_codec.get_struct(self.endian, "Q").pack(
+            len(codes)
+        ) + b"".join(self.properties[c].encode(self.endian) for c in codes)
+
+    def _all_properties(self, params, data):
+        # A non zero param requests only the properties changed since the
+        # last dump
+        if params and params[0]:
+            codes = [c for c in self.properties if c in self.changed]
+        else:
+            codes = None
+
+        self.changed.clear()
+
+        return self.property_dump(codes), "OK", ()
+
+    def _property_desc(self, params, data):
+        if not params or params[0] not in self.properties:
+            return None, "DevicePropNotSupported", ()
+
+        self.changed.discard(params[0])
+
+        return self.properties[params[0]].encode(self.endian), "OK", ()
+
+    def _decode_value(self, code, data):
+        prop = self.properties[code]
+
+        return ptp_codec.get_struct(self.endian, prop.datatype).unpack_from(
+            data
+        )[0]
+
+    def _control_done(self):
+        self.control_busy_until = time.monotonic() + self.control_latency
+
+    def _set_control_a(self, params, data):
+        code = params[0]
+
+        if code not in self.properties or data is None:
+            return None, "DevicePropNotSupported", ()
+
+        self.set_property(code, self._decode_value(code, data))
+        self._control_done()
+
+        return None, "OK", ()
+
+    def _set_control_b(self, params, data):
+        code = params[0]
+        values = self._PROPCODES["Values"]
+
+        if data is None:
+            return None, "ParameterNotSupported", ()
+
+        if code == values["FocusDistance"]:
+            step = ptp_codec.get_struct(self.endian, "h").unpack_from(data)[0]
+            prop = self.properties[values["ManualFocusDistance"]]
+            self.set_property(prop.code, min(max(prop.current + step, 0), 100))
+            self._control_done()
+
+            return None, "OK", ()
+
+        button = ptp_codec.get_struct(
+            self.endian, SMcodes.SONY_BUTTON["DataType"]
+        ).unpack_from(data)[0]
+        down = button == SMcodes.SONY_BUTTON["Values"]["Down"]
+
+        if code == values["AutoFocus"]:
+            focus = values["FocusFound"]
+            if down:
+                self.set_property(focus, FOCUS_SEARCHING)
+                self.schedule(
+                    self.af_latency, self.set_property, focus, FOCUS_FOUND
+                )
+            else:
+                self.set_property(focus, FOCUS_SEARCHING)
+
+        elif code == values["Capture"]:
+            now = time.monotonic()
+            if down:
+                self.pressed_at = now
+            else:
+                if (
+                    self.pressed_at is not None
+                    and now - self.pressed_at >= self.press_latency
+                ):
+                    self.schedule(self.capture_latency, self._new_photo)
+
+                self.pressed_at = None
+
+        elif code == values["Movie"]:
+            if not down:
+                self.recording = not self.recording
+                if not self.recording:
+                    self.schedule(self.capture_latency, self._new_movie)
+
+        else:
+            return None, "DevicePropNotSupported", ()
+
+        return None, "OK", ()
+
+    def _new_photo(self):
+        handle = self.add_file(f"DSC{self._next_object:05d}.JPG")
+        self.emit_event("SonyObjectAdded", handle)
+
+    def _new_movie(self):
+        handle = self.add_file(f"C{self._next_object:04d}.MP4")
+        self.emit_event("SonyObjectAdded", handle)
+
+    def _get_object(self, params, data):
+        if params and params[0] == LIVE_VIEW_HANDLE:
+            # Offset and size of the frame precede the JPEG
+            header = ptp_codec.get_struct(self.endian, "LL").pack(
+                8, len(self.live_view_frame)
+            )
+            return header + self.live_view_frame, "OK", ()
+
+        if params and params[0] in self.files:
+            return self.files[params[0]]["Content"], "OK", ()
+
+        return None, "InvalidObjectHandle", ()
+
+    def _get_file(self, params, data):
+        if not params or params[0] not in self.files:
+            return None, "InvalidObjectHandle", ()
+
+        # The params are packed as L, B, B, B, B, L, L, so the chunk
+        # counters are spread across the u32 params
+        raw = ptp_codec.get_struct(self.endian, "L" * len(params)).pack(
+            *params
+        )
+        counter1, counter2 = ptp_codec.get_struct(
+            self.endian, "BL"
+        ).unpack_from(raw, 7)
+
+        index = counter2 * 32 + counter1 // 8
+
+        item = self.files[params[0]]
+        content = item["Content"]
+
+        start = index * self.file_chunk_size
+        chunk = content[start : start + self.file_chunk_size]
+
+        if index == 0:
+            chunk = bytes(FILE_PREFIX_LENGTH) + chunk
+
+        if start + self.file_chunk_size >= len(content):
+            return chunk, "OK", (item["DownloadCode"],)
+
+        return chunk, "OK", (0,)
+
+
+class SimulatedTransport(transport.QueuedTransport):
+    def __init__(self, camera=None, **kwargs):
+        """Transport connected to an in-process simulated camera
+
+        Args:
+        - camera (SimulatedCamera): the camera to be used. If None, a
+                                    camera is created with kwargs
+        - kwargs: the keyword arguments of SimulatedCamera
+        """
+
+        super().__init__()
+
+        if camera is None:
+            camera = SimulatedCamera(**kwargs)
+
+        self.camera = camera
+        self.serial_number = camera.serial_number
+
+        # The camera queues its containers straight in the channels
+        self.incoming = camera.outgoing
+        self.events = camera.events
+
+        self._codec = ptp_codec.PTPCodec(camera.endian)
+        self._out = bytearray()
+        self._pending = None
+        self.connected = True
+
+    def _poll(self, now):
+        if not self.connected:
+            raise transport.TransportError("Device disconnected")
+
+        self.camera.advance(now)
+
+    def disconnect(self, duration=0.0):
+        """Simulate the camera unplugged for duration sec
+
+        The transport fails from now on, the camera drops the session and
+        the containers not read yet, and it can be reopened only after
+        duration sec.
+        """
+
+        with self._cond:
+            self.connected = False
+            self.camera.unplug(duration)
+            self._cond.notify_all()
+
+    def reopen(self):
+        if time.monotonic() < self.camera.attached_at:
+            return None
+
+        return SimulatedTransport(camera=self.camera)
+
+    def _next_wakeup(self):
+        return self.camera.next_timer()
+
+    def write(self, data, timeout=None):
+        with self._cond:
+            if not self.connected:
+                raise transport.TransportError("Device disconnected")
+
+            self._out += data
+
+            while len(self._out) >= ptp_codec.BASE_PTP_MSG_LENGTH:
+                length = self._codec.decode_u32(self._out)
+
+                if len(self._out) < length:
+                    break
+
+                msg = bytes(self._out[:length])
+                del self._out[:length]
+
+                self._handle(msg)
+
+            self._cond.notify_all()
+
+        return len(data)
+
+    def _handle(self, msg):
+        length, msg_type, opcode, tid = self._codec.decode_header(msg)
+
+        if msg_type == USBcodes.USB_OPERATIONS["Command"]:
+            params = tuple(
+                self._codec.decode_u32(msg, idx)
+                for idx in range(ptp_codec.BASE_PTP_MSG_LENGTH, length - 3, 4)
+            )
+
+            if opcode in self.camera.data_out:
+                self._pending = (opcode, tid, params)
+            else:
+                self.camera.command(opcode, tid, params)
+
+        elif msg_type == USBcodes.USB_OPERATIONS["Data"]:
+            if self._pending is None or self._pending[1] != tid:
+                logger.info(f"Simulator got unexpected data for {tid}")
+                return
+
+            opcode, tid, params = self._pending
+            self._pending = None
+
+            self.camera.command(
+                opcode, tid, params, msg[ptp_codec.BASE_PTP_MSG_LENGTH :]
+            )
@@ -12,9 +12,21 @@ from fractions import Fraction
 import decimal
 
 import sour_core.usb_connection as USBconn
+import sour_core.events as events
+import sour_core.download as download
+import sour_core.property_parser as property_parser
+import sour_core.property_cache as property_cache
+import sour_core.property_watcher as property_watcher
+import sour_core.profiles as profiles
+import sour_core.history as history
+import sour_core.capabilities as capabilities
+import sour_core.reconnect as reconnect
+import sour_core.calibration as calibration
 
 # Codes Import
 import sour_core.codes.utils as code_utils
+import sour_core.codes.registry as registry
+import sour_core.codes.tables as tables
 import sour_core.codes.usb as USBcodes
 import sour_core.codes.operational as OPcodes
 import sour_core.codes.properties as PROPcodes
@@ -24,7 +36,7 @@ import sour_core.codes.fileops as FOcodes
 
 
 if logging.getLogger().hasHandlers():
-    camera_logger = logging.getself.logger()
+    camera_logger = logging.getLogger("CameraLog")
 
 else:
     path = os.path.dirname(os.path.realpath(__file__))
@@ -44,35 +56,206 @@ else:
     )
     camera_logger = logging.getLogger("CameraLog")
 
+
+# Settings accepted by apply_settings, in the order they are applied.
+# The program mode goes first as it changes the available values
+BATCH_SETTINGS = {
+    "programmode": "ExposureProgramMode",
+    "focusmode": "FocusMode",
+    "shutterspeed": "ShutterSpeed",
+    "iso": "ISO",
+}
+
+
+# Maximum time the camera can answer DeviceBusy after the session is
+# opened, and the interval between the retries
+BUSY_TIMEOUT = 2.0  # s
+BUSY_RETRY_INTERVAL = 0.01  # s
+
+
 class SONYconn:
     def __init__(self, name, **kwargs):
         self.name = name
 
         camera = kwargs.get("camera", None)
+        transport = kwargs.get("transport", None)
         self.logger = kwargs.get("log", camera_logger)
 
-        if camera:
+        if transport is not None:
+            self.connection = USBconn.USBconn(transport=transport)
+        elif camera:
             self.connection = USBconn.USBconn(camera=camera)
         else:
             self.connection = USBconn.USBconn()
 
-        self._OPCODES = code_utils.combine_dict(OPcodes.OPCODES)
-        self._PROPCODES = code_utils.combine_dict(PROPcodes.PROPCODES)
-
-        self.transactionID = 0
+        self._OPCODES = registry.OPCODES
+        self._PROPCODES = registry.PROPCODES
 
         self._session_open = False
         self.sessionID = 0
         self.prop_loaded = False
         self.__endian = self.connection._endian
+        self._prop_parser = property_parser.PropertyParser(self.__endian)
+        self._targeted_refresh = True
+        self.property_cache = property_cache.PropertyCache(
+            max_age=kwargs.get("max_age", None),
+            policies=kwargs.get("cache_policies", None),
+        )
+        self._cache_token = None
+        self._watcher = property_watcher.PropertyWatcher(self)
+        self._value_tables = {}
+        self.history = None
+        self.capabilities = kwargs.get(
+            "capabilities", capabilities.CapabilityDatabase()
+        )
+        self.device_info = None
+        self._static_version = None
+        self.busy_timeout = kwargs.get("busy_timeout", BUSY_TIMEOUT)
+        self.init_timing = None
+        self._control_mode = "RemoteControl"
+        self.latency_store = kwargs.get(
+            "latency_store", calibration.LatencyStore()
+        )
+        self.delays = calibration.LatencyProfile()
+        self.reconnect = reconnect.ReconnectManager(self)
+        if kwargs.get("reconnect", True):
+            self.reconnect.enable()
         self.__video_modes = ["Movie", "HiFrameRate"]
         self.__photo_count = 0
         self._recording_status = False
         
+    @property
+    def camera_properties(self):
+        """The last known values of the properties, see property_cache"""
+
+        return self.property_cache.values
+
+    @camera_properties.setter
+    def camera_properties(self, vals):
+        self._merge_properties(vals, full=True)
+
+    @property
+    def transactionID(self):
+        """The transaction ID that will be used by the next command"""
+
+        return self.connection.transactions.current_id
+
+    @transactionID.setter
+    def transactionID(self, value):
+        self.connection.transactions.reset(value)
+
     def close_usb_connection(self):
         
+        self.reconnect.disable()
+        self.stop_history()
+
         self.connection._release_usb()
 
+    def start_events(self):
+        """Start listening to the events sent by the camera
+
+        Once the listener is running, the waits after the setters and
+        the autofocus end as soon as the camera notifies the change.
+
+        Returns:
+        - events (EventListener): the listener, which exposes the event
+                                  queue and the subscription API
+        """
+
+        listener = self.connection.start_event_listener()
+
+        if self._cache_token is None:
+            self._cache_token = listener.subscribe(
+                self.property_cache.on_event, events.PROP_CHANGED_EVENTS
+            )
+
+            # The changes made while the listener was not running are lost
+            self.property_cache.invalidate()
+            self.property_cache.tracking = True
+
+        self._watcher.start(listener)
+
+        return listener
+
+    def stop_events(self):
+        """Stop listening to the events sent by the camera"""
+
+        self.connection.stop_event_listener()
+
+        self._watcher.stop(self.connection.events)
+
+        if self._cache_token is not None:
+            self.connection.events.unsubscribe(self._cache_token)
+            self._cache_token = None
+            self.property_cache.tracking = False
+
+    def subscribe_properties(self, callback, names=None, field="CurrentValue"):
+        """Get notified when properties change
+
+        The callback is called only when a value actually changes, after
+        any read of the properties. Once start_events is called, the
+        observed properties notified by the camera are also read in the
+        background, so the changes made on the camera body are notified
+        without polling.
+
+        Args:
+        - callback (callable): called as callback(name, old, new)
+        - names (list): the properties observed. If None all of them
+        - field (str): the characteristic observed. If None the callback
+                       gets the whole properties
+
+        Returns:
+        - token (int): token to be used with unsubscribe_properties
+        """
+
+        return self.property_cache.subscribe(callback, names, field)
+
+    def unsubscribe_properties(self, token):
+        """Remove a callback registered with subscribe_properties"""
+
+        self.property_cache.unsubscribe(token)
+
+    def _expect_prop_change(self, prop=None):
+        """Prepare a wait for a property change notified by the camera
+
+        Args:
+        - prop (str): name of the property. If None, any property change
+                      ends the wait
+
+        Returns:
+        - waiter (EventWaiter): the waiter or None if the event listener
+                                is not running
+        """
+
+        listener = self.connection.events
+
+        if listener is None or not listener.running:
+            return None
+
+        if prop is None:
+            predicate = None
+        else:
+            code = self._PROPCODES["Values"][prop]
+
+            def predicate(event):
+                return len(event.params) > 0 and event.params[0] == code
+
+        return listener.expect(events.PROP_CHANGED_EVENTS, predicate)
+
+    def _settle(self, waiter, delay):
+        """Wait for the camera to apply a command
+
+        Args:
+        - waiter (EventWaiter): if available the wait ends as soon as
+                                the event is received
+        - delay (float): maximum time to wait in sec
+        """
+
+        if waiter is None:
+            time.sleep(delay)
+        else:
+            waiter.wait(delay)
+
     def _session_handler(self, ControlMode="RemoteControl"):
         """
         Handle the session to the USB camera device
@@ -104,15 +287,7 @@ class SONYconn:
                 cmd = self._OPCODES["Values"]["CloseSession"]
                 params = {"Msg": {"Value": self.sessionID, "DataType": "L"}}
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            cmd,
-            params=params,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        resp = self.connection._decode_msg(PTPmsg)
+        resp = self.connection.transaction(cmd, params=params)["Response"]
 
         if resp["MsgType"] == "Response":
             if resp["RespCode"] == "OK":
@@ -129,8 +304,6 @@ class SONYconn:
                 else:
                     self.logger.info("Cannot Close Session to Camera")
 
-        self.transactionID += 1
-
     def __handshake(self, count, key1=0, key2=0):
         """Generate a handshake for the USB connection
 
@@ -147,17 +320,9 @@ class SONYconn:
             "Msg": {"Value": [count, key1, key2], "DataType": ["L"] * 3}
         }
 
-        _ = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            self._OPCODES["Values"]["SDIOConnect"],
-            params=params,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        resp = self.connection._decode_msg(self.connection._receive())
-
-        self.transactionID += 1
+        resp = self._busy_transaction(
+            self._OPCODES["Values"]["SDIOConnect"], params=params
+        )["Response"]
 
         if resp["MsgType"] == "Response":
             return resp["RespCode"]
@@ -178,32 +343,50 @@ class SONYconn:
 
         params = {"Msg": {"Value": code, "DataType": "L"}}
 
-        _ = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            self._OPCODES["Values"]["SDIOGetExtDeviceInfo"],
-            params=params,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        resp = self.connection._decode_msg(self.connection._receive())
-
-        self.transactionID += 1
+        resp = self._busy_transaction(
+            self._OPCODES["Values"]["SDIOGetExtDeviceInfo"], params=params
+        )["Response"]
 
         if resp["MsgType"] == "Response":
             return resp["RespCode"]
         else:
             return None
 
-    def initialize_camera(self, ControlMode="RemoteControl"):
-        """Initialize the camera. The full handshake has been
-        found using reverse engineering
+    def _busy_transaction(self, cmd, params=None, timeout=None):
+        """Run a transaction, repeating it while the camera is busy
 
         Args:
-        - ControlMode (str): The specific mode to control the camera
+        - cmd (int): the operation code
+        - params (dict): the params of the command
+        - timeout (float): maximum time in sec to retry. If None
+                           busy_timeout
+
+        Returns:
+        - result (dict): the result of the last transaction
         """
 
-        self._session_handler(ControlMode=ControlMode)
+        if timeout is None:
+            timeout = self.busy_timeout
+
+        deadline = time.monotonic() + timeout
+
+        while True:
+            result = self.connection.transaction(cmd, params=params)
+
+            if (
+                result["Response"]["RespCode"] != "DeviceBusy"
+                or time.monotonic() >= deadline
+            ):
+                return result
+
+            time.sleep(BUSY_RETRY_INTERVAL)
+
+    def _sdio_handshake(self):
+        """Run the handshake that gives the control of the camera
+
+        Returns:
+        - ok (bool): True if all the steps were accepted
+        """
 
         resp = []
 
@@ -213,17 +396,80 @@ class SONYconn:
         resp.append(self.__handshake(3))
         resp.append(self.__sony_info())
 
-        if all(list(map(lambda r: r == "OK", resp))):
+        return all(r == "OK" for r in resp)
+
+    def resume_session(self):
+        """Open the session again after the camera was reconnected
+
+        The session is opened in the last control mode used and the
+        handshake is repeated. The device info and the properties are
+        not read again.
+
+        Returns:
+        - resumed (bool): True if the camera accepted the session and the
+                          handshake
+        """
+
+        self._session_open = False
+        self._session_handler(ControlMode=self._control_mode)
+
+        if not self._session_open:
+            return False
+
+        return self._sdio_handshake()
+
+    def initialize_camera(self, ControlMode="RemoteControl"):
+        """Initialize the camera. The full handshake has been
+        found using reverse engineering
+
+        The commands answered with DeviceBusy are repeated until the
+        camera is ready, instead of waiting a fixed time, and the
+        properties are read once. The time spent in every phase is kept
+        in init_timing.
+
+        Args:
+        - ControlMode (str): The specific mode to control the camera
+
+        Returns:
+        - timing (dict): phase name to its duration in sec
+        """
+
+        timing = {}
+        start = time.perf_counter()
+        t = start
+
+        def phase(name):
+            nonlocal t
+            now = time.perf_counter()
+            timing[name] = now - t
+            t = now
+
+        self.get_device_info()
+        self._load_capabilities()
+        self._load_latency_profile()
+        phase("DeviceInfo")
+
+        self._control_mode = ControlMode
+        self._session_handler(ControlMode=ControlMode)
+        phase("Session")
+
+        if self._sdio_handshake():
             self.logger.info("Camera Initialized Correctly")
         else:
             self.logger.info("Camera Not Initialized Correctly")
+        phase("Handshake")
 
-        time.sleep(0.05)
+        json_loaded = self.prop_loaded
 
         self.get_camera_properties()
 
-        time.sleep(0.5)
-        self.get_camera_properties()
+        # The first call only loads the camera database, if available
+        if self.prop_loaded != json_loaded:
+            self.get_camera_properties()
+        phase("Properties")
+
+        self._save_capabilities()
+        phase("Capabilities")
 
         mode = self.camera_properties["ExposureProgramMode"]["CurrentValue"]
 
@@ -232,6 +478,147 @@ class SONYconn:
         else:
             self._current_mode = "Photo"
 
+        timing["Total"] = time.perf_counter() - start
+
+        self.init_timing = timing
+
+        self.logger.info(
+            "Initialization timing: "
+            + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in timing.items())
+        )
+
+        return timing
+
+    def get_device_info(self):
+        """Read the DeviceInfo dataset with GetDeviceInfo
+
+        The command does not need a session, so it can be sent before the
+        initialization.
+
+        Returns:
+        - info (dict): the decoded dataset or None if the command failed
+        """
+
+        result = self.connection.transaction(
+            self._OPCODES["Values"]["GetDeviceInfo"]
+        )
+
+        if result["Response"]["RespCode"] != "OK" or result["Data"] is None:
+            self.logger.info("Cannot read the device info")
+            return None
+
+        self.device_info = capabilities.parse_device_info(
+            result["Data"]["Payload"], self.__endian
+        )
+
+        return self.device_info
+
+    def _capability_key(self):
+        if self.capabilities is None or self.device_info is None:
+            return None
+
+        return self.device_info["Model"], self.device_info["DeviceVersion"]
+
+    def _load_capabilities(self):
+        """Load the static property descriptors of the camera model
+
+        Returns:
+        - loaded (bool): True if the model and firmware were known
+        """
+
+        key = self._capability_key()
+
+        if key is None:
+            return False
+
+        descriptors = self.capabilities.load(*key)
+
+        if descriptors is None:
+            self.logger.info(f"No capabilities saved for {key}")
+            return False
+
+        self._prop_parser.load_static(descriptors)
+        self._static_version = self._prop_parser.static_version
+
+        self.logger.info(
+            f"Loaded {len(descriptors)} property descriptors for {key}"
+        )
+
+        return True
+
+    def _load_latency_profile(self):
+        """Use the delays calibrated for the camera model, if saved"""
+
+        if self.latency_store is None or self.device_info is None:
+            return
+
+        model = self.device_info["Model"]
+
+        try:
+            profile = self.latency_store.load(model)
+        except (OSError, ValueError) as err:
+            self.logger.info(f"Cannot load the latency profile: {err}")
+            return
+
+        if profile is None:
+            self.delays.model = model
+            return
+
+        self.delays = profile
+
+        self.logger.info(f"Loaded the latency profile of {model}")
+
+    def calibrate_latency(self, steps=calibration.CALIBRATION_STEPS, **kwargs):
+        """Measure the minimum safe delays of the camera and save them
+
+        The camera should be initialized. The probes send real commands:
+        the ISO and the focus are moved and restored, CaptureHold takes
+        photos. The delays measured replace the current ones and are
+        saved in latency_store for the camera model. The steps in
+        calibration.UNCALIBRATED_STEPS have no probe and keep their
+        values.
+
+        Args:
+        - steps (list): the steps to be measured, see calibration
+        - kwargs: the keyword arguments of calibration.Calibrator
+
+        Returns:
+        - delays (dict): step name to the delay measured in sec
+        """
+
+        delays = calibration.Calibrator(self, **kwargs).calibrate(steps)
+
+        self.delays.update(delays)
+
+        if self.device_info is not None:
+            self.delays.model = self.device_info["Model"]
+
+        if self.latency_store is not None and self.delays.model is not None:
+            self.latency_store.save(self.delays)
+
+        return delays
+
+    def _save_capabilities(self):
+        """Save the static property descriptors if they changed"""
+
+        key = self._capability_key()
+
+        if key is None:
+            return
+
+        if self._static_version == self._prop_parser.static_version:
+            return
+
+        try:
+            self.capabilities.save(
+                *key, self._prop_parser.static_descriptors()
+            )
+        except OSError as err:
+            self.logger.info(f"Cannot save the capabilities of {key}: {err}")
+            return
+
+        self._static_version = self._prop_parser.static_version
+
     def _request_handler(self, close=False):
         cmd = self._OPCODES["Values"]["SendRequest"]
 
@@ -246,15 +633,7 @@ class SONYconn:
             "Msg": {"DataType": ["H"] * len(request), "Value": request}
         }
 
-        _ = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            cmd,
-            params=request_params,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        self.transactionID += 1
+        _ = self.connection.transaction(cmd, params=request_params)
 
     def start_MTP_comms(self):
         data_trusted_file_op = [
@@ -290,15 +669,7 @@ class SONYconn:
             }
         }
 
-        _ = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            cmd,
-            data=data,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        self.transactionID += 1
+        _ = self.connection.transaction(cmd, data=data)
 
         self._request_handler()
 
@@ -357,22 +728,10 @@ class SONYconn:
             "Msg": {"DataType": ["H"] * len(params), "Value": params}
         }
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            cmd,
-            params=cmd_params,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        _ = self.connection._receive()
-
-        resp = self.connection._decode_msg(PTPmsg)
+        resp = self.connection.transaction(cmd, params=cmd_params)["Data"]
 
         self.objList = self.__decode_obj_list(resp["Payload"])
 
-        self.transactionID += 1
-
     def __decode_file_code_objList(self, msg):
         file_number = struct.unpack("<L", msg[:4])[0]
 
@@ -405,22 +764,10 @@ class SONYconn:
             }
         }
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            cmd,
-            params=params_name,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        _ = self.connection._receive()
-
-        resp = self.connection._decode_msg(PTPmsg)
+        resp = self.connection.transaction(cmd, params=params_name)["Data"]
 
         name = self.__decode_file_name(resp["Payload"])
 
-        self.transactionID += 1
-
         params_code = {
             "Msg": {
                 "DataType": ["L", FOcodes.SONY_FILE_OPS["DataType"]],
@@ -431,17 +778,7 @@ class SONYconn:
             }
         }
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            cmd,
-            params=params_code,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        _ = self.connection._receive()
-
-        resp = self.connection._decode_msg(PTPmsg)
+        resp = self.connection.transaction(cmd, params=params_code)["Data"]
 
         code = copy.copy(resp["Payload"])
 
@@ -461,19 +798,7 @@ class SONYconn:
 
         cmd_params = {"Msg": {"DataType": datatype, "Value": cmds_val}}
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            cmd,
-            params=cmd_params,
-            receive=True,
-            transaction=self.transactionID,
-        )
-
-        _ = self.connection._receive()
-
-        resp = self.connection._decode_msg(PTPmsg)
-
-        self.transactionID += 1
+        resp = self.connection.transaction(cmd, params=cmd_params)["Data"]
 
         files = self.__decode_file_code_objList(resp["Payload"])
 
@@ -513,239 +838,319 @@ class SONYconn:
 
         return files_dict, files_count
 
-    def __decode_single_property_msg(self, msg):
-        """Helper method to decode a single property message
+    def _all_properties_msg(self, msg):
+        return self._prop_parser.parse(msg)
 
-        Args:
-        - msg (bytes): a stream of bytes starting with the message to be
-                       decoded
+    def get_camera_properties(self, file_props=None):
+        """Ask the camera for all the properties
 
         Returns:
-        - property_name (str): the name of the property
-        - vals (dict): a dictionary with the property characteristics, such as
-                       current values, avalailable values and others
-        - msg_len (int): the length of the bytes stream just decoded
+        - vals (str) : A decoded dictionary with all the properties
         """
 
-        vals = {}
+        if file_props is None:
+            file_path = "sour/camera_database/"
+            file_name = self.name.strip().lower().replace(" ", "") + ".json"
+
+        if os.path.exists(file_path + file_name) and not self.prop_loaded:
+            with open(file_path + file_name, "r") as jfile:
+                vals = json.load(jfile)
+            self.prop_loaded = True
 
-        msg_len = 0
+        else:
+            t = time.time()
 
-        vals["PropertyCode"] = struct.unpack((self.__endian + "H"), msg[:2])[
-            0
-        ]
+            vals = self._get_all_properties()
 
-        property_name = code_utils.decode_code(
-            self._PROPCODES["Values"], vals["PropertyCode"]
-        )
+            if vals is None:
+                # The cache is kept: an empty dump would clear it
+                self.logger.info("Cannot read the properties of the camera")
+                return
 
-        msg_len += 2
+            self._merge_properties(vals, t, full=True)
 
-        dataType = code_utils.decode_datatype(
-            DTcodes.PTP_DATATYPE["Values"],
-            struct.unpack(
-                (self.__endian + DTcodes.PTP_DATATYPE["DataType"]),
-                msg[msg_len : msg_len + 2],
-            )[0],
-        )
+    def _merge_properties(self, vals, timestamp=None, full=False):
+        """Merge decoded properties into camera_properties in place
 
-        vals["DataType"] = copy.copy(dataType)
+        The dictionaries of the properties already known are updated, so
+        the references held by other components stay valid.
 
-        dataType_len = struct.Struct(self.__endian + dataType).size
+        Args:
+        - vals (dict): the decoded properties
+        - timestamp (float): time.time() when they were requested
+        - full (bool): True if vals is a complete dump
 
-        msg_len += 2
+        Returns:
+        - updated (list): the names of the properties merged
+        """
 
-        if (
-            struct.unpack(self.__endian + "B", msg[msg_len : msg_len + 1])[0]
-            == 1
-        ):
-            vals["GetSet"] = "GetSet"
-        else:
-            vals["GetSet"] = "Set"
+        updated = self.property_cache.store(vals, timestamp, full)
 
-        msg_len += 1
+        if "FocusMode" in vals:
+            self.__focus_mode = copy.copy(vals["FocusMode"]["CurrentValue"])
 
-        vals["Visibility"] = code_utils.decode_code(
-            SMcodes.SONY_VISIBILITY["Values"],
-            struct.unpack((self.__endian + "B"), msg[msg_len : msg_len + 1])[
-                0
-            ],
-        )
-        msg_len += 1
+        return updated
 
-        val = struct.unpack(
-            (self.__endian + dataType), msg[msg_len : msg_len + dataType_len]
-        )[0]
+    def _get_property_desc(self, prop):
+        """Read a single property with SonyGetDevicePropDesc
 
-        val = code_utils.property(property_name, val, self.__endian).decoder()
+        Returns:
+        - vals (dict): the decoded property or None if the command failed
+        """
 
-        if isinstance(val, bytes):
-            val = val.decode("utf-8")
+        return self._read_property_desc(prop)[0]
 
-        vals["FactoryDefaultValue"] = val
+    def _read_property_desc(self, prop):
+        """Read a single property with SonyGetDevicePropDesc
 
-        msg_len += dataType_len
+        Returns:
+        - vals (dict): the decoded property or None if the command failed
+        - resp_code (str): the response code of the camera
+        """
 
-        val = struct.unpack(
-            (self.__endian + dataType), msg[msg_len : msg_len + dataType_len]
-        )[0]
+        code = self._PROPCODES["Values"][prop]
 
-        val = code_utils.property(property_name, val, self.__endian).decoder()
+        params = {"Msg": {"Value": code, "DataType": "L"}}
 
-        if isinstance(val, bytes):
-            val = val.decode("utf-8")
+        result = self.connection.transaction(
+            self._OPCODES["Values"]["SonyGetDevicePropDesc"], params=params
+        )
 
-        vals["CurrentValue"] = val
+        resp_code = result["Response"]["RespCode"]
 
-        msg_len += dataType_len
+        if resp_code != "OK" or result["Data"] is None:
+            return None, resp_code
 
-        vals["FmtFlag"] = struct.unpack(
-            (self.__endian + "B"), msg[msg_len : msg_len + 1]
-        )[0]
+        name, vals, _ = self._prop_parser.decode(result["Data"]["Payload"])
 
-        msg_len += 1
+        return {name: vals}, resp_code
 
-        if vals["FmtFlag"] == 0:
-            pass
-        elif vals["FmtFlag"] == 1:
-            tmp = struct.unpack(
-                (self.__endian + 3 * dataType),
-                msg[msg_len : msg_len + dataType_len * 3],
-            )
+    def _get_all_properties(self, changed=False):
+        """Read a property dump with GetAllDevicePropData
 
-            vals["MinValue"] = tmp[0]
-            vals["MaxValue"] = tmp[1]
-            vals["StepValue"] = tmp[2]
+        Args:
+        - changed (bool): if True only the properties changed since the
+                          last dump are requested
 
-            msg_len += 3 * dataType_len
+        Returns:
+        - vals (dict): the decoded properties or None if the command failed
+        """
 
-        elif vals["FmtFlag"] == 2:
-            fmt_len = struct.unpack(
-                (self.__endian + "H"), msg[msg_len : msg_len + 2]
-            )[0]
+        return self._read_all_properties(changed)[0]
 
-            msg_len += 2
+    def _read_all_properties(self, changed=False):
+        """Read a property dump with GetAllDevicePropData
 
-            vals["AvailableValues"] = {}
-            vals["AvailableValues"]["Photo"] = []
+        Returns:
+        - vals (dict): the decoded properties or None if the command failed
+        - resp_code (str): the response code of the camera
+        """
 
-            for _ in range(fmt_len):
-                val = struct.unpack(
-                    (self.__endian + dataType),
-                    msg[msg_len : msg_len + dataType_len],
-                )[0]
+        params = {"Msg": {"Value": 1 if changed else 0, "DataType": "L"}}
 
-                val = code_utils.property(
-                    property_name, val, self.__endian
-                ).decoder()
+        result = self._busy_transaction(
+            self._OPCODES["Values"]["GetAllDevicePropData"], params=params
+        )
 
-                if isinstance(val, bytes):
-                    val = val.decode("utf-8")
+        resp_code = result["Response"]["RespCode"]
 
-                vals["AvailableValues"]["Photo"].append(val)
+        if resp_code != "OK" or result["Data"] is None:
+            return None, resp_code
 
-                msg_len += dataType_len
+        return self._all_properties_msg(result["Data"]["Payload"]), resp_code
 
-            tmp = struct.unpack(
-                (self.__endian + "H"), msg[msg_len : msg_len + 2]
-            )[0]
+    def refresh_properties(self, props=None):
+        """Fetch only the properties that may have changed
 
-            if tmp < 0x1000:
-                vals["AvailableValues"]["Video"] = []
+        The properties are merged into camera_properties in place. If the
+        targeted commands fail, or the properties were never read, a full
+        dump is read instead. The targeted commands are not used again
+        only if the camera answers OperationNotSupported.
 
-                fmt_len = copy.copy(tmp)
+        Args:
+        - props (list): names of the properties to be read one by one. If
+                        None, the properties changed since the last dump
+                        are read
 
-                msg_len += 2
+        Returns:
+        - updated (list): the names of the properties updated
+        """
 
-                for _ in range(fmt_len):
-                    val = struct.unpack(
-                        (self.__endian + dataType),
-                        msg[msg_len : msg_len + dataType_len],
-                    )[0]
+        t = time.time()
 
-                    val = code_utils.property(
-                        property_name, val, self.__endian
-                    ).decoder()
+        if not self.property_cache.loaded:
+            self.get_camera_properties()
+            return list(self.camera_properties)
 
-                    if isinstance(val, bytes):
-                        val = val.decode("utf-8")
+        if not self._targeted_refresh:
+            return self._merge_properties(self._get_all_properties() or {}, t)
 
-                    vals["AvailableValues"]["Video"].append(val)
+        if isinstance(props, str):
+            props = [props]
 
-                    msg_len += dataType_len
+        if props is None:
+            vals, resp_code = self._read_all_properties(changed=True)
+        else:
+            vals = {}
+            for prop in props:
+                tmp, resp_code = self._read_property_desc(prop)
+                if tmp is None:
+                    vals = None
+                    break
+                vals.update(tmp)
+
+        if vals is None:
+            if resp_code == "OperationNotSupported":
+                self.logger.info(
+                    "Targeted refresh not supported, using full dumps"
+                )
+                self._targeted_refresh = False
+            else:
+                self.logger.info(
+                    f"Targeted refresh failed ({resp_code}), using a full dump"
+                )
 
-        return property_name, vals, msg_len
+            vals = self._get_all_properties() or {}
 
-    def _all_properties_msg(self, msg):
-        msg_len = struct.unpack((self.__endian + "Q"), msg[:8])[0]
+        return self._merge_properties(vals, t)
 
-        properties = {}
+    def get_property(self, name, max_age=None):
+        """Get a property, from the cache if it is fresh
 
-        msg_read = 8
+        Args:
+        - name (str): name of the property
+        - max_age (float): maximum age in sec accepted for the cached
+                           value. If None the cache policy is used
 
-        count = 0
+        Returns:
+        - vals (dict): the property characteristics
+        """
 
-        while count < msg_len:
-            prop, vals, tmp = self.__decode_single_property_msg(
-                msg[msg_read:]
-            )
+        vals = self.property_cache.get(name, max_age)
 
-            properties[prop] = vals
+        if vals is None:
+            self.refresh_properties([name])
+            vals = self.camera_properties[name]
 
-            msg_read += tmp
-            count += 1
+        return vals
 
-        return properties
+    def get_properties(self, names=None, max_age=None):
+        """Get several properties, reading from the camera only the stale
 
-    def get_camera_properties(self, file_props=None):
-        """Ask the camera for all the properties
+        Args:
+        - names (list): names of the properties. If None all of them
+        - max_age (float): maximum age in sec accepted for the cached
+                           values. If None the cache policy is used
 
         Returns:
-        - vals (str) : A decoded dictionary with all the properties
+        - vals (dict): property name to its characteristics
         """
 
-        if file_props is None:
-            file_path = "sour/camera_database/"
-            file_name = self.name.strip().lower().replace(" ", "") + ".json"
+        if not self.property_cache.loaded:
+            self.get_camera_properties()
 
-        if os.path.exists(file_path + file_name) and not self.prop_loaded:
-            with open(file_path + file_name, "r") as jfile:
-                vals = json.load(jfile)
-            self.prop_loaded = True
+        stale = self.property_cache.stale(names, max_age)
 
-        else:
-            params = {"Msg": {"Value": 0, "DataType": "L"}}
+        if names is None:
+            if stale:
+                self.get_camera_properties()
+            names = list(self.camera_properties)
+        elif stale:
+            self.refresh_properties(stale)
 
-            PTPmsg = self.connection.send_recv_Msg(
-                USBcodes.USB_OPERATIONS["Command"],
-                self._OPCODES["Values"]["GetAllDevicePropData"],
-                params=params,
-                receive=True,
-                transaction=self.transactionID,
-            )
+        return {name: self.camera_properties[name] for name in names}
 
-            _ = self.connection._receive()
+    def _value_table(self, name, mode=None):
+        """Sorted table of the values available for a property
 
-            resp = self.connection._decode_msg(PTPmsg)
+        The table is built once for every new value of the property in the
+        cache, so normally once per property dump.
 
-            vals = self._all_properties_msg(resp["Payload"])
+        Args:
+        - name (str): "ISO", "ShutterSpeed" or "ExposureBiasCompensation"
+        - mode (str): "Photo" or "Video". If None the current mode
 
-            self.transactionID += 1
-            
-            self.camera_properties = copy.copy(vals)
+        Returns:
+        - table (ValueTable): the table of the available values
+        """
 
-            self.__focus_mode = copy.copy(
-                self.camera_properties["FocusMode"]["CurrentValue"]
-            )
+        if mode is None:
+            mode = self._current_mode
+
+        generation = self.property_cache.property_generation(name)
+        key = (name, mode)
+
+        cached = self._value_tables.get(key)
+
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+        labels = self.camera_properties[name]["AvailableValues"][mode]
+
+        if name == "ISO":
+            table = tables.iso_table(labels, self.__endian)
+        elif name == "ShutterSpeed":
+            table = tables.shutter_table(labels)
+        else:
+            table = tables.expcomp_table(labels)
+
+        self._value_tables[key] = (generation, table)
+
+        return table
 
     def save_camera_properties(self):
         file_path = "sour/camera_database/"
         file_name = self.name.strip().lower().replace(" ", "") + ".json"
 
         with open(file_path + file_name, "w") as j:
-            json.dump(self.camera_properties, j)
+            json.dump(
+                {
+                    name: prop.to_dict() if hasattr(prop, "to_dict") else prop
+                    for name, prop in self.camera_properties.items()
+                },
+                j,
+            )
+
+    def start_history(self, directory, names=None, **kwargs):
+        """Record the changes of the properties in a history store
+
+        Args:
+        - directory (str): directory of the history files
+        - names (list): the properties recorded. If None all of them
+        - kwargs: the keyword arguments of history.HistoryStore
+
+        Returns:
+        - store (HistoryStore): the store, to query the history
+        """
+
+        self.stop_history()
+
+        if not self.property_cache.loaded:
+            self.get_camera_properties()
+
+        store = history.HistoryStore(directory, **kwargs)
+        self.history = history.HistoryRecorder(self, store, names)
+
+        return store
+
+    def stop_history(self):
+        """Stop recording the history of the properties"""
+
+        if self.history is not None:
+            self.history.stop()
+            self.history.store.close()
+            self.history = None
 
     def messageHandler(self, msg):
+        cmd, value = self._parse_message(msg)
+
+        out = self._dispatch_message(cmd, value)
+
+        time.sleep(self.delays["Message"])
+
+        return out
+
+    def _parse_message(self, msg):
         command = copy.copy(msg[0])
 
         if len(msg) == 2:
@@ -755,6 +1160,9 @@ class SONYconn:
 
         cmd = command.strip().lower().replace(" ", "")
 
+        return cmd, value
+
+    def _dispatch_message(self, cmd, value):
         if cmd == "focusmode":
             out = self._set_focus_mode(value)
 
@@ -767,6 +1175,9 @@ class SONYconn:
         elif cmd == "programmode":
             out = self._set_camera_mode(value)
 
+        elif cmd == "settings":
+            out = self.apply_settings(value)
+
         elif cmd == "image":
             out = self._get_live_view()
 
@@ -791,7 +1202,6 @@ class SONYconn:
                     flag = False
 
                 out = self._set_focus_distance(value[1], flag)
-        time.sleep(0.1)
 
         return out
 
@@ -799,7 +1209,31 @@ class SONYconn:
     List of Fuctions used to send commands to the camera
     """
 
+    def _run_sequence(self, sequence):
+        """Drive a command sequence
+
+        A sequence is a generator that sends the commands and yields the
+        waits between them as (waiter, delay) tuples, so that the same
+        sequence can be driven here or by the asyncio API.
+
+        Args:
+        - sequence (generator): the command sequence
+
+        Returns:
+        - out: the value returned by the sequence
+        """
+
+        try:
+            while True:
+                waiter, delay = next(sequence)
+                self._settle(waiter, delay)
+        except StopIteration as stop:
+            return stop.value
+
     def _capture_photo(self):
+        return self._run_sequence(self._capture_sequence())
+
+    def _capture_sequence(self):
         capture = {
             "Msg": {
                 "Value": self._PROPCODES["Values"]["Capture"],
@@ -833,77 +1267,55 @@ class SONYconn:
         expected_resp = 2
 
         if self.__focus_mode == "AF_S":
-            tmp = self.connection.send_recv_Msg(
-                USBcodes.USB_OPERATIONS["Command"],
+            waiter = self._expect_prop_change("FocusFound")
+
+            tmp = self.connection.transaction(
                 self._OPCODES["Values"]["SetControlDeviceB"],
                 params=autofocus,
                 data=down,
-                transaction=self.transactionID,
-            )
-
-            tmp = self.connection._decode_msg(tmp)
+            )["Response"]
 
             if tmp["MsgType"] == "Response":
                 resp.append(tmp["RespCode"])
 
-            self.transactionID += 1
-
             expected_resp = 4
 
-            time.sleep(0.3)
+            yield waiter, self.delays["AutoFocusDown"]
 
-        tmp = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
+        tmp = self.connection.transaction(
             self._OPCODES["Values"]["SetControlDeviceB"],
             params=capture,
             data=down,
-            transaction=self.transactionID,
-        )
+        )["Response"]
 
         t = time.time()
 
-        tmp = self.connection._decode_msg(tmp)
-
         if tmp["MsgType"] == "Response":
             resp.append(tmp["RespCode"])
 
-        self.transactionID += 1
-
-        time.sleep(0.035)
+        yield None, self.delays["CaptureHold"]
 
-        tmp = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
+        tmp = self.connection.transaction(
             self._OPCODES["Values"]["SetControlDeviceB"],
             params=capture,
             data=up,
-            transaction=self.transactionID,
-        )
-
-        self.transactionID += 1
-
-        tmp = self.connection._decode_msg(tmp)
+        )["Response"]
 
         if tmp["MsgType"] == "Response":
             resp.append(tmp["RespCode"])
 
         if self.__focus_mode == "AF_S":
-            time.sleep(0.5)
+            yield None, self.delays["AutoFocusHold"]
 
-            tmp = self.connection.send_recv_Msg(
-                USBcodes.USB_OPERATIONS["Command"],
+            tmp = self.connection.transaction(
                 self._OPCODES["Values"]["SetControlDeviceB"],
                 params=autofocus,
                 data=up,
-                transaction=self.transactionID,
-            )
-
-            tmp = self.connection._decode_msg(tmp)
+            )["Response"]
 
             if tmp["MsgType"] == "Response":
                 resp.append(tmp["RespCode"])
 
-            self.transactionID += 1
-
         if len(resp) == expected_resp:
             if all(list(map(lambda r: r == "OK", resp))):
                 self.logger.info(f"Photo Captured # {self.__photo_count} at {t} s")
@@ -918,6 +1330,9 @@ class SONYconn:
             return False
 
     def _video_control(self):
+        return self._run_sequence(self._video_sequence())
+
+    def _video_sequence(self):
         capture = {
             "Msg": {
                 "Value": self._PROPCODES["Values"]["Movie"],
@@ -952,78 +1367,56 @@ class SONYconn:
 
         if self.__focus_mode == "AF_S":
             if not self._recording_status:
-                tmp = self.connection.send_recv_Msg(
-                    USBcodes.USB_OPERATIONS["Command"],
+                waiter = self._expect_prop_change("FocusFound")
+
+                tmp = self.connection.transaction(
                     self._OPCODES["Values"]["SetControlDeviceB"],
                     params=autofocus,
                     data=down,
-                    transaction=self.transactionID,
-                )
-
-                tmp = self.connection._decode_msg(tmp)
+                )["Response"]
 
                 if tmp["MsgType"] == "Response":
                     resp.append(tmp["RespCode"])
 
-                self.transactionID += 1
-
                 expected_resp = 4
 
-                time.sleep(0.3)
+                yield waiter, self.delays["AutoFocusDown"]
 
-        tmp = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
+        tmp = self.connection.transaction(
             self._OPCODES["Values"]["SetControlDeviceB"],
             params=capture,
             data=down,
-            transaction=self.transactionID,
-        )
+        )["Response"]
 
         t = time.time()
 
-        tmp = self.connection._decode_msg(tmp)
-
         if tmp["MsgType"] == "Response":
             resp.append(tmp["RespCode"])
 
-        self.transactionID += 1
-
-        time.sleep(0.035)
+        yield None, self.delays["CaptureHold"]
 
-        tmp = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
+        tmp = self.connection.transaction(
             self._OPCODES["Values"]["SetControlDeviceB"],
             params=capture,
             data=up,
-            transaction=self.transactionID,
-        )
-
-        self.transactionID += 1
-
-        tmp = self.connection._decode_msg(tmp)
+        )["Response"]
 
         if tmp["MsgType"] == "Response":
             resp.append(tmp["RespCode"])
 
         if self.__focus_mode == "AF_S":
             if not self._recording_status:
-                time.sleep(0.3)
+                yield None, self.delays["VideoAutoFocusHold"]
 
-                tmp = self.connection.send_recv_Msg(
-                    USBcodes.USB_OPERATIONS["Command"],
+                tmp = self.connection.transaction(
                     self._OPCODES["Values"]["SetControlDeviceB"],
                     params=autofocus,
                     data=up,
-                    transaction=self.transactionID,
-                )
-
-                tmp = self.connection._decode_msg(tmp)
+                )["Response"]
 
                 if tmp["MsgType"] == "Response":
                     resp.append(tmp["RespCode"])
 
-                self.transactionID += 1
-
         self._recording_status = not self._recording_status
         if self._recording_status:
             self.__video_status = "Started"
@@ -1043,77 +1436,78 @@ class SONYconn:
             self.logger.info("Did not get response from Commands")
             return False
 
-    def _set_focus_mode(self, mode="auto"):
+    def _setting_msg(self, value, datatype):
+        return {"Msg": {"Value": value, "DataType": datatype}}
+
+    def _encode_focus_mode(self, mode):
+        """Encode a focus mode
+
+        Returns:
+        - data (dict): the data message of SetControlDeviceA
+        - mode (str): the focus mode applied
+        """
+
         if mode == "manual":
             mode = "MF"
         elif mode == "auto":
             mode = "AF_S"
 
-        params = {
-            "Msg": {
-                "Value": self._PROPCODES["Values"]["FocusMode"],
-                "DataType": self._PROPCODES["DataType"],
-            }
-        }
+        data = self._setting_msg(
+            PROPcodes.SONY_FOCUS_MODE["Values"][mode],
+            PROPcodes.SONY_FOCUS_MODE["DataType"],
+        )
 
-        mode_msg = {
-            "Msg": {
-                "Value": PROPcodes.SONY_FOCUS_MODE["Values"][mode],
-                "DataType": PROPcodes.SONY_FOCUS_MODE["DataType"],
-            }
-        }
+        return data, mode
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            self._OPCODES["Values"]["SetControlDeviceA"],
-            params=params,
-            data=mode_msg,
-            transaction=self.transactionID,
+    def _encode_camera_mode(self, mode):
+        """Encode an exposure program mode
+
+        Returns:
+        - data (dict): the data message of SetControlDeviceA
+        - mode (str): the program mode applied
+        """
+
+        data = self._setting_msg(
+            PROPcodes.SONY_EXPMODE["Values"][mode],
+            PROPcodes.SONY_EXPMODE["DataType"],
         )
 
-        resp = self.connection._decode_msg(PTPmsg)
+        return data, mode
 
-        self.transactionID += 1
+    def _mode_of(self, program_mode):
+        """Photo or Video, the group of a program mode"""
 
-        time.sleep(0.05)
+        if any(md in program_mode for md in self.__video_modes):
+            return "Video"
 
-        self.get_camera_properties()
+        return "Photo"
 
-        if resp["MsgType"] == "Response":
-            if resp["RespCode"] == "OK":
-                self.logger.info(f"Set Focus Mode: {mode}")
+    def _encode_shutter_speed(self, value, mode=None):
+        """Encode a shutter speed snapped to the closest available
 
-                return True
+        Args:
+        - value (float or str): the shutter speed in sec, e.g. 0.004 or
+                                "1/250"
+        - mode (str): "Photo" or "Video", the values available in this
+                      mode are used. If None the current mode
 
-        return False
+        Returns:
+        - data (dict): the data message of SetControlDeviceA
+        - value (float): the shutter speed applied
+        """
 
-    def _set_shutter_speed(self, value):
         if isinstance(value, float) or isinstance(value, int):
             value = value
         else:
             value = float(Fraction(value))
 
-        available_shutter = list(
-            map(
-                lambda x: float(Fraction(x)),
-                self.camera_properties["ShutterSpeed"]["AvailableValues"][
-                    self._current_mode
-                ],
-            )
-        )
+        available_shutter = self._value_table("ShutterSpeed", mode)
 
         if value not in available_shutter:
-            tmp = list(map(lambda x: abs(x - value), available_shutter))
-
-            if len(tmp) < 1:
-                value = value
-                old = copy.copy(value)
-            else:
-                idx = tmp.index(min(tmp))
-
-                old = copy.copy(value)
+            old = copy.copy(value)
 
-                value = available_shutter[idx]
+            if len(available_shutter) > 0:
+                value = available_shutter.nearest(value)
 
             self.logger.info(
                 f"Choose the closest Shutter Speed, {value}, to the one selected {old}"
@@ -1121,110 +1515,166 @@ class SONYconn:
 
         num, den = decimal.Decimal(str(value)).as_integer_ratio()
 
+        # Values as 1/30 have no exact decimal representation
+        if num > 0xFFFF or den > 0xFFFF:
+            ratio = Fraction(value).limit_denominator(0xFFFF)
+            num, den = ratio.numerator, ratio.denominator
+
         num_bytes = struct.pack("<H", num)
 
         den_bytes = struct.pack("<H", den)
 
-        val = den_bytes + num_bytes
+        return self._setting_msg(den_bytes + num_bytes, "L"), value
 
-        params = {
-            "Msg": {
-                "Value": self._PROPCODES["Values"]["ShutterSpeed"],
-                "DataType": self._PROPCODES["DataType"],
-            }
-        }
+    def _encode_iso(self, value, mode=None):
+        """Encode an ISO snapped to the closest available
+
+        Args:
+        - value (int, str or list): the ISO value, e.g. 400 or "AUTO", or
+                                    a list [ISO mode, value, extension]
+        - mode (str): "Photo" or "Video", the values available in this
+                      mode are used. If None the current mode
+
+        Returns:
+        - data (dict): the data message of SetControlDeviceA
+        - value (int): the encoded ISO applied
+        """
 
-        mode = {"Msg": {"Value": val, "DataType": "L"}}
+        iso_mode = 0
+        ext = 0
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
+        if isinstance(value, list):
+            if len(value) > 2:
+                ext = value[2]
+
+            iso_mode = value[0]
+            value = value[1]
+
+        available_ISO = self._value_table("ISO", mode)
+
+        newISO = code_utils.property("ISO", value, self.__endian).encoder(
+            mode=iso_mode, ext=ext
+        )
+
+        if newISO not in available_ISO:
+            newISO = available_ISO.nearest(newISO)
+
+            tmp = code_utils.property("ISO", newISO, self.__endian).decoder()
+
+            self.logger.info(
+                f"Choose the closest ISO, {tmp}, to the one selected {value}"
+            )
+
+        return self._setting_msg(newISO, "L"), newISO
+
+    def _send_setting(self, prop, data):
+        """Send a SetControlDeviceA for a property
+
+        Returns:
+        - resp (dict): the decoded Response of the camera
+        """
+
+        params = self._setting_msg(
+            self._PROPCODES["Values"][prop], self._PROPCODES["DataType"]
+        )
+
+        return self.connection.transaction(
             self._OPCODES["Values"]["SetControlDeviceA"],
             params=params,
-            data=mode,
-            transaction=self.transactionID,
+            data=data,
+        )["Response"]
+
+    def _send_control(self, prop, value, datatype=None):
+        """Send a SetControlDeviceB for a control
+
+        Args:
+        - prop (str): the name of the control, e.g. "Capture"
+        - value (str or int): "Down" or "Up" for a button, otherwise the
+                              value to be sent
+        - datatype (str): struct character of value. If None value is a
+                          button state
+
+        Returns:
+        - resp (dict): the decoded Response of the camera
+        """
+
+        if datatype is None:
+            data = {
+                "Msg": {
+                    "Value": SMcodes.SONY_BUTTON["Values"][value],
+                    "DataType": SMcodes.SONY_BUTTON["DataType"],
+                }
+            }
+        else:
+            data = {"Msg": {"Value": value, "DataType": datatype}}
+
+        params = self._setting_msg(
+            self._PROPCODES["Values"][prop], self._PROPCODES["DataType"]
         )
 
-        resp = self.connection._decode_msg(PTPmsg)
+        return self.connection.transaction(
+            self._OPCODES["Values"]["SetControlDeviceB"],
+            params=params,
+            data=data,
+        )["Response"]
+
+    def _set_focus_mode(self, mode="auto"):
+        mode_msg, mode = self._encode_focus_mode(mode)
 
-        self.transactionID += 1
+        waiter = self._expect_prop_change("FocusMode")
 
-        time.sleep(0.05)
+        resp = self._send_setting("FocusMode", mode_msg)
 
-        self.get_camera_properties()
+        self.property_cache.invalidate("FocusMode")
+
+        self._settle(waiter, self.delays["Setting"])
+
+        self.refresh_properties(["FocusMode"])
 
         if resp["MsgType"] == "Response":
             if resp["RespCode"] == "OK":
-                self.logger.info(f"Set New Shutter Speed: {value}")
+                self.logger.info(f"Set Focus Mode: {mode}")
 
                 return True
 
         return False
 
-    def _set_iso(self, value):
-        if isinstance(value, int) or isinstance(value, float):
-            mode = 0
-            ext = 0
+    def _set_shutter_speed(self, value):
+        mode, value = self._encode_shutter_speed(value)
 
-        elif isinstance(value, list):
-            if len(value) > 2:
-                ext = value[2]
-            else:
-                ext = 0
+        waiter = self._expect_prop_change("ShutterSpeed")
 
-            mode = value[0]
-            value = value[1]
+        resp = self._send_setting("ShutterSpeed", mode)
 
-        available_ISO = list(
-            map(
-                lambda x: code_utils.property(
-                    "ISO", x, self.__endian
-                ).encoder(),
-                self.camera_properties["ISO"]["AvailableValues"][
-                    self._current_mode
-                ],
-            )
-        )
+        self.property_cache.invalidate("ShutterSpeed")
 
-        newISO = code_utils.property("ISO", value, self.__endian).encoder(
-            mode=mode, ext=ext
-        )
+        self._settle(waiter, self.delays["Setting"])
 
-        if newISO not in available_ISO:
-            tmp = list(map(lambda x: abs(x - newISO), available_ISO))
-            idx = tmp.index(min(tmp))
+        self.refresh_properties(["ShutterSpeed"])
 
-            newISO = available_ISO[idx]
+        if resp["MsgType"] == "Response":
+            if resp["RespCode"] == "OK":
+                self.logger.info(f"Set New Shutter Speed: {value}")
 
-            tmp = code_utils.property("ISO", newISO, self.__endian).decoder()
+                return True
 
-            self.logger.info(
-                f"Choose the closest ISO, {tmp}, to the one selected {value}"
-            )
+        return False
 
-        params = {
-            "Msg": {
-                "Value": self._PROPCODES["Values"]["ISO"],
-                "DataType": self._PROPCODES["DataType"],
-            }
-        }
+    def _set_iso(self, value):
+        mode, _ = self._encode_iso(value)
 
-        mode = {"Msg": {"Value": newISO, "DataType": "L"}}
+        if isinstance(value, list):
+            value = value[1]
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            self._OPCODES["Values"]["SetControlDeviceA"],
-            params=params,
-            data=mode,
-            transaction=self.transactionID
-        )
+        waiter = self._expect_prop_change("ISO")
 
-        resp = self.connection._decode_msg(PTPmsg)
+        resp = self._send_setting("ISO", mode)
 
-        self.transactionID += 1
+        self.property_cache.invalidate("ISO")
 
-        time.sleep(0.05)
+        self._settle(waiter, self.delays["Setting"])
 
-        self.get_camera_properties()
+        self.refresh_properties(["ISO"])
 
         if resp["MsgType"] == "Response":
             if resp["RespCode"] == "OK":
@@ -1235,40 +1685,20 @@ class SONYconn:
         return False
 
     def _set_camera_mode(self, mode="Photo_M"):
-        params = {
-            "Msg": {
-                "Value": self._PROPCODES["Values"]["ExposureProgramMode"],
-                "DataType": self._PROPCODES["DataType"],
-            }
-        }
+        mode_dict, mode = self._encode_camera_mode(mode)
 
-        mode_dict = {
-            "Msg": {
-                "Value": PROPcodes.SONY_EXPMODE["Values"][mode],
-                "DataType": PROPcodes.SONY_EXPMODE["DataType"],
-            }
-        }
+        waiter = self._expect_prop_change("ExposureProgramMode")
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
-            self._OPCODES["Values"]["SetControlDeviceA"],
-            params=params,
-            data=mode_dict,
-            transaction=self.transactionID,
-        )
+        resp = self._send_setting("ExposureProgramMode", mode_dict)
 
-        resp = self.connection._decode_msg(PTPmsg)
+        self._current_mode = self._mode_of(mode)
 
-        if any(md in mode for md in self.__video_modes):
-            self._current_mode = "Video"
-        else:
-            self._current_mode = "Photo"
-
-        self.transactionID += 1
+        self.property_cache.invalidate("ExposureProgramMode")
 
-        time.sleep(0.05)
+        self._settle(waiter, self.delays["Setting"])
 
-        self.get_camera_properties()
+        # The mode changes the ranges of several properties
+        self.refresh_properties()
 
         if resp["MsgType"] == "Response":
             if resp["RespCode"] == "OK":
@@ -1282,6 +1712,226 @@ class SONYconn:
 
         return False
 
+    def _expected_label(self, prop, value, mode):
+        """Label the camera is expected to report for an applied value"""
+
+        if prop == "ISO":
+            return code_utils.property("ISO", value, self.__endian).decoder()
+        elif prop == "ShutterSpeed":
+            return self._value_table("ShutterSpeed", mode).label(value)
+
+        return value
+
+    def apply_settings(self, settings, delay=None):
+        """Apply several settings with a single refresh
+
+        All the values are validated and snapped against the cached
+        properties before sending anything. The commands are then sent
+        back to back, and a single refresh of the changed properties is
+        used to verify them. The program mode is applied first, so the
+        other values are snapped to the ones available in the new mode.
+
+        Args:
+        - settings (dict): the values with the keys of messageHandler,
+                           i.e. "programmode", "focusmode", "shutterspeed"
+                           and "iso", or with the property names
+        - delay (float): maximum time in sec to wait for the camera to
+                         apply the settings before the refresh. If None
+                         the Setting delay of the latency profile
+
+        Returns:
+        - results (dict): property name to a dict with the Requested value,
+                          the label of the Applied one, the RespCode and
+                          the Status:
+                          "OK", "Invalid" if the value was rejected before
+                          sending, "Failed" if the camera refused it and
+                          "NotApplied" if the refresh does not show it
+        """
+
+        if delay is None:
+            delay = self.delays["Setting"]
+
+        if not self.property_cache.loaded:
+            self.get_camera_properties()
+
+        requested = {}
+
+        for key, value in settings.items():
+            cmd = key.strip().lower().replace(" ", "")
+            prop = BATCH_SETTINGS.get(cmd, key)
+
+            if prop not in BATCH_SETTINGS.values():
+                raise KeyError(f"Setting not supported in a batch: {key}")
+
+            requested[prop] = value
+
+        results = {}
+        plan = []
+        mode = self._current_mode
+
+        # Validation and snapping, nothing is sent if a value is invalid
+        for prop in BATCH_SETTINGS.values():
+            if prop not in requested:
+                continue
+
+            value = requested[prop]
+            results[prop] = {"Requested": value, "Applied": None}
+
+            try:
+                if prop == "ExposureProgramMode":
+                    data, applied = self._encode_camera_mode(value)
+                    mode = self._mode_of(applied)
+                elif prop == "FocusMode":
+                    data, applied = self._encode_focus_mode(value)
+                elif prop == "ShutterSpeed":
+                    data, applied = self._encode_shutter_speed(value, mode)
+                else:
+                    data, applied = self._encode_iso(value, mode)
+
+            except (KeyError, ValueError, TypeError, ZeroDivisionError) as err:
+                results[prop].update(
+                    {
+                        "RespCode": None,
+                        "Status": "Invalid",
+                        "Error": f"Invalid value {value!r} ({err!r})",
+                    }
+                )
+                continue
+
+            expected = self._expected_label(prop, applied, mode)
+
+            results[prop]["Applied"] = expected
+            plan.append((prop, data, expected))
+
+        waiters = []
+
+        for prop, data, _ in plan:
+            waiters.append(self._expect_prop_change(prop))
+
+            resp = self._send_setting(prop, data)
+
+            self.property_cache.invalidate(prop)
+
+            ok = resp["MsgType"] == "Response" and resp["RespCode"] == "OK"
+
+            results[prop]["RespCode"] = resp["RespCode"]
+            results[prop]["Status"] = "OK" if ok else "Failed"
+
+            if ok and prop == "ExposureProgramMode":
+                self._current_mode = mode
+
+        if not plan:
+            return results
+
+        deadline = time.monotonic() + delay
+
+        for waiter in waiters:
+            self._settle(waiter, max(deadline - time.monotonic(), 0))
+
+        self.refresh_properties()
+
+        for prop, _, expected in plan:
+            if results[prop]["Status"] != "OK":
+                continue
+
+            current = self.camera_properties[prop]["CurrentValue"]
+
+            if expected is not None and current != expected:
+                results[prop]["Status"] = "NotApplied"
+
+        for prop, res in results.items():
+            self.logger.info(
+                f"Batch setting {prop}: {res['Applied']} {res['Status']}"
+            )
+
+        return results
+
+    def save_profile(self, name, store=None, props=None):
+        """Save the current settings as a named profile
+
+        Args:
+        - name (str): the name of the profile
+        - store (ProfileStore): if given, the profile is also saved there
+        - props (list): the properties to be saved. If None all the ones
+                        supported by the profiles
+
+        Returns:
+        - profile (Profile): the new profile
+        """
+
+        if props is None:
+            props = list(profiles.PROFILE_PROPERTIES)
+
+        current = self.get_properties(props)
+
+        profile = profiles.Profile.from_properties(name, current, props)
+
+        if store is not None:
+            store.save(profile)
+
+        return profile
+
+    def apply_profile(self, profile, max_age=None, delay=None):
+        """Apply a profile sending only the settings that differ
+
+        The profile is compared with the cached properties, which are read
+        only if not fresh, so a profile already matching costs no USB
+        transaction while the property cache is tracking the events. The
+        settings are applied in the stages of profiles.PROFILE_STAGES: the
+        ones depending on the program mode are compared again after it is
+        changed.
+
+        Args:
+        - profile (Profile): the profile to be applied
+        - max_age (float): maximum age in sec of the cached properties
+                           used for the comparison. If None the cache
+                           policy is used
+        - delay (float): maximum time in sec to wait for the camera to
+                         apply every stage. If None the Setting delay of
+                         the latency profile
+
+        Returns:
+        - results (dict): property name to the result of apply_settings,
+                          or to {"Status": "Unchanged"} for the settings
+                          already matching
+        """
+
+        results = {}
+
+        for stage in profiles.PROFILE_STAGES:
+            props = [prop for prop in stage if prop in profile.settings]
+
+            if not props:
+                continue
+
+            current = self.get_properties(props, max_age)
+
+            changes = profile.diff(current, props)
+
+            for prop in props:
+                if prop not in changes:
+                    results[prop] = {
+                        "Requested": profile.settings[prop],
+                        "Applied": current[prop]["CurrentValue"],
+                        "Status": "Unchanged",
+                    }
+
+            if changes:
+                results.update(self.apply_settings(changes, delay=delay))
+
+        failed = [
+            prop
+            for prop, res in results.items()
+            if res["Status"] not in ("OK", "Unchanged")
+        ]
+
+        if failed:
+            self.logger.info(f"Profile {profile.name} failed for {failed}")
+        else:
+            self.logger.info(f"Profile {profile.name} applied")
+
+        return results
+
     def _get_live_view(self):
         import PIL.Image
         import PIL.ImageOps
@@ -1289,29 +1939,37 @@ class SONYconn:
 
         params = {"Msg": {"Value": 0xFFFFC002, "DataType": "L"}}
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
+        resp = self.connection.transaction(
             self._OPCODES["Values"]["GetObject"],
             params=params,
-            receive=True,
-            transaction=self.transactionID,
-        )
+            zero_copy=True,
+        )["Data"]
 
-        _ = self.connection._receive()
+        if resp is None:
+            self.logger.info("No live view frame received")
+            return None
 
-        resp = self.connection._decode_msg(PTPmsg)
+        # The frame is copied once, so the pooled buffer is given back
+        # even if the image cannot be decoded
+        try:
+            payload = bytes(resp["Payload"])
+        finally:
+            self.connection.release_view(resp["Payload"])
 
-        raw_img_start = resp["Payload"].find(b"\xff\xd8\xff")
-        raw_img = io.BytesIO(resp["Payload"][raw_img_start:])
+        raw_img_start = payload.find(b"\xff\xd8\xff")
+
+        if raw_img_start < 0:
+            self.logger.info("Live view frame without a JPEG image")
+            return None
+
+        raw_img = io.BytesIO(payload[raw_img_start:])
         img = np.asarray(
             PIL.ImageOps.flip(PIL.Image.open(raw_img).rotate(90, expand=True))
         )
 
-        self.transactionID += 1
-
         return img
 
-    def _set_datetime(self, timeout=0.04, delta=1e-3):
+    def _set_datetime(self, timeout=None, delta=1e-3):
         params = {
             "Msg": {
                 "Value": self._PROPCODES["Values"]["DateTime"],
@@ -1319,56 +1977,55 @@ class SONYconn:
             }
         }
 
-        cmdMsg = self.connection._PTPMsg(
-            USBcodes.USB_OPERATIONS["Command"],
-            self._OPCODES["Values"]["SetControlDeviceA"],
-            params=params,
-            transaction=self.transactionID,
-        )
-
-        cmdMsg = self.connection._encode_msg(cmdMsg)
-
-        msgData_length = struct.pack("<L", 61)
-
-        msgType = struct.pack("<H", USBcodes.USB_OPERATIONS["Data"])
-        msgCode = struct.pack(
-            "<H", self._OPCODES["Values"]["SetControlDeviceA"]
-        )
-        msgTrans = struct.pack("<L", self.transactionID)
-        msgDate_Length = struct.pack("<B", 48)
-
-        dataMsg = (
-            msgData_length + msgType + msgCode + msgTrans + msgDate_Length
-        )
+        # The data phase is timed by hand, so the transaction is driven
+        # manually while holding the endpoints
+        with self.connection.transactions.begin() as tid:
+            cmdMsg = self.connection._PTPMsg(
+                USBcodes.USB_OPERATIONS["Command"],
+                self._OPCODES["Values"]["SetControlDeviceA"],
+                params=params,
+                transaction=tid,
+            )
 
-        count = 0
+            cmdMsg = self.connection._encode_msg(cmdMsg)
 
-        _ = self.connection._send(cmdMsg)
-        while True:
-            t = time.time()
-            time.sleep(math.ceil(t) - t)
-            if abs(time.time() - math.floor(t)) - 1 < delta:
-                timing = time.time()
-                _ = self.connection._send(
-                    dataMsg
-                    + datetime.datetime.fromtimestamp(math.ceil(t))
-                    .astimezone()
-                    .strftime("%Y%m%dT%H%M%S.0%z")
-                    .encode("utf-16LE")
-                    + b"\x00\x00\x00\x00"
-                )
-                break
-            count += 1
-            if count == 10:
-                delta *= 2
+            msgData_length = struct.pack("<L", 61)
 
-        time.sleep(timeout)
+            msgType = struct.pack("<H", USBcodes.USB_OPERATIONS["Data"])
+            msgCode = struct.pack(
+                "<H", self._OPCODES["Values"]["SetControlDeviceA"]
+            )
+            msgTrans = struct.pack("<L", tid)
+            msgDate_Length = struct.pack("<B", 48)
 
-        PTPmsgIn = self.connection._receive()
+            dataMsg = (
+                msgData_length + msgType + msgCode + msgTrans + msgDate_Length
+            )
 
-        resp = self.connection._decode_msg(PTPmsgIn)
+            count = 0
+
+            _ = self.connection._send(cmdMsg)
+            while True:
+                t = time.time()
+                time.sleep(math.ceil(t) - t)
+                if abs(time.time() - math.floor(t)) - 1 < delta:
+                    timing = time.time()
+                    _ = self.connection._send(
+                        dataMsg
+                        + datetime.datetime.fromtimestamp(math.ceil(t))
+                        .astimezone()
+                        .strftime("%Y%m%dT%H%M%S.0%z")
+                        .encode("utf-16LE")
+                        + b"\x00\x00\x00\x00"
+                    )
+                    break
+                count += 1
+                if count == 10:
+                    delta *= 2
 
-        self.transactionID += 1
+            _, resp = self.connection.transactions.read_response(
+                tid, timeout=timeout
+            )
 
         if resp["MsgType"] == "Response":
             if resp["RespCode"] == "OK":
@@ -1390,11 +2047,11 @@ class SONYconn:
                 accuracy = (timing - math.ceil(t) + delta) * 1000
                 self.logger.info(f"Predicted Accuracy: {accuracy} ms")
 
-                time.sleep(0.5)
+                time.sleep(self.delays["DateTime"])
 
                 return True
 
-        time.sleep(0.5)
+        time.sleep(self.delays["DateTime"])
 
         return False
 
@@ -1415,17 +2072,11 @@ class SONYconn:
 
         mode = {"Msg": {"Value": value, "DataType": "h"}}
 
-        PTPmsg = self.connection.send_recv_Msg(
-            USBcodes.USB_OPERATIONS["Command"],
+        resp = self.connection.transaction(
             self._OPCODES["Values"]["SetControlDeviceB"],
             params=params,
             data=mode,
-            transaction=self.transactionID,
-        )
-
-        resp = self.connection._decode_msg(PTPmsg)
-
-        self.transactionID += 1
+        )["Response"]
 
         if resp["MsgType"] == "Response":
             if resp["RespCode"] == "OK":
@@ -1440,7 +2091,7 @@ class SONYconn:
 
         for _ in range(nstep):
             resp.append(self.__single_step_focus_distance(further))
-            time.sleep(0.2)
+            time.sleep(self.delays["FocusStep"])
 
         if all(resp):
             if further:
@@ -1479,7 +2130,7 @@ class SONYconn:
         file_name,
         file_code,
         file_download_code,
-        chunk_size=15 * 1e3 * 2**10,
+        chunk_size=None,
     ):
         def generate_download_codes_params(
             file_download_code, counter1, counter2
@@ -1506,63 +2157,36 @@ class SONYconn:
         else:
             header = b"\xff\xd8\xff"
 
-        buffer_size = (
-            int(
-                os.popen(
-                    "cat /sys/module/usbcore/parameters/usbfs_memory_mb"
-                ).read()[:-1]
-            )
-            * 2**10
-            * 1e3
-        )
+        def request(index):
+            # Each chunk increments counter1 by 8, wrapping in counter2
+            counter1 = (index % 32) * 8
+            counter2 = index // 32
 
-        if chunk_size > buffer_size:
-            size = buffer_size
-        else:
-            size = chunk_size
-
-        file_data = b""
-
-        counter1 = 0
-        counter2 = 0
-
-        while True:
-            cmd_params = generate_download_codes_params(
+            return generate_download_codes_params(
                 file_download_code, counter1, counter2
             )
 
-            PTPmsg = self.connection.send_recv_Msg(
-                USBcodes.USB_OPERATIONS["Command"],
-                self._OPCODES["Values"]["GetFile"],
-                params=cmd_params,
-                receive=True,
-                transaction=self.transactionID,
-                max_reading_size=int(size),
-            )
+        tuner = self.connection.tuner
 
-            resp = self.connection._receive(
-                max_reading_size=15 * 1e3 * 2**10
+        # The size of the reads is chosen by the tuner unless forced
+        if chunk_size is None:
+            engine = download.DownloadEngine(self.connection, tuner=tuner)
+        else:
+            engine = download.DownloadEngine(
+                self.connection, max_reading_size=tuner.align(chunk_size)
             )
-            resp = self.connection._decode_msg(resp)
-
-            msg = self.connection._decode_msg(PTPmsg)
-
-            file_data += msg["Payload"]
 
-            self.transactionID += 1
-
-            if resp["Payload"] == download_code:
-                self.logger.info(f"Downloaded File {file_name}")
-                break
-
-            counter1 += 8
-            if counter1 > int("F8", 16):
-                counter1 = 0
-                counter2 += 1
-
-        file_start = file_data.find(header)
+        stats = engine.download(
+            file_name,
+            self._OPCODES["Values"]["GetFile"],
+            request,
+            lambda resp: resp.get("Payload") == download_code,
+            header=header,
+        )
 
-        with open(file_name, "wb") as writer:
-            writer.write(file_data[file_start:])
+        self.logger.info(
+            f"Downloaded File {file_name}: {stats['Bytes']} bytes "
+            f"in {stats['Time']:.3f} s ({stats['MBps']:.1f} MB/s)"
+        )
 
-        del file_data
+        return stats
@@ -0,0 +1,217 @@
+import contextlib
+import logging
+import threading
+
+import sour_core.transport as transport
+import sour_core.codes.usb as USBcodes
+
+logger = logging.getLogger()
+
+MAX_TRANSACTION_ID = 0xFFFFFFFF
+
+# Times a transaction is run again after the recovery of the connection
+MAX_RECOVERY_RETRIES = 2
+
+
+class TransactionEngine:
+    def __init__(self, connection, first_id=0):
+        """Serialize the PTP transactions of a connection
+
+        The engine hands out the transaction IDs under a lock and keeps
+        the command, data and response phases of a transaction together,
+        so that different threads (e.g. live view and camera control) can
+        share the same connection without interleaving on the endpoints.
+
+        Args:
+        - connection (USBconn): the connection used for the transactions
+        - first_id (int): the first transaction ID to be used
+        """
+
+        self.connection = connection
+
+        self._lock = threading.RLock()
+        self._id_lock = threading.Lock()
+        self._next_id = first_id
+
+        # Called with the error when the transport fails. If it returns
+        # True the connection was restored and the transaction is run
+        # again, see ReconnectManager
+        self.recovery = None
+        self._recovering = False
+
+    @property
+    def current_id(self):
+        """The transaction ID that will be used by the next transaction"""
+
+        return self._next_id
+
+    def reset(self, value=0):
+        """Set the transaction ID of the next transaction"""
+
+        with self._id_lock:
+            self._next_id = value
+
+    def next_id(self):
+        """Allocate a new transaction ID
+
+        Returns:
+        - tid (int): the transaction ID
+        """
+
+        with self._id_lock:
+            tid = self._next_id
+            self._next_id = (tid + 1) & MAX_TRANSACTION_ID
+
+        return tid
+
+    @contextlib.contextmanager
+    def begin(self):
+        """Open a transaction to be driven manually
+
+        The endpoints are reserved until the end of the with block.
+
+        Returns:
+        - tid (int): the transaction ID allocated
+        """
+
+        with self._lock:
+            yield self.next_id()
+
+    def execute(
+        self,
+        opId,
+        params=None,
+        data=None,
+        max_reading_size=None,
+        timeout=None,
+        zero_copy=False,
+    ):
+        """Run a full transaction
+
+        Args:
+        - opId (int): the operation code
+        - params (dict): the params of the command, with the same
+                         structure used by USBconn._PTPMsg
+        - data (dict): the data to be sent in a data phase
+        - max_reading_size (int): maximum size of a single USB read
+        - timeout (float): deadline in sec for each incoming container
+        - zero_copy (bool): if True the Payload of the data phase is a
+                            memoryview on a pooled buffer. It should be
+                            released with USBconn.release_view
+
+        Returns:
+        - result (dict): a dictionary with the TransactionId, the decoded
+                         Data container (None if the camera did not send
+                         a data phase) and the decoded Response
+
+        Raises:
+        - TransportError: if the transport failed and the connection
+                          could not be restored
+        """
+
+        retries = 0
+
+        with self._lock:
+            while True:
+                tid = self.next_id()
+
+                try:
+                    self.connection._send_command(
+                        USBcodes.USB_OPERATIONS["Command"],
+                        opId,
+                        params=params,
+                        data=data,
+                        transaction=tid,
+                    )
+
+                    data_msg, response = self.read_response(
+                        tid,
+                        max_reading_size=max_reading_size,
+                        timeout=timeout,
+                        zero_copy=zero_copy,
+                    )
+                except transport.TransportError as err:
+                    if isinstance(err, transport.TransportTimeout):
+                        raise
+
+                    if retries >= MAX_RECOVERY_RETRIES:
+                        raise
+
+                    if not self._recover(err):
+                        raise
+
+                    retries += 1
+                    logger.info(f"Retry transaction {tid} after recovery")
+                    continue
+
+                break
+
+        return {"TransactionId": tid, "Data": data_msg, "Response": response}
+
+    def _recover(self, error):
+        """Run the recovery of the connection after a transport error
+
+        The transactions run by the recovery itself are not recovered.
+
+        Returns:
+        - recovered (bool): True if the transaction can be run again
+        """
+
+        if self.recovery is None or self._recovering:
+            return False
+
+        self._recovering = True
+
+        try:
+            return bool(self.recovery(error))
+        finally:
+            self._recovering = False
+
+    def read_response(
+        self, tid, max_reading_size=None, timeout=None, zero_copy=False
+    ):
+        """Read the incoming containers of a transaction
+
+        Containers that belong to other transactions (e.g. left over by
+        a transaction that timed out) are discarded.
+
+        Args:
+        - tid (int): the transaction ID to be matched
+
+        Returns:
+        - data_msg (dict): the decoded Data container or None
+        - response (dict): the decoded Response container
+        """
+
+        conn = self.connection
+        codec = conn._codec
+
+        data_msg = None
+
+        with self._lock:
+            while True:
+                msg = conn._receive(
+                    max_reading_size=max_reading_size,
+                    zero_copy=zero_copy,
+                    timeout=timeout,
+                )
+
+                _, msg_type, _, msg_tid = codec.decode_header(msg)
+
+                if msg_tid != tid:
+                    logger.info(
+                        f"Discarded container of transaction {msg_tid} "
+                        f"while waiting for transaction {tid}"
+                    )
+                    conn.release_view(msg)
+                    continue
+
+                if msg_type == USBcodes.USB_OPERATIONS["Response"]:
+                    response = conn._decode_msg(msg)
+                    conn.release_view(msg)
+                    return data_msg, response
+
+                if msg_type == USBcodes.USB_OPERATIONS["Data"]:
+                    if data_msg is not None:
+                        conn.release_view(data_msg.get("Payload"))
+                    data_msg = conn._decode_msg(msg)
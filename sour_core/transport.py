@@ -0,0 +1,169 @@
+import collections
+import threading
+import time
+
+
+class TransportError(Exception):
+    """The transport failed to move data to or from the camera"""
+
+
+class TransportTimeout(TransportError):
+    """The transport did not complete the operation in time"""
+
+
+class Transport:
+    """Base class of the transports used by USBconn
+
+    A transport moves raw bytes between the host and the camera through
+    three channels that mirror the PTP USB endpoints: bulk out (write),
+    bulk in (read) and interrupt in (read_event). The PTP logic (codec,
+    transactions, events) lives in USBconn, so that a transport only has
+    to implement the byte movement.
+
+    The reads follow the USB bulk semantic: a read returns as soon as a
+    container ends, even if the buffer is not full, so a container is
+    never merged with the following one.
+    """
+
+    # wMaxPacketSize of the bulk in and interrupt endpoints
+    packet_size = 512
+    event_packet_size = 64
+
+    # Serial number of the camera, if known
+    serial_number = None
+
+    def write(self, data, timeout=None):
+        """Send data to the camera
+
+        Args:
+        - data (bytes-like): the data to be sent
+        - timeout (float): maximum time in sec for the operation
+
+        Returns:
+        - size (int): the number of bytes sent
+        """
+
+        raise NotImplementedError
+
+    def read(self, buff, timeout=None):
+        """Read data from the camera in place
+
+        Args:
+        - buff (array): the buffer the data are read into. Its length
+                        sets the size of the read
+        - timeout (float): maximum time in sec for the operation
+
+        Returns:
+        - size (int): the number of bytes read
+        """
+
+        raise NotImplementedError
+
+    def read_event(self, buff, timeout=None):
+        """Read an event from the camera in place
+
+        The arguments are the same of read.
+        """
+
+        raise NotImplementedError
+
+    def release(self):
+        """Release the resources used by the transport"""
+
+        pass
+
+    def reopen(self):
+        """Open a new transport to the same physical camera
+
+        It is used to recover from a failure of the transport, e.g. after
+        the camera was unplugged for a moment.
+
+        Returns:
+        - transport (Transport): the new transport or None if the camera
+                                 is not available (yet)
+        """
+
+        return None
+
+
+class QueuedTransport(Transport):
+    """Base class of the transports serving containers from memory
+
+    The containers sent by the camera are queued as [ready, msg, offset]
+    items, where ready is the time.monotonic() value at which the
+    container becomes readable and offset the number of bytes already
+    read. Subclasses queue the containers in response to write.
+    """
+
+    def __init__(self):
+        self.incoming = collections.deque()
+        self.events = collections.deque()
+        self._cond = threading.Condition()
+
+    def _poll(self, now):
+        """Hook called before every check of the queues"""
+
+        pass
+
+    def _next_wakeup(self):
+        """Time of the next action run by _poll or None"""
+
+        return None
+
+    def push(self, channel, msg, delay=0):
+        """Queue a container to be read after delay sec"""
+
+        with self._cond:
+            channel.append([time.monotonic() + delay, msg, 0])
+            self._cond.notify_all()
+
+    def _read(self, channel, buff, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._poll(now)
+
+                if channel and channel[0][0] <= now:
+                    break
+
+                if deadline is not None and now >= deadline:
+                    raise TransportTimeout("Operation timed out")
+
+                wake = [
+                    t
+                    for t in (
+                        channel[0][0] if channel else None,
+                        self._next_wakeup(),
+                        deadline,
+                    )
+                    if t is not None
+                ]
+
+                self._cond.wait(min(wake) - now if wake else None)
+
+            item = channel[0]
+            _, msg, offset = item
+
+            size = min(len(buff), len(msg) - offset)
+            memoryview(buff)[:size] = msg[offset : offset + size]
+
+            if offset + size >= len(msg):
+                channel.popleft()
+            else:
+                item[2] = offset + size
+
+        return size
+
+    def read(self, buff, timeout=None):
+        return self._read(self.incoming, buff, timeout)
+
+    def read_event(self, buff, timeout=None):
+        return self._read(self.events, buff, timeout)
+
+    def release(self):
+        with self._cond:
+            self.incoming.clear()
+            self.events.clear()
+            self._cond.notify_all()
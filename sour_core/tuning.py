@@ -0,0 +1,193 @@
+import logging
+import threading
+
+logger = logging.getLogger()
+
+USBFS_MEMORY_PATH = "/sys/module/usbcore/parameters/usbfs_memory_mb"
+
+DEFAULT_WRITE_SIZE = 128 * 2**10
+DEFAULT_READ_SIZE = 128 * 2**10
+DEFAULT_CHUNK_SIZE = 15 * 1000 * 2**10
+
+# Used when the usbfs limit is not available (e.g. simulated cameras)
+MAX_TRANSFER_SIZE = 64 * 2**20
+
+# Samples averaged before a size is evaluated
+TUNING_SAMPLES = 4
+# Relative improvement required to keep growing a size
+TUNING_GAIN = 0.05
+# Weight of the last sample in the throughput average
+THROUGHPUT_WEIGHT = 0.2
+
+_usbfs_limit = None
+_usbfs_read = False
+
+
+def usbfs_limit(path=USBFS_MEMORY_PATH):
+    """Memory limit of usbfs for the in-flight transfers
+
+    The value is read from sysfs only once per process.
+
+    Returns:
+    - limit (int): the limit in bytes or None if there is no limit or
+                   the parameter is not available
+    """
+
+    global _usbfs_limit, _usbfs_read
+
+    if not _usbfs_read:
+        _usbfs_read = True
+
+        try:
+            with open(path, "r") as f:
+                value = int(f.read().strip())
+        except (OSError, ValueError):
+            value = 0
+
+        # 0 means no limit
+        _usbfs_limit = value * 2**20 if value > 0 else None
+
+    return _usbfs_limit
+
+
+class TransferTuner:
+    def __init__(self, packet_size=512, limit=None):
+        """Choose the sizes of the USB transfers of a connection
+
+        Three sizes are handled: "write" for the outgoing containers,
+        "read" for the incoming containers and "chunk" for the reads of
+        the file downloads. All the sizes are multiples of the packet
+        size of the endpoint, so that a read never ends with a short
+        packet in the middle of a container, and they never exceed the
+        usbfs memory limit.
+
+        The read and chunk sizes are adapted with the throughput measured
+        on the transfers: a size is doubled as long as the throughput
+        improves, and it goes back to the best size found otherwise.
+
+        Args:
+        - packet_size (int): wMaxPacketSize of the bulk endpoints
+        - limit (int): maximum size in bytes of a single transfer. If
+                       None the usbfs limit is used
+        """
+
+        self.packet_size = packet_size
+
+        if limit is None:
+            limit = usbfs_limit() or MAX_TRANSFER_SIZE
+
+        self.max_size = max(limit - limit % packet_size, packet_size)
+
+        self._sizes = {
+            "write": self.align(DEFAULT_WRITE_SIZE),
+            "read": self.align(DEFAULT_READ_SIZE),
+            "chunk": self.align(DEFAULT_CHUNK_SIZE),
+        }
+
+        self._samples = {kind: [] for kind in self._sizes}
+        self._best = {kind: (None, 0.0) for kind in self._sizes}
+        self._frozen = {"write"}
+
+        self._throughput = {kind: 0.0 for kind in self._sizes}
+
+        self._lock = threading.Lock()
+
+    def align(self, size):
+        """Round a size down to a multiple of the packet size"""
+
+        size = min(int(size), self.max_size)
+
+        return max(size - size % self.packet_size, self.packet_size)
+
+    def size(self, kind):
+        """The size in bytes currently chosen for a kind of transfer"""
+
+        return self._sizes[kind]
+
+    @property
+    def write_size(self):
+        return self._sizes["write"]
+
+    @property
+    def read_size(self):
+        return self._sizes["read"]
+
+    @property
+    def chunk_size(self):
+        return self._sizes["chunk"]
+
+    def throughput(self, kind="chunk"):
+        """Average throughput in MB/s observed for a kind of transfer"""
+
+        return self._throughput[kind]
+
+    def record(self, kind, size, elapsed, limited=True):
+        """Report a transfer
+
+        Args:
+        - kind (str): "read" or "chunk"
+        - size (int): bytes transferred
+        - elapsed (float): time in sec spent in the transfer
+        - limited (bool): True if the transfer needed more than one read.
+                          Only these transfers are used to tune the size,
+                          the others just update the throughput
+        """
+
+        if elapsed <= 0 or size <= 0:
+            return
+
+        mbps = size / elapsed / 2**20
+
+        with self._lock:
+            avg = self._throughput[kind]
+            self._throughput[kind] = (
+                mbps if avg == 0 else avg + THROUGHPUT_WEIGHT * (mbps - avg)
+            )
+
+            if kind in self._frozen or not limited:
+                return
+
+            samples = self._samples[kind]
+            samples.append(mbps)
+
+            if len(samples) < TUNING_SAMPLES:
+                return
+
+            current = sum(samples) / len(samples)
+            samples.clear()
+
+            self._adapt(kind, current)
+
+    def _adapt(self, kind, current):
+        size = self._sizes[kind]
+        best_size, best = self._best[kind]
+
+        if best_size is None or current > best * (1 + TUNING_GAIN):
+            self._best[kind] = (size, current)
+
+            grown = self.align(size * 2)
+
+            if grown == size:
+                self._frozen.add(kind)
+            else:
+                self._sizes[kind] = grown
+        else:
+            self._sizes[kind] = best_size
+            self._frozen.add(kind)
+
+        logger.debug(
+            f"Transfer size {kind}: {self._sizes[kind]} bytes "
+            f"at {current:.1f} MB/s"
+        )
+
+    def stats(self):
+        """The chosen sizes and the observed throughput in MB/s"""
+
+        return {
+            kind: {
+                "Size": self._sizes[kind],
+                "MBps": self._throughput[kind],
+                "Tuned": kind in self._frozen,
+            }
+            for kind in self._sizes
+        }
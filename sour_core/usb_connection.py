@@ -7,21 +7,27 @@ from usb.util import (
     ENDPOINT_OUT,
     ENDPOINT_IN,
 )
+import array
 import struct
 import logging
+import threading
 import time
-import copy
 
-import sour_core.codes.utils as code_utils
+import sour_core.ptp_codec as ptp_codec
+import sour_core.transport as transport
+import sour_core.capture as capture
+import sour_core.tuning as tuning
+import sour_core.discovery as discovery
+import sour_core.events as events
+import sour_core.transaction as PTPtransaction
+import sour_core.codes.registry as registry
 import sour_core.codes.usb as USBcodes
-import sour_core.codes.operational as OPcodes
-import sour_core.codes.response as RESPcodes
 
 logger = logging.getLogger()
 
-PTP_USB_CLASS = 0x06
-BASE_PTP_MSG_LENGTH = 12
-LIMIT_MSG_SIZE = 128  # kb
+PTP_USB_CLASS = discovery.PTP_USB_CLASS
+BASE_PTP_MSG_LENGTH = ptp_codec.BASE_PTP_MSG_LENGTH
+RESPONSE_TIMEOUT = 5  # s
 
 PTP_MSG_STRUCT = {
     "Length": "L",
@@ -32,6 +38,79 @@ PTP_MSG_STRUCT = {
 }
 
 
+class PTPTimeoutError(Exception):
+    """The camera did not answer before the deadline of the operation"""
+
+
+class BufferPool:
+    def __init__(self, max_buffers=4, granularity=64 * 2**10):
+        """Pool of reusable buffers for the incoming messages
+
+        The buffers are array('B') objects, since this is the only type
+        pyusb can read into in place.
+
+        Args:
+        - max_buffers (int): maximum number of free buffers kept alive
+        - granularity (int): the size of the buffers allocated for
+                             assembling a message is rounded up to a
+                             multiple of this value, so that buffers
+                             can be reused by messages of similar size
+        """
+
+        self._max_buffers = max_buffers
+        self._granularity = granularity
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size, exact=False):
+        """Get a buffer from the pool
+
+        Args:
+        - size (int): minimum size of the buffer
+        - exact (bool): if True the buffer has exactly the size
+                        requested. This is required for buffers used
+                        as target of a read, since the length of the
+                        buffer sets the size of the transfer
+
+        Returns:
+        - buff (array): the buffer
+        """
+
+        size = int(size)
+
+        with self._lock:
+            best = None
+            for idx, buff in enumerate(self._free):
+                if exact:
+                    if len(buff) == size:
+                        best = idx
+                        break
+                elif len(buff) >= size:
+                    if best is None or len(buff) < len(self._free[best]):
+                        best = idx
+
+            if best is not None:
+                return self._free.pop(best)
+
+        if not exact:
+            size = -(-size // self._granularity) * self._granularity
+
+        return array.array("B", bytes(size))
+
+    def release(self, buff):
+        """Return a buffer to the pool"""
+
+        if not isinstance(buff, array.array):
+            return
+
+        with self._lock:
+            if any(buff is b for b in self._free):
+                return
+            self._free.append(buff)
+            if len(self._free) > self._max_buffers:
+                self._free.pop(0)
+
+
 class find_class(object):
     def __init__(self, class_, name=None):
         self._class = class_
@@ -55,20 +134,34 @@ class find_class(object):
         return False
 
 
-def find_usb_cameras(name=None):
-    return usb.core.find(
-        find_all=True, custom_match=find_class(PTP_USB_CLASS, name=name)
-    )
+def find_usb_cameras(name=None, refresh=False):
+    """Find the cameras connected to the bus
 
+    The cameras are taken from the cache of the discovery service, so
+    the bus is not scanned again on every call.
 
-class USBconn:
-    def __init__(
-        self, camera=None, idVendor=None, idProduct=None, endian="little"
-    ):
-        """Connect to a Sony Camera using USB protocol.
+    Args:
+    - name (str): if given, only the cameras with name in the product
+                  name are returned
+    - refresh (bool): force a scan of the bus
+
+    Returns:
+    - cameras (list): the usb.core.Device of the cameras
+    """
+
+    return [
+        info.device
+        for info in discovery.get_discovery().cameras(
+            name=name, refresh=refresh
+        )
+    ]
 
-        If no arguments are specified the code connects to the first available
-        camera
+
+class USBTransport(transport.Transport):
+    def __init__(self, camera=None, idVendor=None, idProduct=None):
+        """Transport over the USB endpoints of a PTP camera
+
+        If no arguments are specified the first available camera is used
 
         Args:
         - camera (usb.core.Device): the camera usb object to connect to
@@ -76,8 +169,6 @@ class USBconn:
                           be expressed as an hex
         - idProduct (int): USB idProduct of the camera to use. It needs to
                            be expressed as an hex
-        - endian (string): set the endianess of the messages used in the
-                           communications
         """
 
         if isinstance(camera, usb.core.Device):
@@ -90,16 +181,29 @@ class USBconn:
             else:
                 self.camera = list(find_usb_cameras())[0]
 
-        self._OPCODES = code_utils.combine_dict(OPcodes.OPCODES)
+        self.__inep = None
+        self.__outep = None
+        self.__intep = None
 
-        self.__set_endianess(endian)
         self.__setup_camera()
 
+        self.packet_size = self.__inep.wMaxPacketSize
+        self.event_packet_size = self.__intep.wMaxPacketSize
+
         usb.util.claim_interface(self.__dev, self.__intf)
-        
-    def _release_usb(self):
-        
-        usb.util.dispose_resources(self.__dev)
+
+        # Read while the camera is reachable, to find it again later
+        self._serial_number = None
+        self._serial_number = self.serial_number
+
+    @property
+    def serial_number(self):
+        try:
+            return usb.util.get_string(
+                self.camera, self.camera.iSerialNumber
+            )
+        except (usb.core.USBError, ValueError):
+            return self._serial_number
 
     def _choose_specific_camera(self, **kwargs):
         """Select a specific camera"""
@@ -146,6 +250,136 @@ class USBconn:
         logger.info("USB Camera not Found")
         return False
 
+    @staticmethod
+    def _timeout_ms(timeout):
+        if timeout is None:
+            return None
+
+        # pyusb treats a timeout of 0 as infinite
+        return max(1, int(timeout * 1000))
+
+    def _transfer(self, func, *args):
+        try:
+            return func(*args)
+        except usb.core.USBTimeoutError as err:
+            raise transport.TransportTimeout(str(err)) from err
+        except usb.core.USBError as err:
+            raise transport.TransportError(str(err)) from err
+
+    def write(self, data, timeout=None):
+        return self._transfer(
+            self.__outep.write, data, self._timeout_ms(timeout)
+        )
+
+    def read(self, buff, timeout=None):
+        return self._transfer(
+            self.__inep.read, buff, self._timeout_ms(timeout)
+        )
+
+    def read_event(self, buff, timeout=None):
+        return self._transfer(
+            self.__intep.read, buff, self._timeout_ms(timeout)
+        )
+
+    def release(self):
+        try:
+            usb.util.dispose_resources(self.__dev)
+        except usb.core.USBError:
+            pass
+
+    def reopen(self):
+        """Find the camera again by serial number and connect to it"""
+
+        serial_number = self._serial_number
+
+        if serial_number is None:
+            return None
+
+        info = discovery.get_discovery().find(
+            serial_number=serial_number, refresh=True
+        )
+
+        if info is None:
+            return None
+
+        try:
+            return USBTransport(camera=info.device)
+        except (usb.core.USBError, ValueError) as err:
+            logger.info(f"Cannot reopen the camera {serial_number}: {err}")
+            return None
+
+
+class USBconn:
+    def __init__(
+        self,
+        camera=None,
+        idVendor=None,
+        idProduct=None,
+        endian="little",
+        transport=None,
+    ):
+        """Connect to a Sony Camera using USB protocol.
+
+        If no arguments are specified the code connects to the first available
+        camera
+
+        Args:
+        - camera (usb.core.Device): the camera usb object to connect to
+        - idVendor (int): USB idVendor of the camera to use. It needs to
+                          be expressed as an hex
+        - idProduct (int): USB idProduct of the camera to use. It needs to
+                           be expressed as an hex
+        - endian (string): set the endianess of the messages used in the
+                           communications
+        - transport (Transport): the transport used to move the data. If
+                                 None, a USBTransport is created from the
+                                 other arguments
+        """
+
+        if transport is None:
+            transport = USBTransport(
+                camera=camera, idVendor=idVendor, idProduct=idProduct
+            )
+
+        self.transport = transport
+        self.camera = getattr(transport, "camera", None)
+
+        self._OPCODES = registry.OPCODES
+
+        self.__set_endianess(endian)
+        self._codec = ptp_codec.PTPCodec(self._endian)
+        self._pool = BufferPool()
+        self.events = None
+        self.recorder = None
+        self.tuner = tuning.TransferTuner(packet_size=transport.packet_size)
+        self.transactions = PTPtransaction.TransactionEngine(self)
+
+    def _release_usb(self):
+        self.stop_event_listener()
+        self.stop_recording()
+
+        self.transport.release()
+
+    def replace_transport(self, new_transport):
+        """Move the connection to a new transport to the same camera
+
+        The old transport is released. The transaction engine, the event
+        listener and the recorder keep working on the new transport.
+
+        Args:
+        - new_transport (Transport): the transport to be used
+        """
+
+        old = self.transport
+
+        self.transport = new_transport
+        self.camera = getattr(new_transport, "camera", None)
+
+        try:
+            old.release()
+        except transport.TransportError as err:
+            logger.info(f"Cannot release the old transport: {err}")
+
     def __set_endianess(self, value):
         """Define the endianess of the messages used to communicate"""
 
@@ -223,6 +457,9 @@ class USBconn:
     def _encode_msg(self, ptp_msg):
         """Method to encode a ptp message
 
+        This is a shim around the compiled codec, kept for the callers
+        that still build the message with _PTPMsg
+
         Args:
         - ptp_msg (dict): A dictionary with the message data
 
@@ -230,29 +467,37 @@ class USBconn:
         - msg (bytes): the encoded message
         """
 
-        msg = b""
+        if "Params" in ptp_msg:
+            datatypes = ptp_msg["Params"]["DataType"]
+            values = ptp_msg["Params"]["Value"]
+        else:
+            datatypes = values = ()
+
+        return self._codec.encode(
+            ptp_msg["MsgType"]["Value"],
+            ptp_msg["MsgOp"]["Value"],
+            ptp_msg["TransactionId"]["Value"],
+            datatypes,
+            values,
+        )
 
-        for i in ptp_msg.keys():
-            if isinstance(ptp_msg[i]["Value"], list):
-                for j in range(len(ptp_msg[i]["Value"])):
-                    if isinstance(ptp_msg[i]["Value"][j], bytes):
-                        msg += ptp_msg[i]["Value"][j]
-                    else:
-                        msg += struct.pack(
-                            (self._endian + ptp_msg[i]["DataType"][j]),
-                            ptp_msg[i]["Value"][j],
-                        )
+    def _build_msg(self, MsgType, MsgOp, transaction=0, params=None):
+        """Build and encode a PTP message in a single step
 
-            elif isinstance(ptp_msg[i]["Value"], bytes):
-                msg += ptp_msg[i]["Value"]
+        Args:
+        - MsgType (int) : The type of message that needs to be sent
+        - MsgOp (int): The operation code of the message
+        - transaction (int): transaction counter for USB operation
+        - params (dict): A dictionary with the same structure used
+                         by _PTPMsg
 
-            else:
-                msg += struct.pack(
-                    (self._endian + ptp_msg[i]["DataType"]),
-                    ptp_msg[i]["Value"],
-                )
+        Return:
+        - msg (bytes): the encoded message
+        """
 
-        return msg
+        return self._codec.encode_params(
+            MsgType, MsgOp, transaction, params
+        )
 
     def _decode_msg(self, PTPmsg):
         """Decode a PTP Message
@@ -267,105 +512,284 @@ class USBconn:
                       types, the payload is returned as bytes
         """
 
-        msg = {}
+        length, msg_type, opcode, transaction = self._codec.decode_header(
+            PTPmsg
+        )
 
-        idx_start = 0
+        msg = {
+            "Length": length,
+            "MsgType": registry.usb_operation_name(msg_type),
+        }
 
-        for i in PTP_MSG_STRUCT.keys():
-            if i == "Payload":
-                if len(PTPmsg) > BASE_PTP_MSG_LENGTH:
-                    if msg["MsgType"] == "Response":
-                        msg["Payload"] = struct.unpack(
-                            (self._endian + "L"), PTPmsg[idx_start:]
-                        )[0]
+        if msg["MsgType"] == "Response":
+            msg["OpCode"] = opcode
+            msg["RespCode"] = registry.respcode_name(opcode)
+        else:
+            msg["OpCode"] = registry.opcode_name(opcode)
 
-                    elif msg["MsgType"] == "Data":
-                        # Data Message are parsed only if required
-                        msg[i] = PTPmsg[idx_start:]
+        msg["TransactionId"] = transaction
 
-            else:
-                idx_end = (
-                    struct.Struct((self._endian + PTP_MSG_STRUCT[i])).size
-                    + idx_start
+        if len(PTPmsg) > BASE_PTP_MSG_LENGTH:
+            if msg["MsgType"] == "Response":
+                msg["Payload"] = self._codec.decode_u32(
+                    PTPmsg, BASE_PTP_MSG_LENGTH
                 )
 
-                msg[i] = struct.unpack(
-                    (self._endian + PTP_MSG_STRUCT[i]),
-                    PTPmsg[idx_start:idx_end],
-                )[0]
-
-                if i == "MsgType":
-                    msg[i] = code_utils.decode_code(
-                        USBcodes.USB_OPERATIONS, msg[i]
-                    )
-
-                elif i == "OpCode":
-                    if msg["MsgType"] == "Response":
-                        msg["RespCode"] = code_utils.decode_code(
-                            RESPcodes.RESPCODES["Values"], msg[i]
-                        )
-                    else:
-                        msg[i] = code_utils.decode_code(
-                            self._OPCODES["Values"], msg[i]
-                        )
-
-                idx_start = copy.copy(idx_end)
+            elif msg["MsgType"] == "Data":
+                # Data Message are parsed only if required
+                msg["Payload"] = PTPmsg[BASE_PTP_MSG_LENGTH:]
 
         return msg
 
-    def _send(self, ptp_msg, EP=None, event=False):
+    def _send(self, ptp_msg, EP=None):
         """Helper method for sending data
 
         Args:
         - ptp_msg (bytes): encoded message to be sent
-        - EP : endpoint used for sending the message
+        - EP : endpoint used for sending the message. If None the
+               message goes through the transport
+
+        Raises:
+        - TransportError: if the message cannot be sent
         """
 
-        if not EP:
-            EP = self.__intep if event else self.__outep
+        write = EP.write if EP else self.transport.write
+
+        if self.recorder is not None:
+            self.recorder.record(capture.CAPTURE_OUT, ptp_msg)
+
+        size = self.tuner.write_size
 
         try:
             sent = 0
             while sent < len(ptp_msg):
-                sent = EP.write(
-                    ptp_msg[sent : (sent + LIMIT_MSG_SIZE * 2**10)]
-                )
-        except usb.core.USBError:
-            pass
+                sent += write(ptp_msg[sent : sent + size])
+        except usb.core.USBError as err:
+            raise transport.TransportError(str(err)) from err
 
-    def _receive(self, max_reading_size=None, event=False):
+    def _receive(
+        self, max_reading_size=None, event=False, zero_copy=False, timeout=None
+    ):
         """Helper method for receiving a message
 
+        The message is read in place into a pooled buffer sized from the
+        PTP length header. The reads are blocking and return as soon as
+        the container is available, up to the deadline set by timeout.
+
+        Args:
+        - max_reading_size (int): maximum size of a single USB read. If
+                                  None, the size chosen by the tuner is
+                                  used
+        - event (bool): if True the interrupt endpoint is used
+        - zero_copy (bool): if True a memoryview on the pooled buffer is
+                            returned instead of a bytes copy. The view
+                            should be given back with release_view once
+                            it is not needed anymore
+        - timeout (float): deadline in sec to receive the whole message.
+                           If None, RESPONSE_TIMEOUT is used
+
         Return:
-        - ptp_msg (bytes): encoded PTP message (can be data or a response)
+        - ptp_msg (bytes or memoryview): encoded PTP message (can be data
+                                         or a response)
+
+        Raises:
+        - PTPTimeoutError: if the message is not received in time
         """
 
-        EP = self.__intep if event else self.__inep
+        view = self._receive_view(max_reading_size, event, timeout)
 
-        ptp_msg = b""
+        if zero_copy:
+            return view
 
-        reads = 0
+        ptp_msg = bytes(view)
+        self.release_view(view)
 
-        while len(ptp_msg) < BASE_PTP_MSG_LENGTH and reads < 5:
-            ptp_msg += EP.read(EP.wMaxPacketSize)
+        return ptp_msg
 
-            reads += 1
+    def _read(self, buff, deadline, event=False):
+        """Blocking read on the transport bounded by a deadline
 
-        msg_length = struct.unpack((self._endian + "L"), ptp_msg[:4])[0]
+        Args:
+        - buff (array): buffer the data are read into
+        - deadline (float): time.monotonic() value at which the
+                            operation times out
+        - event (bool): if True the event channel is used
+
+        Returns:
+        - size (int): the number of bytes read
+        """
+
+        remaining = deadline - time.monotonic()
+
+        if remaining <= 0:
+            raise PTPTimeoutError("No message received from the camera")
+
+        read = self.transport.read_event if event else self.transport.read
+
+        try:
+            return read(buff, remaining)
+        except transport.TransportTimeout as err:
+            raise PTPTimeoutError(
+                "No message received from the camera"
+            ) from err
+
+    def _receive_view(self, max_reading_size=None, event=False, timeout=None):
+        """Read a full PTP container into a pooled buffer
+
+        pyusb can only read at the start of an array, so when a container
+        needs more than one read the chunks are copied once into the
+        final buffer. A container that fits in a single read is returned
+        without any copy.
+
+        Return:
+        - view (memoryview): view on the encoded PTP message
+        """
+
+        # Only the reads sized by the tuner are used to tune it
+        tuned = not max_reading_size and not event
 
         if not max_reading_size:
-            max_reading_size = LIMIT_MSG_SIZE * 2**10
-
-        while len(ptp_msg) < msg_length:
-            ptp_msg += EP.read(
-                min(
-                    msg_length - BASE_PTP_MSG_LENGTH,
-                    # Up to 128kB
-                    max_reading_size,
-                )
+            max_reading_size = self.tuner.read_size
+
+        if timeout is None:
+            timeout = RESPONSE_TIMEOUT
+
+        deadline = time.monotonic() + timeout
+
+        chunk = self._pool.acquire(max_reading_size, exact=True)
+        chunk_view = memoryview(chunk)
+
+        received = self._read(chunk, deadline, event)
+        reads = 1
+
+        # Zero length packets can precede the container, and the header
+        # can be split over more reads. The following parts are read
+        # into a separate buffer, as a read always starts at index 0
+        while received < BASE_PTP_MSG_LENGTH and reads < 5:
+            part = self._pool.acquire(max_reading_size - received, exact=True)
+            size = self._read(part, deadline, event)
+            chunk_view[received : received + size] = memoryview(part)[:size]
+            self._pool.release(part)
+
+            received += size
+            reads += 1
+
+        if received < BASE_PTP_MSG_LENGTH:
+            self._pool.release(chunk)
+            raise PTPTimeoutError(
+                f"Incomplete container header: {received} bytes"
             )
 
-        return ptp_msg
+        msg_length = self._codec.decode_u32(chunk)
+
+        if msg_length <= received:
+            return self._record_in(chunk_view[:msg_length], event)
+
+        buff = self._pool.acquire(msg_length)
+        view = memoryview(buff)
+        view[:received] = chunk_view[:received]
+
+        first = received
+        t = time.monotonic()
+
+        while received < msg_length:
+            size = self._read(chunk, deadline, event)
+            view[received : received + size] = chunk_view[:size]
+            received += size
+
+        if tuned:
+            self.tuner.record("read", received - first, time.monotonic() - t)
+
+        self._pool.release(chunk)
+
+        return self._record_in(view[:msg_length], event)
+
+    def _record_in(self, view, event):
+        """Record an incoming container if a recording is running"""
+
+        if self.recorder is not None:
+            self.recorder.record(
+                capture.CAPTURE_EVENT if event else capture.CAPTURE_IN, view
+            )
+
+        return view
+
+    def release_view(self, view):
+        """Give back to the pool the buffer of a zero-copy message
+
+        Args:
+        - view (memoryview): a view returned by a zero-copy receive, or
+                             any view derived from it
+        """
+
+        if isinstance(view, memoryview):
+            self._pool.release(view.obj)
+
+    def _receive_event(self, timeout=None):
+        """Read a single Event container from the interrupt endpoint
+
+        Args:
+        - timeout (float): time in sec to wait for an event
+
+        Return:
+        - ptp_msg (bytes): the encoded event or None if no event arrived
+        """
+
+        try:
+            return self._receive(
+                max_reading_size=self.transport.event_packet_size,
+                event=True,
+                timeout=timeout,
+            )
+        except PTPTimeoutError:
+            return None
+
+    def start_recording(self, file_name):
+        """Record all the containers sent and received in a capture file
+
+        The capture can be replayed with capture.ReplayTransport.
+
+        Args:
+        - file_name (str): path of the capture file
+
+        Returns:
+        - recorder (CaptureWriter): the recorder, also available as the
+                                    recorder attribute of the connection
+        """
+
+        self.stop_recording()
+
+        self.recorder = capture.CaptureWriter(file_name, self._endian)
+
+        return self.recorder
+
+    def stop_recording(self):
+        """Stop the recording and close the capture file"""
+
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def start_event_listener(self):
+        """Start a background thread reading the camera events
+
+        Returns:
+        - events (EventListener): the listener, also available as the
+                                  events attribute of the connection
+        """
+
+        if self.events is None:
+            self.events = events.EventListener(self)
+
+        self.events.start()
+
+        return self.events
+
+    def stop_event_listener(self):
+        """Stop the background thread reading the camera events"""
+
+        if self.events is not None:
+            self.events.stop()
 
     def send_recv_Msg(
         self,
@@ -376,8 +800,9 @@ class USBconn:
         transaction=0,
         data=None,
         event=False,
-        timeout=0.004,
+        timeout=None,
         max_reading_size=None,
+        zero_copy=False,
     ):
         """Method to send a message and receive a response
 
@@ -392,35 +817,93 @@ class USBconn:
         - data (dict): A dictionary with the same structure of the params dict.
                        This dict contains additional data that needs to be sent
                        other than the original command
-        - timout (float): a timeout in sec to wait between the outgoing message
-                          and the eventual incoming message. This is to ensure
-                          that also long messages are sent
+        - event (bool): not used, kept for the old callers. The commands
+                        always go to the bulk out endpoint
+        - timeout (float): deadline in sec for the incoming message. The
+                           call returns as soon as the message is received.
+                           If None, RESPONSE_TIMEOUT is used
+        - max_reading_size (int): maximum size of a single USB read
+        - zero_copy (bool): if True the incoming message is returned as
+                            a memoryview on a pooled buffer
         """
 
-        EP = self.__intep if event else self.__outep
-
-        PTPmsgOut = self._PTPMsg(
-            MsgType, opId, params=params, transaction=transaction
+        self._send_command(
+            MsgType,
+            opId,
+            params=params,
+            data=data,
+            transaction=transaction,
         )
 
-        PTPbyteMsg = self._encode_msg(PTPmsgOut)
+        PTPmsgIn = None
+
+        if receive:
+            PTPmsgIn = self._receive(
+                max_reading_size=max_reading_size,
+                zero_copy=zero_copy,
+                timeout=timeout,
+            )
+
+        return PTPmsgIn
+
+    def _send_command(
+        self,
+        MsgType,
+        opId,
+        params=None,
+        data=None,
+        transaction=0,
+    ):
+        """Send a command and its optional data phase
+
+        Args:
+        - MsgType (int) : The type of message that needs to be sent
+        - opId (int): The operation code of the message
+        - params (dict): the params of the command
+        - data (dict): the data to be sent in a data phase
+        - transaction (int): transaction counter for USB operation
+        """
+
+        self._send(
+            self._build_msg(
+                MsgType, opId, params=params, transaction=transaction
+            )
+        )
 
         if data:
-            dataMsg = self._PTPMsg(
-                USBcodes.USB_OPERATIONS["Data"],
-                opId,
-                params=data,
-                transaction=transaction,
+            self._send(
+                self._build_msg(
+                    USBcodes.USB_OPERATIONS["Data"],
+                    opId,
+                    params=data,
+                    transaction=transaction,
+                )
             )
 
-            databyeMsg = self._encode_msg(dataMsg)
-            self._send(PTPbyteMsg, EP)
-            self._send(databyeMsg, EP)
-        else:
-            self._send(PTPbyteMsg, EP)
+    def transaction(
+        self,
+        opId,
+        params=None,
+        data=None,
+        max_reading_size=None,
+        timeout=None,
+        zero_copy=False,
+    ):
+        """Run a full PTP transaction through the transaction engine
 
-        if receive:
-            time.sleep(timeout)
-            PTPmsgIn = self._receive(max_reading_size=max_reading_size)
+        The transaction ID is allocated by the engine and the response is
+        matched to it. See TransactionEngine.execute for the arguments.
 
-        return PTPmsgIn
+        Returns:
+        - result (dict): a dictionary with the TransactionId, the decoded
+                         Data container (or None) and the decoded Response
+        """
+
+        return self.transactions.execute(
+            opId,
+            params=params,
+            data=data,
+            max_reading_size=max_reading_size,
+            timeout=timeout,
+            zero_copy=zero_copy,
+        )
@@ -0,0 +1,28 @@
+import logging
+
+import pytest
+
+# sour_core.sony writes a log file in sour_core/logs when it is imported
+# and the root logger has no handler
+logging.getLogger().addHandler(logging.NullHandler())
+
+import sour_core.sony as sony  # noqa: E402
+import sour_core.simulator as simulator  # noqa: E402
+
+
+@pytest.fixture
+def camera():
+    transport = simulator.SimulatedTransport(
+        photo_size=64 * 2**10, file_chunk_size=2**20
+    )
+    cam = sony.SONYconn(
+        "ILCE-7M3",
+        transport=transport,
+        capabilities=None,
+        latency_store=None,
+    )
+    cam.initialize_camera()
+
+    yield cam
+
+    cam.close_usb_connection()
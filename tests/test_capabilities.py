@@ -0,0 +1,65 @@
+import sour_core.capabilities as capabilities
+import sour_core.simulator as simulator
+import sour_core.sony as sony
+import sour_core.codes.registry as registry
+
+ISO = registry.PROPCODES["Values"]["ISO"]
+
+
+def _camera(sim, database):
+    cam = sony.SONYconn(
+        "ILCE-7M3",
+        transport=simulator.SimulatedTransport(camera=sim),
+        capabilities=database,
+        latency_store=None,
+    )
+    cam.initialize_camera()
+
+    return cam
+
+
+def test_database_round_trip(tmp_path):
+    database = capabilities.CapabilityDatabase(str(tmp_path))
+    descriptors = {ISO: (6, 1, b"\x02\x01\x00\x64\x00\x00\x00")}
+
+    database.save("ILCE-7M3", "3.01", descriptors)
+
+    assert database.load("ILCE-7M3", "3.01") == descriptors
+    assert database.load("ILCE-7M3", "3.02") is None
+
+    # A truncated file is not used
+    with open(database.path("ILCE-7M3", "3.01"), "r+b") as f:
+        f.truncate(20)
+
+    assert database.load("ILCE-7M3", "3.01") is None
+
+
+def test_descriptors_reused_and_invalidated(tmp_path):
+    database = capabilities.CapabilityDatabase(str(tmp_path))
+    sim = simulator.SimulatedCamera(extra_properties=10)
+
+    cam = _camera(sim, database)
+    cam.close_usb_connection()
+
+    saved = database.load(sim.model, sim.firmware)
+    assert saved is not None and ISO in saved
+
+    # Same model and firmware: the saved descriptors are used
+    cam = _camera(sim, database)
+    assert cam._prop_parser.static_version == cam._static_version
+    cam.close_usb_connection()
+
+    # The available values changed, e.g. with a different lens: the
+    # saved descriptor is not used and it is replaced
+    sim.properties[ISO].photo = [100, 200, 400]
+    sim.properties[ISO].video = [100]
+
+    cam = _camera(sim, database)
+
+    assert cam.camera_properties["ISO"]["AvailableValues"] == {
+        "Photo": ["100", "200", "400"],
+        "Video": ["100"],
+    }
+    assert database.load(sim.model, sim.firmware)[ISO] != saved[ISO]
+
+    cam.close_usb_connection()
@@ -0,0 +1,57 @@
+import sour_core.capture as capture
+import sour_core.simulator as simulator
+import sour_core.sony as sony
+
+
+def _session(cam, file_name, handle, code):
+    cam.initialize_camera()
+    assert cam._set_iso(800)
+    cam._transfer_large_files(file_name, handle, code)
+
+    properties = {k: v.to_dict() for k, v in cam.camera_properties.items()}
+    cam.close_usb_connection()
+
+    return properties
+
+
+def _camera(transport):
+    return sony.SONYconn(
+        "ILCE-7M3", transport=transport, capabilities=None, latency_store=None
+    )
+
+
+def test_record_and_replay(tmp_path):
+    capture_file = str(tmp_path / "session.cap")
+
+    live = simulator.SimulatedTransport(
+        photo_size=64 * 2**10, file_chunk_size=2**20, extra_properties=20
+    )
+    sim = live.camera
+    handle = sim.add_file("DSC00001.JPG", size=2 * 2**20 + 17)
+    code = sim.files[handle]["DownloadCode"]
+
+    cam = _camera(live)
+    cam.connection.start_recording(capture_file)
+    recorded = _session(cam, str(tmp_path / "live.jpg"), handle, code)
+
+    info, records = capture.read_capture(capture_file)
+    assert info["Endian"] == "<"
+    assert {record[0] for record in records} >= {
+        capture.CAPTURE_OUT,
+        capture.CAPTURE_IN,
+    }
+
+    replay = capture.ReplayTransport(capture_file, speed=None)
+    replayed = _session(
+        _camera(replay), str(tmp_path / "replay.jpg"), handle, code
+    )
+
+    assert replay.mismatches == 0
+    assert replay.finished
+    assert replayed == recorded
+    assert replayed["ISO"]["CurrentValue"] == "800"
+
+    with open(str(tmp_path / "live.jpg"), "rb") as f:
+        live_file = f.read()
+    with open(str(tmp_path / "replay.jpg"), "rb") as f:
+        assert f.read() == live_file == sim.files[handle]["Content"]
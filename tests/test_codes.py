@@ -0,0 +1,102 @@
+import struct
+
+import pytest
+
+import sour_core.codes.properties as PROPcodes
+import sour_core.codes.utils as code_utils
+
+ENDIANS = ("<", ">", "!", "=")
+
+# Both u16 halves are non zero, so that either can be the denominator
+SHUTTER_VALUES = [
+    0x00010001,
+    0x000100FA,
+    0x001E0001,
+    0x000A0001,
+    0x00010002,
+    0x00FA0001,
+    0xFFFFFFFF,
+    0x12345678,
+]
+
+ISO_VALUES = [100, 125, 800, 12800, 409600, PROPcodes.SONY_ISO_AUTO]
+
+
+# The conversions before the tables of the codes, as reference
+def _old_bytes2shutter(endian, val):
+    tmp = struct.pack(endian + "L", val)
+
+    num = struct.unpack(endian + "H", tmp[2:])[0]
+
+    den = struct.unpack(endian + "H", tmp[:2])[0]
+
+    if num >= den:
+        return str(num / den)
+    else:
+        return str(num) + "/" + str(den)
+
+
+def _old_bin2ISO(val):
+    tmp = bin(val)[2:]
+
+    if len(tmp) < 32:
+        tmp = "0" * (32 - len(tmp)) + tmp
+
+    mode = int(tmp[-28:-24], 2)
+    value = int(tmp[-24:], 2)
+
+    ISO = ""
+
+    if mode != 0:
+        ISO += code_utils.decode_code(PROPcodes.SONY_ISO_MODE["Values"], mode)
+        ISO += " "
+
+    if value == PROPcodes.SONY_ISO_AUTO:
+        ISO += "AUTO"
+    else:
+        ISO += str(value)
+
+    return ISO
+
+
+def _old_ISO2bin(val, mode=0, ext=0):
+    ISOval = bin(val)[2:].rjust(24, "0")
+
+    if isinstance(mode, str):
+        mode = PROPcodes.SONY_ISO_MODE["Values"][mode]
+
+    ISOmode = bin(mode)[2:].rjust(4, "0")
+    ISOext = bin(ext)[2:].rjust(4, "0")
+
+    return int(ISOext + ISOmode + ISOval, 2)
+
+
+@pytest.mark.parametrize("endian", ENDIANS)
+def test_bytes2shutter(endian):
+    for val in SHUTTER_VALUES:
+        prop = code_utils.property("ShutterSpeed", val, endian)
+
+        assert prop.decoder() == _old_bytes2shutter(endian, val), hex(val)
+
+
+def test_big_endian_shutter():
+    prop = code_utils.property("ShutterSpeed", 0x000100FA, "!")
+
+    assert prop.decoder() == "250.0"
+
+
+@pytest.mark.parametrize("endian", ENDIANS)
+def test_ISO_conversions(endian):
+    modes = list(PROPcodes.SONY_ISO_MODE["Values"].items())
+
+    for val in ISO_VALUES:
+        for name, mode in [("", 0)] + modes:
+            for ext in (0, 1):
+                raw = _old_ISO2bin(val, mode, ext)
+
+                prop = code_utils.property("ISO", val, endian)
+                assert prop.encoder(mode=mode, ext=ext) == raw
+                assert prop.encoder(mode=name or 0, ext=ext) == raw
+
+                prop = code_utils.property("ISO", raw, endian)
+                assert prop.decoder() == _old_bin2ISO(raw)
@@ -0,0 +1,72 @@
+import os
+
+import sour_core.history as history
+
+
+def test_range_queries(tmp_path):
+    store = history.HistoryStore(str(tmp_path))
+
+    for t, iso in ((10.0, "100"), (20.0, "200"), (30.0, "400")):
+        assert store.append("ISO", iso, t)
+
+    assert store.append("ISO", "800", 40.0)
+
+    # Only the changes are recorded
+    assert not store.append("ISO", "800", 50.0)
+
+    assert store.changes("ISO", 20.0, 30.0) == [(20.0, "200"), (30.0, "400")]
+    assert store.changes("ISO", start=35.0) == [(40.0, "800")]
+    assert store.changes("ShutterSpeed") == []
+
+    assert store.value_at("ISO", 25.0) == "200"
+    assert store.value_at("ISO", 5.0) is None
+
+    store.close()
+
+    # The history on disk is loaded again
+    store = history.HistoryStore(str(tmp_path))
+    assert [v for _, v in store.changes("ISO")] == ["100", "200", "400", "800"]
+    store.close()
+
+
+def test_segment_rotation(tmp_path):
+    store = history.HistoryStore(
+        str(tmp_path), segment_size=256, max_segments=3
+    )
+
+    store.append("FocusMode", "AF_S", 0.0)
+
+    for idx in range(200):
+        store.append("ISO", 100 + idx, 1.0 + idx)
+
+    files = os.listdir(str(tmp_path))
+
+    assert len(files) == 3
+    assert store.disk_usage() <= 3 * (256 + 64)
+
+    changes = store.changes("ISO")
+    first = changes[0][0]
+
+    # The oldest changes were deleted with their segments, the newest
+    # ones are all there
+    assert first > 1.0
+    assert changes[-1] == (200.0, 299)
+    assert [v for _, v in changes] == list(range(int(first) + 99, 300))
+
+    # The value of a property that did not change since the first
+    # segment is kept by the keyframes
+    assert store.value_at("FocusMode", first) == "AF_S"
+
+    store.close()
+
+
+def test_camera_history(camera, tmp_path):
+    store = camera.start_history(str(tmp_path), names=["ISO"])
+
+    assert camera._set_iso(800)
+
+    values = [value for _, value in store.changes("ISO")]
+
+    assert values == ["100", "800"]
+
+    camera.stop_history()
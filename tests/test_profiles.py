@@ -0,0 +1,65 @@
+import sour_core.profiles as profiles
+
+
+def _set_controls(camera):
+    sim = camera.connection.transport.camera
+    handler = sim._handlers["SetControlDeviceA"]
+    calls = []
+
+    def counted(params, data):
+        calls.append(params[0])
+        return handler(params, data)
+
+    sim._handlers["SetControlDeviceA"] = counted
+
+    return calls
+
+
+def test_diff():
+    profile = profiles.Profile("night", {"ISO": "6400", "FocusMode": "MF"})
+    properties = {
+        "ISO": {"CurrentValue": "6400"},
+        "FocusMode": {"CurrentValue": "AF_S"},
+    }
+
+    assert profile.diff(properties) == {"FocusMode": "MF"}
+    assert profile.diff(properties, ["ISO"]) == {}
+    assert profile.diff({}) == {"ISO": "6400", "FocusMode": "MF"}
+
+
+def test_store_round_trip(tmp_path):
+    store = profiles.ProfileStore(str(tmp_path / "profiles.json"))
+    store.save(profiles.Profile("day", {"ISO": "100"}))
+    store.save(profiles.Profile("night", {"ISO": "6400"}))
+
+    assert store.names() == ["day", "night"]
+    assert store.load("night").settings == {"ISO": "6400"}
+
+    store.delete("day")
+    assert store.names() == ["night"]
+
+
+def test_apply_only_the_differences(camera, tmp_path):
+    store = profiles.ProfileStore(str(tmp_path / "profiles.json"))
+    camera.start_events()
+
+    camera.apply_settings({"iso": 6400, "shutterspeed": "1/30"})
+    night = camera.save_profile("night", store)
+    assert night.settings["ISO"] == "6400"
+
+    camera.apply_settings({"iso": 100})
+
+    sent = _set_controls(camera)
+    results = camera.apply_profile(store.load("night"))
+
+    # Only the ISO differs from the profile
+    assert sent == [camera._PROPCODES["Values"]["ISO"]]
+    assert results["ISO"]["Status"] == "OK"
+    assert results["ShutterSpeed"]["Status"] == "Unchanged"
+    assert camera.camera_properties["ISO"]["CurrentValue"] == "6400"
+
+    del sent[:]
+    results = camera.apply_profile(store.load("night"))
+
+    assert sent == []
+    assert {res["Status"] for res in results.values()} == {"Unchanged"}
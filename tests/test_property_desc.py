@@ -0,0 +1,42 @@
+import json
+
+import sour_core.property_parser as property_parser
+import sour_core.simulator as simulator
+
+
+def _properties():
+    cam = simulator.SimulatedCamera(extra_properties=0)
+
+    return property_parser.PropertyParser("<").parse(cam.property_dump())
+
+
+def test_mapping_of_the_old_keys():
+    iso = _properties()["ISO"]
+
+    assert iso == iso.to_dict()
+    assert iso["CurrentValue"] == "100"
+    assert iso.get("MinValue") is None
+    assert "AvailableValues" in iso
+    assert iso["AvailableValues"]["Video"][:2] == ["AUTO", "100"]
+
+    # The descriptors keep only the raw values and have no __dict__
+    assert not hasattr(iso, "__dict__")
+    assert json.loads(json.dumps(iso.to_dict())) == iso.to_dict()
+
+
+def test_copy_and_assign():
+    props = _properties()
+    iso = props["ISO"]
+
+    other = iso.copy()
+    other.current_raw = 800
+
+    assert other["CurrentValue"] == "800"
+    assert iso["CurrentValue"] == "100"
+    assert other.photo_raw is iso.photo_raw
+
+    # Updated in place, so the references to it see the new value
+    iso.assign(other)
+
+    assert props["ISO"]["CurrentValue"] == "800"
+    assert props["ISO"] == other
@@ -0,0 +1,167 @@
+import struct
+
+import sour_core.property_parser as property_parser
+import sour_core.simulator as simulator
+import sour_core.codes.registry as registry
+import sour_core.codes.utils as code_utils
+import sour_core.codes.datatype as DTcodes
+import sour_core.codes.sony_misc as SMcodes
+
+
+def _code(name):
+    return registry.PROPCODES["Values"][name]
+
+
+def _dump(*entries):
+    return struct.pack("<Q", len(entries)) + b"".join(entries)
+
+
+def _range_entry(name, current, low, high, step):
+    # INT16 entry, GetSet and enabled, with a range
+    return struct.pack(
+        "<HHBBhhBhhh", _code(name), 3, 1, 1, 0, current, 1, low, high, step
+    )
+
+
+# The decoder of the dumps before PropertyParser, as reference
+def _old_value(name, view, offset, datatype, endian):
+    val = struct.unpack_from(endian + datatype, view, offset)[0]
+
+    val = code_utils.property(name, val, endian).decoder()
+
+    if isinstance(val, bytes):
+        val = val.decode("utf-8")
+
+    return val
+
+
+def _old_values(name, msg, offset, datatype, endian):
+    size = struct.calcsize(endian + datatype)
+    count = struct.unpack_from(endian + "H", msg, offset)[0]
+    offset += 2
+
+    values = [
+        _old_value(name, msg, offset + idx * size, datatype, endian)
+        for idx in range(count)
+    ]
+
+    return values, offset + count * size
+
+
+def _old_decode(msg, endian="<"):
+    count = struct.unpack_from(endian + "Q", msg)[0]
+    offset = 8
+
+    properties = {}
+
+    for _ in range(count):
+        vals = {}
+
+        code, dt_code, getset, visibility = struct.unpack_from(
+            endian + "HHBB", msg, offset
+        )
+        offset += 6
+
+        name = code_utils.decode_code(registry.PROPCODES["Values"], code)
+        datatype = code_utils.decode_datatype(
+            DTcodes.PTP_DATATYPE["Values"], dt_code
+        )
+        size = struct.calcsize(endian + datatype)
+
+        vals["PropertyCode"] = code
+        vals["DataType"] = datatype
+        vals["GetSet"] = "GetSet" if getset == 1 else "Set"
+        vals["Visibility"] = code_utils.decode_code(
+            SMcodes.SONY_VISIBILITY["Values"], visibility
+        )
+        vals["FactoryDefaultValue"] = _old_value(
+            name, msg, offset, datatype, endian
+        )
+        vals["CurrentValue"] = _old_value(
+            name, msg, offset + size, datatype, endian
+        )
+        offset += 2 * size
+
+        vals["FmtFlag"] = msg[offset]
+        offset += 1
+
+        if vals["FmtFlag"] == 1:
+            (
+                vals["MinValue"],
+                vals["MaxValue"],
+                vals["StepValue"],
+            ) = struct.unpack_from(endian + 3 * datatype, msg, offset)
+            offset += 3 * size
+
+        elif vals["FmtFlag"] == 2:
+            photo, offset = _old_values(name, msg, offset, datatype, endian)
+            vals["AvailableValues"] = {"Photo": photo}
+
+            if (
+                offset + 2 <= len(msg)
+                and struct.unpack_from(endian + "H", msg, offset)[0] < 0x1000
+            ):
+                video, offset = _old_values(
+                    name, msg, offset, datatype, endian
+                )
+                vals["AvailableValues"]["Video"] = video
+
+        properties[name] = vals
+
+    return properties
+
+
+def _as_dicts(properties):
+    return {name: vals.to_dict() for name, vals in properties.items()}
+
+
+def test_same_output_as_old_decoder():
+    cam = simulator.SimulatedCamera(extra_properties=20)
+    parser = property_parser.PropertyParser("<")
+
+    # The first dump fills the caches, the second one is decoded with
+    # the known static parts
+    for iso, focal in ((100, 35), (800, 50)):
+        cam.properties[_code("ISO")].current = iso
+
+        # A range property after the dump of the simulated camera
+        dump = struct.pack("<Q", len(cam.properties) + 1)
+        dump += cam.property_dump()[8:]
+        dump += _range_entry("FocalLength", focal, 16, 200, 1)
+
+        decoded = parser.parse(dump)
+        reference = _old_decode(dump)
+
+        assert _as_dicts(decoded) == reference
+        assert list(decoded) == list(reference)
+        assert decoded["FocalLength"]["CurrentValue"] == focal
+
+
+def test_tail_grown_at_the_end():
+    iso = simulator.SimulatedProperty(
+        _code("ISO"), "L", 100, [100, 200, 400], [100]
+    )
+    focus = simulator.SimulatedProperty(_code("FocusFound"), "B", 2)
+
+    with_video = iso.encode("<")
+    # The same entry without the video list: its tail is a prefix of the
+    # tail above
+    photo_only = with_video[: -(2 + 4)]
+
+    parser = property_parser.PropertyParser("<")
+
+    first = parser.parse(_dump(photo_only, focus.encode("<")))
+    assert first["ISO"]["AvailableValues"] == {
+        "Photo": ["100", "200", "400"]
+    }
+
+    dump = _dump(with_video, focus.encode("<"))
+    second = parser.parse(dump)
+
+    fresh = property_parser.PropertyParser("<").parse(dump)
+
+    assert second["ISO"]["AvailableValues"]["Video"] == ["100"]
+    assert second["FocusFound"]["CurrentValue"] == 2
+    assert {k: v.to_dict() for k, v in second.items()} == {
+        k: v.to_dict() for k, v in fresh.items()
+    }
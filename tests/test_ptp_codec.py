@@ -0,0 +1,22 @@
+import struct
+
+import pytest
+
+import sour_core.ptp_codec as ptp_codec
+
+
+@pytest.mark.parametrize("endian", ["<", ">", "!", "=", "@"])
+def test_encode_without_padding(endian):
+    codec = ptp_codec.PTPCodec(endian)
+    order = "=" if endian == "@" else endian
+
+    msg = codec.encode(1, 0x1002, 7, ["L", "H", "L"], [1, 2, 3])
+
+    # The fields packed one by one, as the containers were built before
+    expected = b"".join(
+        struct.pack(order + dt, v)
+        for dt, v in zip("LHHLLHL", (22, 1, 0x1002, 7, 1, 2, 3))
+    )
+
+    assert msg == expected
+    assert codec.decode_header(msg)[0] == len(msg)
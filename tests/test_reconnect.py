@@ -0,0 +1,42 @@
+import pytest
+
+import sour_core.transport as transport
+
+
+def test_recover_after_a_glitch(camera):
+    old = camera.connection.transport
+    tid = camera.connection.transactions.current_id
+
+    old.disconnect(0.05)
+
+    assert camera._set_iso(800)
+    assert camera.camera_properties["ISO"]["CurrentValue"] == "800"
+
+    recovery = camera.reconnect.last_recovery
+    assert recovery["Recovered"]
+    assert recovery["Attempts"] > 1
+
+    # Same camera on a new transport, the transaction IDs go on
+    assert camera.connection.transport is not old
+    assert camera.connection.transport.camera is old.camera
+    assert camera.connection.transactions.current_id > tid
+
+
+def test_camera_gone(camera):
+    camera.reconnect.timeout = 0.1
+    camera.connection.transport.disconnect(100)
+
+    with pytest.raises(transport.TransportError):
+        camera.get_camera_properties()
+
+    assert not camera.reconnect.last_recovery["Recovered"]
+
+
+def test_recovery_disabled(camera):
+    camera.reconnect.disable()
+    camera.connection.transport.disconnect()
+
+    with pytest.raises(transport.TransportError):
+        camera.get_camera_properties()
+
+    assert camera.reconnect.last_recovery is None
@@ -0,0 +1,68 @@
+def _count(camera, name):
+    """Record the params of every command name run by the camera"""
+
+    sim = camera.connection.transport.camera
+    handler = sim._handlers[name]
+    calls = []
+
+    def counted(params, data):
+        calls.append(params)
+        return handler(params, data)
+
+    sim._handlers[name] = counted
+
+    return calls
+
+
+def test_batch_with_one_refresh(camera):
+    settings = _count(camera, "SetControlDeviceA")
+    dumps = _count(camera, "GetAllDevicePropData")
+
+    results = camera.apply_settings(
+        {
+            "iso": 1000,
+            "shutterspeed": "1/300",
+            "programmode": "Photo_M",
+            "focusmode": "manual",
+        }
+    )
+
+    assert {prop: res["Status"] for prop, res in results.items()} == {
+        "ExposureProgramMode": "OK",
+        "FocusMode": "OK",
+        "ShutterSpeed": "OK",
+        "ISO": "OK",
+    }
+    # Snapped to the closest value available
+    assert results["ShutterSpeed"]["Applied"] == "1/250"
+
+    assert len(settings) == 4
+    assert len(dumps) == 1
+    assert camera.camera_properties["ISO"]["CurrentValue"] == "1000"
+    assert camera.camera_properties["FocusMode"]["CurrentValue"] == "MF"
+
+
+def test_invalid_value_is_not_sent(camera):
+    settings = _count(camera, "SetControlDeviceA")
+
+    results = camera.apply_settings({"ISO": 800, "FocusMode": "bogus"})
+
+    assert results["FocusMode"]["Status"] == "Invalid"
+    assert results["ISO"]["Status"] == "OK"
+    assert len(settings) == 1
+    assert camera.camera_properties["FocusMode"]["CurrentValue"] == "AF_S"
+
+
+def test_refused_setting(camera):
+    sim = camera.connection.transport.camera
+    sim._handlers["SetControlDeviceA"] = lambda params, data: (
+        None,
+        "InvalidDevicePropValue",
+        (),
+    )
+
+    results = camera.apply_settings({"iso": 800})
+
+    assert results["ISO"]["Status"] == "Failed"
+    assert results["ISO"]["RespCode"] == "InvalidDevicePropValue"
+    assert camera.camera_properties["ISO"]["CurrentValue"] == "100"
@@ -0,0 +1,42 @@
+import time
+
+
+def test_initialize_camera(camera):
+    assert camera.device_info["Model"] == "ILCE-7M3"
+    assert "ExposureProgramMode" in camera.camera_properties
+    assert camera._current_mode == "Photo"
+    assert set(camera.init_timing) >= {"Session", "Handshake", "Total"}
+
+
+def test_setter(camera):
+    assert camera._set_iso(800)
+    assert camera.camera_properties["ISO"]["CurrentValue"] == "800"
+
+
+def test_capture(camera):
+    sim = camera.connection.transport.camera
+    files = len(sim.files)
+
+    camera.start_events()
+    assert camera._capture_photo()
+
+    deadline = time.monotonic() + 2
+    while len(sim.files) == files and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(sim.files) == files + 1
+
+
+def test_chunked_get_file(camera, tmp_path):
+    sim = camera.connection.transport.camera
+    # A synthetic JPEG spanning several GetFile chunks
+    handle = sim.add_file("DSC00001.JPG", size=3 * 2**20 + 123)
+    content = sim.files[handle]["Content"]
+    file_name = str(tmp_path / "DSC00001.JPG")
+
+    camera._transfer_large_files(
+        file_name, handle, sim.files[handle]["DownloadCode"]
+    )
+
+    with open(file_name, "rb") as f:
+        assert f.read() == content
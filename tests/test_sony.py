@@ -0,0 +1,49 @@
+import pytest
+
+
+def _fail(camera, name, resp="GeneralError"):
+    sim = camera.connection.transport.camera
+    sim._handlers[name] = lambda params, data: (None, resp, ())
+
+
+def test_failed_dump_keeps_the_cache(camera):
+    props = dict(camera.camera_properties)
+
+    _fail(camera, "GetAllDevicePropData")
+    camera.get_camera_properties()
+
+    assert camera.property_cache.loaded
+    assert dict(camera.camera_properties) == props
+
+
+def test_transient_error_keeps_targeted_refresh(camera):
+    sim = camera.connection.transport.camera
+    desc = sim._handlers["SonyGetDevicePropDesc"]
+
+    _fail(camera, "SonyGetDevicePropDesc", "DeviceBusy")
+    sim.set_property(camera._PROPCODES["Values"]["ISO"], 400)
+
+    assert camera.refresh_properties(["ISO"])
+    assert camera.camera_properties["ISO"]["CurrentValue"] == "400"
+    assert camera._targeted_refresh
+
+    sim._handlers["SonyGetDevicePropDesc"] = desc
+    assert camera.refresh_properties(["ISO"]) == ["ISO"]
+
+
+def test_unsupported_targeted_refresh(camera):
+    _fail(camera, "SonyGetDevicePropDesc", "OperationNotSupported")
+
+    camera.refresh_properties(["ISO"])
+
+    assert not camera._targeted_refresh
+
+
+def test_live_view_without_jpeg(camera):
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+
+    sim = camera.connection.transport.camera
+    sim.live_view_frame = bytes(1024)
+
+    assert camera._get_live_view() is None
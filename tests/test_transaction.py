@@ -0,0 +1,58 @@
+import threading
+
+import sour_core.codes.registry as registry
+import sour_core.codes.usb as USBcodes
+
+
+def _desc_params(name):
+    code = registry.PROPCODES["Values"][name]
+
+    return {"Msg": {"Value": code, "DataType": "L"}}
+
+
+def test_containers_of_other_transactions_are_discarded(camera):
+    conn = camera.connection
+    tid = conn.transactions.current_id
+
+    # Left over by a transaction that timed out
+    for msg_type, code in (("Data", 0x9999), ("Response", 0x2019)):
+        conn.transport.push(
+            conn.transport.incoming,
+            conn._codec.encode(
+                USBcodes.USB_OPERATIONS[msg_type], code, tid - 1, ["L"], [0]
+            ),
+        )
+
+    result = conn.transaction(
+        registry.OPCODES["Values"]["SonyGetDevicePropDesc"],
+        params=_desc_params("ISO"),
+    )
+
+    assert result["TransactionId"] == tid
+    assert result["Response"]["RespCode"] == "OK"
+    assert result["Response"]["TransactionId"] == tid
+
+    name, _, _ = camera._prop_parser.decode(result["Data"]["Payload"])
+    assert name == "ISO"
+
+
+def test_threads_share_the_connection(camera):
+    names = ["ISO", "ShutterSpeed", "FocusMode", "ExposureProgramMode"]
+    errors = []
+
+    def worker(name):
+        for _ in range(20):
+            vals = camera._get_property_desc(name)
+
+            if vals is None or list(vals) != [name]:
+                errors.append((name, vals))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in names]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert not camera.connection.transport.incoming
@@ -0,0 +1,53 @@
+import pytest
+
+import sour_core.transport as transport
+import sour_core.usb_connection as USBconn
+import sour_core.codes.usb as USBcodes
+
+
+class ScriptedTransport(transport.QueuedTransport):
+    """Serve the queued reads as they are, one per read"""
+
+    def write(self, data, timeout=None):
+        return len(data)
+
+
+def _connection():
+    return USBconn.USBconn(transport=ScriptedTransport())
+
+
+def _response(conn, transaction):
+    return conn._codec.encode(
+        USBcodes.USB_OPERATIONS["Response"], 0x2001, transaction, ["L"], [7]
+    )
+
+
+def test_header_split_over_reads():
+    conn = _connection()
+    msg = _response(conn, 1)
+
+    for data in (b"", msg[:5], msg[5:]):
+        conn.transport.push(conn.transport.incoming, data)
+
+    assert conn._receive(timeout=0.5) == msg
+
+
+def test_incomplete_header():
+    conn = _connection()
+    first = conn._codec.encode(
+        USBcodes.USB_OPERATIONS["Response"], 0x2001, 1, ["L", "L"], [7, 8]
+    )
+    second = _response(conn, 2)
+
+    conn.transport.push(conn.transport.incoming, first)
+    assert conn._receive(timeout=0.5) == first
+
+    # The pooled buffer still holds the length of the first message
+    for _ in range(5):
+        conn.transport.push(conn.transport.incoming, b"")
+    conn.transport.push(conn.transport.incoming, second)
+
+    with pytest.raises(USBconn.PTPTimeoutError):
+        conn._receive(timeout=0.5)
+
+    assert conn._receive(timeout=0.5) == second